@@ -0,0 +1,204 @@
+#!/usr/bin/env python2
+# Terminator by Chris Jones <cmsj@tenshu.net>
+# GPL v2 only
+"""activitymonitor.py - one timer watching terminals for activity or silence
+
+The activity watch plugins used to run a Python handler on every
+'contents-changed' of a watched terminal, and the silence watch added a
+timer per terminal on top. The ActivityMonitor is edge triggered: the
+handler of a watch is disconnected on the first change it sees, and only
+connected again when that change stops mattering, after the hush period
+of an activity watch or a short resolution for a silence watch. All the
+deadlines are kept in one heap served by a single timer, and times come
+from the monotonic clock.
+
+>>> class Vte(object):
+...     handlers = 0
+...     def connect(self, signal, handler, *args):
+...         self.handlers += 1
+...         return(self.handlers)
+...     def disconnect(self, handler_id): pass
+>>> class Terminal(object):
+...     vte = Vte()
+>>> now = [0]
+>>> monitor = ActivityMonitor(lambda: now[0] * 1000000)
+>>> def report(kind):
+...     def callback(terminal):
+...         print kind, now[0]
+...         return(True)
+...     return(callback)
+>>> noisy, quiet = Terminal(), Terminal()
+>>> monitor.watch_activity(noisy, 10, report('activity'))
+>>> monitor.watch_silence(quiet, 5, report('silence'), 1)
+>>> monitor.on_contents_changed(noisy.vte, monitor.watches[(noisy, ACTIVITY)])
+activity 0
+>>> monitor.is_armed(noisy, ACTIVITY)
+False
+>>> now[0] = 10
+>>> monitor.on_timer()
+False
+>>> monitor.is_armed(noisy, ACTIVITY)
+True
+>>> monitor.on_contents_changed(quiet.vte, monitor.watches[(quiet, SILENCE)])
+>>> now[0] = 11
+>>> monitor.on_timer()
+False
+>>> now[0] = 16
+>>> monitor.on_timer()
+silence 16
+False
+>>> monitor.unwatch(noisy)
+>>> sorted(kind for terminal, kind in monitor.watches)
+['silence']
+
+"""
+
+import heapq
+from gi.repository import GObject, GLib
+from util import dbg
+
+ACTIVITY = 'activity'
+SILENCE = 'silence'
+
+class Watch(object):
+    """One terminal watched for one kind of event"""
+
+    terminal = None
+    kind = None
+    period = None
+    resolution = None
+    callback = None
+    handler_id = None
+    deadline = None
+
+class ActivityMonitor(object):
+    """Watches terminals for activity and silence"""
+
+    clock = None
+    watches = None
+    deadlines = None
+    sequence = None
+    timer = None
+    timer_due = None
+
+    def __init__(self, clock=GLib.get_monotonic_time):
+        """Class initialiser. clock() returns monotonic microseconds"""
+        self.clock = clock
+        self.watches = {}
+        self.deadlines = []
+        self.sequence = 0
+
+    def now(self):
+        """Return the monotonic time in seconds"""
+        return(self.clock() / 1000000.0)
+
+    def watch_activity(self, terminal, hush, callback):
+        """Call callback(terminal) when terminal changes. If it returns
+        True, changes in the next hush seconds are not looked at"""
+        self.watch(terminal, ACTIVITY, hush, callback, hush)
+
+    def watch_silence(self, terminal, period, callback, resolution=1.0):
+        """Call callback(terminal) once terminal has not changed for period
+        seconds after it was last active. It may be reported up to
+        resolution seconds late"""
+        self.watch(terminal, SILENCE, period, callback, resolution)
+
+    def watch(self, terminal, kind, period, callback, resolution):
+        """Start a watch of kind on terminal"""
+        self.unwatch(terminal, kind)
+        watch = Watch()
+        watch.terminal = terminal
+        watch.kind = kind
+        watch.period = period
+        watch.resolution = resolution
+        watch.callback = callback
+        self.watches[(terminal, kind)] = watch
+        self.arm(watch)
+
+    def unwatch(self, terminal, kind=None):
+        """Stop watching terminal, for kind or for everything"""
+        for kind in kind and [kind] or [ACTIVITY, SILENCE]:
+            watch = self.watches.pop((terminal, kind), None)
+            if watch:
+                self.disarm(watch)
+                watch.deadline = None
+
+    def is_watching(self, terminal, kind):
+        """Return whether terminal is watched for kind"""
+        return(self.watches.has_key((terminal, kind)))
+
+    def is_armed(self, terminal, kind):
+        """Return whether changes of terminal are looked at for kind"""
+        watch = self.watches.get((terminal, kind))
+        return(bool(watch and watch.handler_id))
+
+    def arm(self, watch):
+        """Look at the changes of the terminal of watch"""
+        if not watch.handler_id:
+            watch.handler_id = watch.terminal.vte.connect('contents-changed',
+                    self.on_contents_changed, watch)
+
+    def disarm(self, watch):
+        """Stop looking at the changes of the terminal of watch"""
+        if watch.handler_id:
+            watch.terminal.vte.disconnect(watch.handler_id)
+            watch.handler_id = None
+
+    def on_contents_changed(self, _vte, watch):
+        """The first change of a terminal since its watch was armed"""
+        if watch.kind == ACTIVITY:
+            if not watch.callback(watch.terminal):
+                return
+            self.disarm(watch)
+            self.schedule(watch, self.now() + watch.period)
+        else:
+            # Active now, look again once the resolution has passed
+            self.disarm(watch)
+            self.schedule(watch, self.now() + watch.resolution)
+
+    def on_deadline(self, watch):
+        """A deadline of watch has been reached"""
+        watch.deadline = None
+        if watch.kind == ACTIVITY or not watch.handler_id:
+            self.arm(watch)
+            if watch.kind == SILENCE:
+                self.schedule(watch, self.now() + watch.period)
+        else:
+            dbg('ActivityMonitor::on_deadline: %s went silent',
+                watch.terminal)
+            watch.callback(watch.terminal)
+
+    def schedule(self, watch, deadline):
+        """Make deadline the next deadline of watch"""
+        watch.deadline = deadline
+        self.sequence += 1
+        heapq.heappush(self.deadlines, (deadline, self.sequence, watch))
+        if self.timer_due is None or deadline < self.timer_due:
+            self.start_timer(deadline)
+
+    def start_timer(self, deadline):
+        """Run on_timer at deadline"""
+        if self.timer:
+            GObject.source_remove(self.timer)
+        delay = max(0, int((deadline - self.now()) * 1000) + 1)
+        self.timer = GObject.timeout_add(delay, self.on_timer)
+        self.timer_due = deadline
+
+    def on_timer(self):
+        """Timer callback, serve every deadline that has been reached"""
+        self.timer = None
+        self.timer_due = None
+        now = self.now()
+        while self.deadlines and self.deadlines[0][0] <= now:
+            deadline, _sequence, watch = heapq.heappop(self.deadlines)
+            # Deadlines of stopped watches and replaced deadlines stay in
+            # the heap until they are reached, skip them
+            if watch.deadline == deadline and \
+               self.watches.get((watch.terminal, watch.kind)) is watch:
+                self.on_deadline(watch)
+        if self.deadlines and (self.timer_due is None or
+                               self.deadlines[0][0] < self.timer_due):
+            self.start_timer(self.deadlines[0][0])
+        return(False)
+
+# vim: set expandtab ts=4 sw=4:
@@ -0,0 +1,172 @@
+#!/usr/bin/env python2
+# Terminator by Chris Jones <cmsj@tenshu.net>
+# GPL v2 only
+"""broadcast.py - deliver broadcast input to grouped terminals
+
+The Broadcaster keeps a cached recipient tuple per group (None meaning all
+terminals), so emitting a keystroke does not rescan every terminal. Each
+source event is converted to a GdkEvent once and emitted to all receivers.
+When coalescing is enabled, plain printable keystrokes and fed text are
+queued per receiver and delivered with a single feed_child per terminal on
+the next main loop iteration. Every other key, cursor, keypad and function
+keys included, is still emitted as a key event after the queue is flushed:
+what it sends depends on the receiver, its cursor and keypad modes
+(DECCKM, DECKPAM) and its key handlers.
+
+>>> class FakeVte(object):
+...     def __init__(self): self.fed = []
+...     def feed_child(self, text, length): self.fed.append(text)
+>>> class FakeTerm(object):
+...     def __init__(self, group): self.group, self.vte = group, FakeVte()
+>>> terms = [FakeTerm('a'), FakeTerm('a'), FakeTerm(None)]
+>>> def members(group):
+...     return([term for term in terms if group in (None, term.group)])
+>>> bcast = Broadcaster(members)
+>>> len(bcast.get_recipients('a')), len(bcast.get_recipients(None))
+(2, 3)
+>>> bcast.queue_text(terms[1], 'l')
+>>> bcast.queue_text(terms[1], 's')
+>>> bcast.flush()
+False
+>>> terms[1].vte.fed
+['ls']
+>>> terms[2].group = 'a'
+>>> len(bcast.get_recipients('a'))
+2
+>>> bcast.invalidate()
+>>> len(bcast.get_recipients('a'))
+3
+
+"""
+
+from gi.repository import GObject, Gdk
+from util import dbg
+
+# Modifiers that make a keystroke more than its printable text
+TEXT_BREAKING_MASK = Gdk.ModifierType.CONTROL_MASK | \
+                     Gdk.ModifierType.MOD1_MASK | \
+                     Gdk.ModifierType.MOD4_MASK | \
+                     Gdk.ModifierType.SUPER_MASK | \
+                     Gdk.ModifierType.HYPER_MASK | \
+                     Gdk.ModifierType.META_MASK
+
+# Keysyms from here to 0xffff are function, cursor, keypad and modifier
+# keys, a keypad digit may send an escape sequence rather than its digit
+FUNCTION_KEYSYMS = 0xfd00
+
+def eventkey2gdkevent(eventkey):  # FIXME FOR GTK3: is there a simpler way of casting from specific EventKey to generic (union) GdkEvent?
+    gdkevent = Gdk.Event.new(eventkey.type)
+    gdkevent.key.window = eventkey.window
+    gdkevent.key.send_event = eventkey.send_event
+    gdkevent.key.time = eventkey.time
+    gdkevent.key.state = eventkey.state
+    gdkevent.key.keyval = eventkey.keyval
+    gdkevent.key.length = eventkey.length
+    gdkevent.key.string = eventkey.string
+    gdkevent.key.hardware_keycode = eventkey.hardware_keycode
+    gdkevent.key.group = eventkey.group
+    gdkevent.key.is_modifier = eventkey.is_modifier
+    return gdkevent
+
+def eventkey2text(eventkey):
+    """Return the text a plain keystroke would send, or None if the event
+    has to go through the VTE key handling (modifiers, cursor, keypad and
+    function keys, control characters)"""
+    if eventkey.is_modifier or eventkey.state & TEXT_BREAKING_MASK:
+        return(None)
+    if FUNCTION_KEYSYMS <= eventkey.keyval <= 0xffff:
+        return(None)
+    char = Gdk.keyval_to_unicode(eventkey.keyval)
+    if char < 0x20 or 0x7f <= char < 0xa0:
+        return(None)
+    return(unichr(char).encode('utf-8'))
+
+class Broadcaster(object):
+    """Cached recipient sets and a per frame feed queue for broadcasting"""
+
+    get_members = None
+    coalesce = None
+    recipients = None
+    pending = None
+    pending_order = None
+    pending_flush = None
+
+    def __init__(self, get_members, coalesce=False):
+        """Class initialiser. get_members(group) returns the terminals in a
+        group, or all terminals for None"""
+        self.get_members = get_members
+        self.coalesce = coalesce
+        self.recipients = {}
+        self.pending = {}
+        self.pending_order = []
+        self.pending_flush = False
+
+    def invalidate(self, gone=None):
+        """Forget the cached recipients, membership has changed. A terminal
+        that is going away also loses its queued text"""
+        self.recipients.clear()
+        if gone is not None and self.pending.has_key(gone):
+            del(self.pending[gone])
+            self.pending_order.remove(gone)
+
+    def get_recipients(self, group):
+        """Return a tuple of terminals in group, or all terminals if group is
+        None"""
+        try:
+            return(self.recipients[group])
+        except KeyError:
+            pass
+        members = tuple(self.get_members(group))
+        self.recipients[group] = members
+        return(members)
+
+    def emit_key(self, source, group, event):
+        """Send a key press from source to every other recipient"""
+        targets = self.get_recipients(group)
+        if len(targets) < 2 and source in targets:
+            return
+        if self.coalesce:
+            text = eventkey2text(event)
+            if text is not None:
+                for term in targets:
+                    if term is not source:
+                        self.queue_text(term, text)
+                return
+            self.flush()
+        gdkevent = eventkey2gdkevent(event)
+        for term in targets:
+            if term is not source:
+                term.vte.emit('key-press-event', gdkevent)
+
+    def feed(self, targets, text):
+        """Feed text to each of targets, coalescing when enabled"""
+        if not self.coalesce:
+            for term in targets:
+                term.feed(text)
+            return
+        for term in targets:
+            self.queue_text(term, text)
+
+    def queue_text(self, term, text):
+        """Queue text for term until the next flush"""
+        if not self.pending.has_key(term):
+            self.pending[term] = []
+            self.pending_order.append(term)
+        self.pending[term].append(text)
+        if not self.pending_flush:
+            self.pending_flush = True
+            GObject.idle_add(self.flush)
+
+    def flush(self):
+        """Deliver everything queued, one feed_child per terminal"""
+        pending, order = self.pending, self.pending_order
+        self.pending, self.pending_order = {}, []
+        self.pending_flush = False
+        if order:
+            dbg('Broadcaster::flush: feeding %d terminals' % len(order))
+        for term in order:
+            text = ''.join(pending[term])
+            term.vte.feed_child(text, len(text))
+        return(False)
+
+# vim: set expandtab ts=4 sw=4:
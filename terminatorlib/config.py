@@ -73,14 +73,20 @@ KeyError: 'ConfigBase::get_item: unknown key algo'
 
 import platform
 import os
+import threading
 from copy import copy
+from StringIO import StringIO
 from configobj.configobj import ConfigObj, flatten_errors
 from configobj.validate import Validator
 from borg import Borg
-from util import dbg, err, DEBUG, get_config_dir, dict_diff
+from util import dbg, err, DEBUG, get_config_dir, dict_diff, write_atomic
+import configcache
 #import pout
 #pout.inject()
-from gi.repository import Gio
+from gi.repository import Gio, GLib
+
+# ms to wait for more changes before writing the config file
+SAVE_DELAY = 1000
 
 DEFAULTS = {
         'global_config':   {
@@ -94,6 +100,12 @@ DEFAULTS = {
             'tabs_hidden'           : False,
             'tab_position'          : 'bottom',
             'broadcast_default'     : 'off',
+            'broadcast_coalesce'    : False,
+            'lazy_spawn'            : False,
+            'prewarm_interval'      : 0,
+            'proc_poll_interval'    : 1000,
+            'merge_url_matches'     : False,
+            'output_metrics'        : False,
             'close_button_on_tab'   : False,
             'hide_tabbar'           : False,
             'scroll_tabbar'         : False,
@@ -110,6 +122,7 @@ DEFAULTS = {
             'title_hide_path'       : False,
             'title_hide_userhost'   : False,
             'title_hide_sizetext'   : False,
+            'title_show_metrics'    : False,
             'title_transmit_bg_color' : '#3d4b05',
             'title_transmit_fg_color' : '#edd400',
             'title_receive_bg_color'  : '#204a87',
@@ -360,6 +373,7 @@ class Config(object):
         if not self.base.profiles.has_key(profile):
             dbg('Config::set_profile: %s does not exist, creating' % profile)
             self.base.profiles[profile] = copy(DEFAULTS['profiles']['default'])
+            self.base.generation += 1
 
     def add_profile(self, profile):
         """Add a new profile"""
@@ -374,6 +388,7 @@ class Config(object):
             self.set_profile('default')
         if self.base.profiles.has_key(profile):
             del(self.base.profiles[profile])
+            self.base.generation += 1
         options = self.options_get()
         if options and options.profile == profile:
             options.profile = None
@@ -384,6 +399,7 @@ class Config(object):
         if self.base.profiles.has_key(profile):
             self.base.profiles[newname] = self.base.profiles[profile]
             del(self.base.profiles[profile])
+            self.base.generation += 1
             if profile == self.profile:
                 self.profile = newname
 
@@ -391,6 +407,12 @@ class Config(object):
         """List all configured profiles"""
         return(self.base.profiles.keys())
 
+    def fingerprint(self):
+        """Return a value that changes whenever the settings a terminal of
+        our profile is configured from change"""
+        return((self.base.fingerprint(self.profile),
+                self.get_system_mono_font(), self.get_system_prop_font()))
+
     def add_layout(self, name, layout):
         """Add a new layout"""
         return(self.base.add_layout(name, layout))
@@ -473,6 +495,7 @@ class Config(object):
         self.system_focus = None
         self.system_font = None
         self.system_mono_font = None
+        self.base.generation += 1
         # Need to trigger a reconfigure to change active terminals immediately
         if "Terminator" not in globals():
             from terminator import Terminator
@@ -482,6 +505,10 @@ class Config(object):
         """Cause ConfigBase to save our config to file"""
         return(self.base.save())
 
+    def flush_save(self):
+        """Write out a pending save right away"""
+        return(self.base.flush_save())
+
     def set_nosave(self, val=True):
         """No file writes if set to True"""
         self.base._nosave = val
@@ -561,6 +588,10 @@ class Config(object):
     def set_building(self, val=True):
         self.base._building = val
 
+# The global settings Terminal.reconfigure and ProfileSettings read, the
+# others do not make terminals reconfigure when they change
+TERMINAL_GLOBALS = ['inactive_color_offset', 'merge_url_matches']
+
 class ConfigBase(Borg):
     """Class to provide access to our user configuration"""
     loaded = None
@@ -576,6 +607,14 @@ class ConfigBase(Borg):
     _dirty = None
     _nosave = None
     _building = None
+    _savedtext = None
+    _savetext = None
+    _savetimer = None
+    _savelock = None
+    # Bumped on every change, for caches of values derived from the config
+    generation = 0
+    _fingerprints = None
+    _fpgeneration = None
 
     def __init__(self):
         """Class initialiser"""
@@ -593,6 +632,8 @@ class ConfigBase(Borg):
         """Set up our borg environment"""
         if self.loaded is None:
             self.loaded = False
+        if self._savelock is None:
+            self._savelock = threading.Lock()
         if self.whined is None:
             self.whined = False
         if self.sections is None:
@@ -712,25 +753,38 @@ class ConfigBase(Borg):
 
         dbg('looking for config file: %s' % filename)
         try:
-            configfile = open(filename, 'r')
+            data = open(filename, 'r').read()
+            cachekey = configcache.fingerprint(filename, data)
         except Exception, ex:
             if not self.whined:
                 err('ConfigBase::load: Unable to open %s (%s)' % (filename, ex))
                 self.whined = True
             return
+        self.generation += 1
         # If we have successfully loaded a config, allow future whining
         self.whined = False
+        # Saving the same contents back is a no-op
+        self._savedtext = data
+
+        cached = configcache.load(filename, cachekey)
+        if cached is not None:
+            dbg('ConfigBase::load: using cached config')
+            for section_name in self.sections:
+                getattr(self, section_name).update(cached[section_name])
+            self.loaded = True
+            return
 
         try:
             configspec = self.defaults_to_configspec()
-            parser = ConfigObj(configfile, configspec=configspec)
+            parser = ConfigObj(StringIO(data), configspec=configspec)
             validator = Validator()
             result = parser.validate(validator, preserve_errors=True)
         except Exception, ex:
             err('Unable to load configuration: %s' % ex)
             return
 
-        if result != True:
+        valid = result == True
+        if not valid:
             err('ConfigBase::load: config format is not valid')
             for (section_list, key, _other) in flatten_errors(parser, result):
                 if key is not None:
@@ -782,6 +836,9 @@ class ConfigBase(Borg):
                     dbg('ConfigBase::load: skipping missing section %s' %
                             section_name)
 
+        if valid:
+            # Keep whining about an invalid config until it is fixed
+            configcache.save(filename, cachekey, self.get_undo_tree())
         self.loaded = True
 
     def reload(self):
@@ -808,7 +865,8 @@ class ConfigBase(Borg):
         self._dirty = False
 
 
-        # FIXME this craziness must be purged asap.
+        # Render on the main loop, the sections are not ours to share with
+        # a writer thread. FIXME this craziness must be purged asap.
         parser = ConfigObj()
         parser.indent_type = '  '
 
@@ -833,15 +891,49 @@ class ConfigBase(Borg):
             dbg('ConfigBase::save: Processing plugin: %s' % plugin)
             parser['plugins'][plugin] = self.plugins[plugin]
 
-        config_dir = get_config_dir()
-        if not os.path.isdir(config_dir):
-            os.makedirs(config_dir)
-        try:
-            parser.write(open(self.command_line_options.config, 'w'))
-        except Exception, ex:
-            err('ConfigBase::save: Unable to save config: %s' % ex)
+        text = StringIO()
+        parser.write(text)
+        text = text.getvalue()
+        if text == self._savedtext:
+            dbg('~ConfigBase::save: CONFIG UNCHANGED')
+            self._savetext = None
+            return(True)
 
-        self._dirty = False
+        # Focus changes come in bursts, write once things settle down
+        self._savetext = text
+        if not self._savetimer:
+            self._savetimer = GLib.timeout_add(SAVE_DELAY, self.on_save_due)
+        return(True)
+
+    def on_save_due(self):
+        """Save timer callback, write the config off the main loop"""
+        self._savetimer = None
+        # Not a daemon, so a save started just before quitting is finished
+        # rather than cut off at exit
+        thread = threading.Thread(target=self.flush_save, name='ConfigSave')
+        thread.start()
+        return(False)
+
+    def flush_save(self):
+        """Write out a pending save now. Called from the save thread, and
+        on exit so the last changes are not lost"""
+        if self._savetimer:
+            # Written now, the timer has nothing left to do
+            GLib.source_remove(self._savetimer)
+            self._savetimer = None
+        with self._savelock:
+            text = self._savetext
+            self._savetext = None
+            if text is None or text == self._savedtext:
+                return
+            try:
+                config_dir = get_config_dir()
+                if not os.path.isdir(config_dir):
+                    os.makedirs(config_dir)
+                write_atomic(self.command_line_options.config, text)
+                self._savedtext = text
+            except Exception, ex:
+                err('ConfigBase::save: Unable to save config: %s' % ex)
 
     def cleancfg(self, indict):
         """Make saved config tidy. Layout sections so far."""
@@ -879,18 +971,18 @@ class ConfigBase(Borg):
             profile = 'default'
 
         if self.global_config.has_key(key):
-            dbg('ConfigBase::get_item: %s found in globals: %s' %
-                    (key, self.global_config[key]))
+            dbg('ConfigBase::get_item: %s found in globals: %s',
+                    key, self.global_config[key])
             return(self.global_config[key])
         elif self.profiles[profile].has_key(key):
-            dbg('ConfigBase::get_item: %s found in profile %s: %s' % (
-                    key, profile, self.profiles[profile][key]))
+            dbg('ConfigBase::get_item: %s found in profile %s: %s',
+                    key, profile, self.profiles[profile][key])
             return(self.profiles[profile][key])
         elif key == 'keybindings':
             return(self.keybindings)
         elif plugin and plugin in self.plugins and key in self.plugins[plugin]:
-            dbg('ConfigBase::get_item: %s found in plugin %s: %s' % (
-                    key, plugin, self.plugins[plugin][key]))
+            dbg('ConfigBase::get_item: %s found in plugin %s: %s',
+                    key, plugin, self.plugins[plugin][key])
             return(self.plugins[plugin][key])
         elif default:
             return default
@@ -899,8 +991,8 @@ class ConfigBase(Borg):
 
     def set_item(self, key, value, profile='default', plugin=None):
         """Set a configuration item"""
-        dbg('ConfigBase::set_item: Setting %s=%s (profile=%s, plugin=%s)' %
-                (key, value, profile, plugin))
+        dbg('ConfigBase::set_item: Setting %s=%s (profile=%s, plugin=%s)',
+                key, value, profile, plugin)
 
         if self.global_config.has_key(key):
             self.global_config[key] = value
@@ -916,6 +1008,7 @@ class ConfigBase(Borg):
             raise KeyError('ConfigBase::set_item: unknown key %s' % key)
 
         self._dirty = True
+        self.generation += 1
         return(True)
 
     def get_plugin(self, plugin):
@@ -940,8 +1033,23 @@ class ConfigBase(Borg):
             return(False)
         self.profiles[profile] = copy(DEFAULTS['profiles']['default'])
         self._dirty = True
+        self.generation += 1
         return(True)
 
+    def fingerprint(self, profile):
+        """Return the settings of profile and the global settings a
+        terminal reads as one value, to tell whether they changed since it
+        was last taken. Memoized until the next change of the config"""
+        if self._fpgeneration != self.generation:
+            self._fingerprints = {}
+            self._fpgeneration = self.generation
+        if not self._fingerprints.has_key(profile):
+            self._fingerprints[profile] = repr((
+                    [self.global_config.get(key) for key in TERMINAL_GLOBALS],
+                    sorted(self.profiles.keys()),
+                    sorted(self.profiles.get(profile, {}).items())))
+        return(self._fingerprints[profile])
+
     def add_layout(self, name, layout):
         """Add a new layout"""
         if name in self.layouts:
@@ -0,0 +1,128 @@
+#!/usr/bin/env python2
+# Terminator by Chris Jones <cmsj@tenshu.net>
+# GPL v2 only
+"""configcache.py - binary cache of the validated config
+
+Parsing and validating config92 with ConfigObj is the slowest part of
+reading the config, and every terminator process does it, including the
+ones that only hand their command line to the DBus master. The sections
+merged from a validated config are stored next to the config file, keyed
+by its mtime, size and content hash, and reused until the file changes.
+
+The sections are plain dicts, lists, strings and numbers, so they are
+stored with marshal rather than pickle: loading a cache can not run code.
+A cache is only used if it belongs to us and nobody else can write to it,
+and it carries a digest against damage. A cache that fails the checks is
+ignored and the config is parsed and validated again.
+
+>>> import tempfile, shutil
+>>> tmpdir = tempfile.mkdtemp()
+>>> filename = os.path.join(tmpdir, 'config92')
+>>> open(filename, 'w').write('[global_config]\\n')
+>>> key = fingerprint(filename)
+>>> load(filename, key) is None
+True
+>>> save(filename, key, {'global_config': {'focus': 'sloppy'}})
+>>> load(filename, key)
+{'global_config': {'focus': 'sloppy'}}
+>>> open(filename, 'a').write('  focus = mouse\\n')
+>>> load(filename, fingerprint(filename)) is None
+True
+>>> data = open(cache_path(filename)).read()
+>>> open(cache_path(filename), 'w').write(data[:-4] + 'XXXX')
+>>> load(filename, key) is None
+True
+>>> save(filename, key, {'global_config': {'focus': 'sloppy'}})
+>>> os.chmod(cache_path(filename), 0666)
+>>> load(filename, key) is None
+True
+>>> shutil.rmtree(tmpdir)
+
+"""
+
+import os
+import stat
+import hashlib
+import marshal
+from util import dbg, write_atomic
+
+CACHE_VERSION = 2
+MAGIC = 'terminator-config-cache %d\n' % CACHE_VERSION
+
+def cache_path(filename):
+    """Where the cache of the config in filename lives"""
+    return('%s.cache' % filename)
+
+def fingerprint(filename, data=None):
+    """Identify the current contents of a config file. Also changes when
+    the config module, and with it DEFAULTS, is updated"""
+    stat = os.stat(filename)
+    if data is None:
+        data = open(filename, 'rb').read()
+    try:
+        module = os.stat(__file__.replace('configcache', 'config'))
+        module = (module.st_mtime, module.st_size)
+    except OSError:
+        module = None
+    return((stat.st_mtime, stat.st_size, hashlib.sha1(data).hexdigest(),
+            module))
+
+def plain(value):
+    """Copy ConfigObj sections into plain dicts, marshal only takes the
+    builtin types"""
+    if isinstance(value, dict):
+        return(dict([(key, plain(item)) for key, item in value.iteritems()]))
+    return(value)
+
+def load(filename, key):
+    """Return the cached sections for the config in filename, or None if
+    there is no cache for key or it is damaged"""
+    try:
+        cachefile = open(cache_path(filename), 'rb')
+    except IOError:
+        return(None)
+    try:
+        info = os.fstat(cachefile.fileno())
+        if info.st_uid != os.getuid() or \
+           info.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+            dbg('configcache::load: cache is not ours or writable by others')
+            return(None)
+        data = cachefile.read()
+    finally:
+        cachefile.close()
+    if not data.startswith(MAGIC):
+        dbg('configcache::load: unknown cache format')
+        return(None)
+    digest, _sep, payload = data[len(MAGIC):].partition('\n')
+    if hashlib.sha1(payload).hexdigest() != digest:
+        dbg('configcache::load: cache failed its integrity check')
+        return(None)
+    try:
+        cachedkey, sections = marshal.loads(payload)
+        if not isinstance(sections, dict):
+            raise ValueError('sections are not a dict')
+    except Exception, ex:
+        dbg('configcache::load: unreadable cache: %s' % ex)
+        return(None)
+    if cachedkey != key:
+        dbg('configcache::load: config changed since it was cached')
+        return(None)
+    return(sections)
+
+def save(filename, key, sections):
+    """Cache sections for the config in filename. Written atomically, so
+    a concurrent load never sees half a cache"""
+    path = cache_path(filename)
+    try:
+        payload = marshal.dumps((key, plain(sections)))
+    except ValueError, ex:
+        dbg('configcache::save: unable to store the config: %s' % ex)
+        return
+    try:
+        write_atomic(path, '%s%s\n%s' % (MAGIC,
+                                         hashlib.sha1(payload).hexdigest(),
+                                         payload))
+    except (IOError, OSError), ex:
+        dbg('configcache::save: unable to write %s: %s' % (path, ex))
+
+# vim: set expandtab ts=4 sw=4:
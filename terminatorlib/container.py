@@ -16,6 +16,9 @@ from signalman import Signalman
 class Container(object):
     """Base class for Terminator Containers"""
 
+    # What Factory.isinstance() and Factory.type() answer for us
+    node_kinds = frozenset(['Container'])
+    node_type = None
     terminator = None
     immutable = None
     children = None
@@ -308,13 +311,13 @@ the tab will also close all terminals within it.')
         if mytype == 'VPaned' or mytype == 'HPaned':
             for child in children:
                 if hasattr(child, 'zombie') and child.zombie:
-                    dbg('~ZOMBIE %s spotted in %s' % (child.config_section, self.config_section))
+                    dbg('~ZOMBIE %s spotted in %s', child.config_section, self.config_section)
                     return False
             paned = True
 
         name = "%s%s" % (self.config.name_next(), mytype[0].lower())
         self.config_section = name
-        dbg('~DESCRIBE  [%s:%s of %s]' % (mytype, name, parent))
+        dbg('~DESCRIBE  [%s:%s of %s]', mytype, name, parent)
 
         if mytype == 'Window':
             layout['title'] = self.get_custom_title()
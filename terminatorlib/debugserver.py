@@ -5,7 +5,7 @@
 # Use of this file is unrestricted provided this notice is retained.
 # If you use it, it'd be nice if you dropped me a note.  Also beer.
 
-from terminatorlib.util import dbg, err
+from terminatorlib.util import dbg, err, dump_debug
 from terminatorlib.version import APP_NAME, APP_VERSION
 
 import socket
@@ -164,6 +164,7 @@ class TerminatorConsole(code.InteractiveConsole):
 
 
 def spawn(env):
+  env['dump_debug'] = dump_debug
   PythonConsoleServer.env = env
   tcpserver = SocketServer.TCPServer(('127.0.0.1', 0), PythonConsoleServer)
   dbg("debugserver: listening on %s" % str(tcpserver.server_address))
@@ -63,7 +63,7 @@ class EditableLabel(Gtk.EventBox):
     def set_text(self, text, force=False):
         """set the text of the label"""
         self._autotext = text
-        if not self._custom or force:
+        if (not self._custom or force) and self._label.get_text() != text:
             self._label.set_text(text)
 
     def get_text(self):
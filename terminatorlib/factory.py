@@ -33,9 +33,6 @@ class Factory(Borg):
              'Notebook': 'notebook',
              'Container': 'container',
              'Window': 'window'}
-    types_keys = types.keys()
-    instance_types = {}
-    instance_types_keys = []
 
     def __init__(self):
         """Class initialiser"""
@@ -47,40 +44,18 @@ class Factory(Borg):
         pass
 
     def isinstance(self, product, classtype):
-        """Check if a given product is a particular type of object"""
-        if classtype in self.types_keys:
-            # This is now very ugly, but now it's fast :-)
-            # Someone with real Python skills should fix this to be less insane.
-            # Optimisations:
-            # - swap order of imports, otherwise we throw ImportError
-            #   almost every time
-            # - cache everything we can
-            try:
-                type_key = 'terminatorlib.%s' % self.types[classtype]
-                if type_key not in self.instance_types_keys:
-                    self.instance_types[type_key] = __import__(type_key, None, None, [''])
-                    self.instance_types_keys.append(type_key)
-                module = self.instance_types[type_key]
-            except ImportError:
-                type_key = self.types[classtype]
-                if type_key not in self.instance_types_keys:
-                    self.instance_types[type_key] = __import__(type_key, None, None, [''])
-                    self.instance_types_keys.append(type_key)
-                module = self.instance_types[type_key]
-            return(isinstance(product, getattr(module, classtype)))
+        """Check if a given product is a particular type of object. Our
+        classes list what they are in node_kinds, so this needs neither
+        imports nor a walk of the class hierarchy"""
+        if classtype in self.types:
+            return(classtype in getattr(product, 'node_kinds', ()))
         else:
             err('Factory::isinstance: unknown class type: %s' % classtype)
             return(False)
 
     def type(self, product):
         """Determine the type of an object we've previously created"""
-        for atype in self.types:
-            # Skip over generic types
-            if atype in ['Container', 'Paned']:
-                continue
-            if self.isinstance(product, atype):
-                return(atype)
-        return(None)
+        return(getattr(product, 'node_type', None))
 
     def make(self, product, **kwargs):
         """Make the requested product"""
@@ -0,0 +1,142 @@
+#!/usr/bin/env python2
+# Terminator by Chris Jones <cmsj@tenshu.net>
+# GPL v2 only
+"""forward.py - hand a command line to a running Terminator over DBus
+
+When a DBus master is already running, a new terminator process only has
+to parse its command line and ask the master for a window or a tab. This
+module does that with the standard library and dbus alone, before the
+terminator script loads Gtk, VTE or the config. Anything it can not do
+cheaply falls through to the normal startup, which still forwards if it
+finds a master after all.
+
+>>> bus_name(':0.0') == bus_name(':0.1') == bus_name(':0')
+True
+>>> bus_name(':0') != bus_name(':1')
+True
+>>> bus_name('')
+'net.tenshu.Terminator2'
+>>> class Options(object): pass
+>>> opts = Options()
+>>> opts.maximise, opts.execute, opts.title = True, ['ls', '-l'], None
+>>> sorted(flatten_options(opts).items())
+[('execute', 'ls -l'), ('maximise', 'True'), ('title', '')]
+>>> config_disables_dbus(['[global_config]', '  focus = mouse',
+...                       '  dbus = False', '[profiles]'])
+True
+>>> config_disables_dbus(['[global_config]', '[profiles]', '  [[default]]',
+...                       '    dbus = False'])
+False
+>>> config_disables_dbus([])
+False
+
+"""
+
+import os
+import sys
+
+BUS_BASE = 'net.tenshu.Terminator2'
+BUS_PATH = '/net/tenshu/Terminator2'
+
+# Options that need the full startup even with a master running
+LOCAL_OPTIONS = ['version', 'select', 'nodbus', 'debug', 'debug_ring']
+
+def bus_name(display=None):
+    """The bus name of the master serving display, $DISPLAY by default.
+    The screen number is left out, one master serves every screen"""
+    if display is None:
+        display = os.environ.get('DISPLAY', '')
+    if not display:
+        return(BUS_BASE)
+    return('%s%s' % (BUS_BASE, hex(hash(display.partition('.')[0]))))
+
+def config_path(options):
+    """The config file the normal startup would read"""
+    if options.config:
+        return(options.config)
+    configdir = os.environ.get('XDG_CONFIG_HOME',
+                               os.path.join(os.path.expanduser('~'),
+                                            '.config'))
+    return(os.path.join(configdir, 'terminator', 'config92'))
+
+def config_disables_dbus(lines):
+    """Check the lines of a config file for dbus = False in its
+    global_config section, without parsing and validating all of it"""
+    section = None
+    for line in lines:
+        line = line.split('#', 1)[0].strip()
+        if line.startswith('['):
+            section = line
+        elif section == '[global_config]' and '=' in line:
+            key, value = [part.strip() for part in line.split('=', 1)]
+            if key == 'dbus':
+                return(value.strip('"\'').lower() in
+                       ['false', 'no', 'off', '0'])
+    return(False)
+
+def flatten_options(options):
+    """Turn parsed options into the string dict the master expects. None
+    becomes '', True 'True' and lists (-x arguments) are joined"""
+    optionslist = {}
+    for opt, val in options.__dict__.items():
+        if type(val) == type([]):
+            val = ' '.join(val)
+        if val == True:
+            val = 'True'
+        optionslist[opt] = val and '%s'%val or ''
+    return(optionslist)
+
+def forward_to_master(origcwd):
+    """Ask a running master to open a window or tab for our command line.
+    Returns True if it did, False if the normal startup has to run"""
+    from optionparse import build_parser
+    options, args = build_parser().parse_args()
+    if args:
+        return(False)
+    for opt in LOCAL_OPTIONS:
+        if getattr(options, opt, None):
+            return(False)
+    try:
+        if config_disables_dbus(open(config_path(options))):
+            return(False)
+    except IOError:
+        pass
+
+    try:
+        import dbus
+        from dbus.exceptions import DBusException
+    except ImportError:
+        return(False)
+
+    try:
+        bus = dbus.SessionBus()
+        name = bus_name()
+        if not bus.name_has_owner(name):
+            return(False)
+
+        if options.working_directory:
+            directory = os.path.expanduser(options.working_directory)
+            if os.path.exists(directory):
+                options.working_directory = directory
+            else:
+                sys.stderr.write('%s does not exist\n' %
+                                 options.working_directory)
+                options.working_directory = ''
+        else:
+            options.working_directory = origcwd
+        if options.layout is None:
+            options.layout = 'default'
+        # The profile is checked against the config by the master
+
+        optionslist = dbus.Dictionary(flatten_options(options),
+                                      signature='ss')
+        proxy = bus.get_object(name, BUS_PATH)
+        if options.new_tab:
+            proxy.new_tab_cmdline(optionslist, dbus_interface=name)
+        else:
+            proxy.new_window_cmdline(optionslist, dbus_interface=name)
+    except DBusException:
+        return(False)
+    return(True)
+
+# vim: set expandtab ts=4 sw=4:
@@ -3,7 +3,6 @@
 # GPL v2 only
 """ipc.py - DBus server and API calls"""
 
-from gi.repository import Gdk
 import dbus.service
 from dbus.exceptions import DBusException
 import dbus.glib
@@ -12,6 +11,7 @@ from terminator import Terminator
 from config import Config
 from factory import Factory
 from util import dbg,  enumerate_descendants
+from forward import BUS_BASE, BUS_PATH, bus_name
 
 CONFIG = Config()
 if not CONFIG['dbus']:
@@ -19,14 +19,9 @@ if not CONFIG['dbus']:
     dbg('dbus disabled')
     raise ImportError
 
-BUS_BASE = 'net.tenshu.Terminator2'
-BUS_PATH = '/net/tenshu/Terminator2'
-try:
-    # Try and include the X11 display name in the dbus bus name
-    DISPLAY  = hex(hash(Gdk.get_display().partition('.')[0]))
-    BUS_NAME = '%s%s' % (BUS_BASE, DISPLAY)
-except:
-    BUS_NAME = BUS_BASE
+# Include the X11 display name in the dbus bus name. The forwarding fast
+# path computes it before Gtk is loaded, so it comes from $DISPLAY
+BUS_NAME = bus_name()
 
 class DBusService(Borg, dbus.service.Object):
     """DBus Server class. This is implemented as a Borg"""
@@ -59,13 +54,23 @@ class DBusService(Borg, dbus.service.Object):
         if not self.terminator:
             self.terminator = Terminator()
 
+    def set_cmdline_options(self, options):
+        """Make the command line of a forwarding process our options. It
+        was parsed without the config, so check the profile here"""
+        if options.get('profile') and \
+           options['profile'] not in self.terminator.config.list_profiles():
+            dbg('unknown profile %s, using the default' % options['profile'])
+            options['profile'] = ''
+        oldopts = self.terminator.config.options_get()
+        oldopts.__dict__ = options
+        self.terminator.config.options_set(oldopts)
+        return(oldopts)
+
     @dbus.service.method(BUS_NAME, in_signature='a{ss}')
     def new_window_cmdline(self, options=dbus.Dictionary()):
         """Create a new Window"""
         dbg('dbus method called: new_window with parameters %s'%(options))
-        oldopts = self.terminator.config.options_get()
-        oldopts.__dict__ = options
-        self.terminator.config.options_set(oldopts)
+        oldopts = self.set_cmdline_options(options)
         self.terminator.create_layout(oldopts.layout)
         self.terminator.layout_done()
             
@@ -73,9 +78,7 @@ class DBusService(Borg, dbus.service.Object):
     def new_tab_cmdline(self, options=dbus.Dictionary()):
         """Create a new tab"""
         dbg('dbus method called: new_tab with parameters %s'%(options))
-        oldopts = self.terminator.config.options_get()
-        oldopts.__dict__ = options
-        self.terminator.config.options_set(oldopts)
+        self.set_cmdline_options(options)
         window = self.terminator.get_windows()[0]
         window.tab_new()
 
@@ -183,6 +186,22 @@ class DBusService(Borg, dbus.service.Object):
                 if terminal in terms:
                     return root_widget.get_tab_label(tab_child).get_label()
 
+    @dbus.service.method(BUS_NAME, out_signature='a{sd}')
+    def get_terminal_metrics(self, uuid=None):
+        """Return the output metrics of a given terminal"""
+        terminal = self.terminator.find_terminal_by_uuid(uuid)
+        if not terminal:
+            return {}
+        return terminal.get_metrics()
+
+    @dbus.service.method(BUS_NAME, out_signature='a{sa{sd}}')
+    def get_metrics(self):
+        """Return the output metrics of all terminals, by UUID"""
+        result = {}
+        for terminal in self.terminator.terminals:
+            result[terminal.uuid.urn] = terminal.get_metrics()
+        return result
+
 def with_proxy(func):
     """Decorator function to connect to the session dbus bus"""
     dbg('dbus client call: %s' % func.func_name)
@@ -247,3 +266,31 @@ def get_tab_title(session, uuid, options):
     """Call the dbus method to return the title of a tab"""
     print session.get_tab_title(uuid)
 
+def format_metrics(metrics):
+    """Return the rates of a dict of metrics in one line"""
+    return '%8.1f lines/s %8.1f changes/s  py %5.1f%%  vte %5.1f%%' % (
+        metrics.get('lines_per_second', 0),
+        metrics.get('changes_per_second', 0),
+        metrics.get('handler_load', 0) * 100,
+        metrics.get('draw_load', 0) * 100)
+
+@with_proxy
+def get_terminal_metrics(session, uuid, options):
+    """Call the dbus method to return the output metrics of a terminal"""
+    metrics = session.get_terminal_metrics(uuid)
+    if not metrics:
+        print 'No metrics, is the output_metrics option on?'
+        return
+    for name in sorted(metrics.keys()):
+        print '%s: %s' % (name, metrics[name])
+
+@with_proxy
+def get_metrics(session, options):
+    """Call the dbus method to return the output metrics of all terminals,
+    the busiest first"""
+    metrics = session.get_metrics()
+    busiest = sorted(metrics.keys(), key=lambda uuid:
+                     -(metrics[uuid].get('handler_load', 0) +
+                       metrics[uuid].get('draw_load', 0)))
+    for uuid in busiest:
+        print '%s %s' % (uuid, format_metrics(metrics[uuid]))
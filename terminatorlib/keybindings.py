@@ -20,16 +20,26 @@
 Validator and functions for dealing with Terminator's customisable 
 keyboard shortcuts.
 
+A binding is a key with modifiers, like <Ctrl><Shift>o, or a chord of
+them separated by spaces, like "<Ctrl>a v". Keypresses are translated once
+per (hardware keycode, group, state) and the result is cached until the
+keymap or the bindings change, so a keypress usually costs a dict lookup.
+
 """
 
 import re
 from gi.repository import Gtk, Gdk
-from util import err
+from util import err, dbg
 
 class KeymapError(Exception):
     """Custom exception for errors in keybinding configurations"""
 
 MODIFIER = re.compile('<([^<]+)>')
+# lookup() result for a key that started or continued a chord
+CHORD_PENDING = '_chord_pending'
+# ms to wait for the next key of a chord
+CHORD_TIMEOUT = 1500
+
 class Keybindings:
     """Class to handle loading and lookup of Terminator keybindings"""
 
@@ -43,15 +53,25 @@ class Keybindings:
         'hyper':    Gdk.ModifierType.HYPER_MASK,
     }
 
-    empty = {}
     keys = None
     _masks = None
     _lookup = None
+    _strokes = None
+    _lastevent = None
+    _lastmapping = None
+    _pending = None
+    _pendingtime = None
 
     def __init__(self):
         self.keymap = Gdk.Keymap.get_default()
         self.configure({})
 
+    def watch_keymap(self):
+        """Forget the translated keypresses whenever the keymap changes.
+        The keymap lives as long as the process, only the instance looking
+        up keypresses should be connected to it"""
+        self.keymap.connect('keys-changed', self.on_keys_changed)
+
     def configure(self, bindings):
         """Accept new bindings and reconfigure with them"""
         self.keys = bindings
@@ -61,6 +81,7 @@ class Keybindings:
         """Parse bindings and mangle into an appropriate form"""
         self._lookup = {}
         self._masks = 0
+        self.forget()
         for action, bindings in self.keys.items():
             if not isinstance(bindings, tuple):
                 bindings = (bindings,)
@@ -70,26 +91,57 @@ class Keybindings:
                     continue
 
                 try:
-                    keyval, mask = self._parsebinding(binding)
-                    # Does much the same, but with poorer error handling.
-                    #keyval, mask = Gtk.accelerator_parse(binding)
+                    strokes = [self._parsestroke(part) for part in
+                               binding.split()]
                 except KeymapError as e:
                   err ("keybindings.reload failed to parse binding '%s': %s" % (binding, e))
                 else:
-                    if mask & Gdk.ModifierType.SHIFT_MASK:
-                        if keyval == Gdk.KEY_Tab:
-                            keyval = Gdk.KEY_ISO_Left_Tab
-                            mask &= ~Gdk.ModifierType.SHIFT_MASK
-                        else:
-                            keyvals = Gdk.keyval_convert_case(keyval)
-                            if keyvals[0] != keyvals[1]:
-                                keyval = keyvals[1]
-                                mask &= ~Gdk.ModifierType.SHIFT_MASK
-                    else:
-                        keyval = Gdk.keyval_to_lower(keyval)
-                    self._lookup.setdefault(mask, {})
-                    self._lookup[mask][keyval] = action
-                    self._masks |= mask
+                    self._bind(strokes, action, binding)
+
+    def _parsestroke(self, binding):
+        """Parse one key of a binding into its (mask, keyval) stroke"""
+        keyval, mask = self._parsebinding(binding)
+        # Does much the same, but with poorer error handling.
+        #keyval, mask = Gtk.accelerator_parse(binding)
+        if mask & Gdk.ModifierType.SHIFT_MASK:
+            if keyval == Gdk.KEY_Tab:
+                keyval = Gdk.KEY_ISO_Left_Tab
+                mask &= ~Gdk.ModifierType.SHIFT_MASK
+            else:
+                keyvals = Gdk.keyval_convert_case(keyval)
+                if keyvals[0] != keyvals[1]:
+                    keyval = keyvals[1]
+                    mask &= ~Gdk.ModifierType.SHIFT_MASK
+        else:
+            keyval = Gdk.keyval_to_lower(keyval)
+        self._masks |= mask
+        return((int(mask), keyval))
+
+    def _bind(self, strokes, action, binding):
+        """Add a binding of action to strokes. The keys of a chord lead
+        through nested dicts to the action"""
+        table = self._lookup
+        for stroke in strokes[:-1]:
+            table = table.setdefault(stroke, {})
+            if not isinstance(table, dict):
+                err("keybindings.reload: '%s' starts with the binding of %s"
+                    % (binding, table))
+                return
+        if table.has_key(strokes[-1]):
+            err("keybindings.reload: '%s' is already bound" % binding)
+            return
+        table[strokes[-1]] = action
+
+    def forget(self):
+        """Drop the translated keypresses and any chord in progress"""
+        self._strokes = {}
+        self._lastevent = None
+        self._pending = None
+
+    def on_keys_changed(self, _keymap):
+        """The keymap changed, keypresses translate differently now"""
+        dbg('Keybindings::on_keys_changed: keymap changed')
+        self.forget()
 
     def _parsebinding(self, binding):
         """Parse an individual binding using gtk's binding function"""
@@ -113,17 +165,56 @@ class Keybindings:
         except KeyError:
             raise KeymapError("Unhandled modifier '<%s>'" % modifier)
 
-    def lookup(self, event):
-        """Translate a keyboard event into a mapped key"""
-        try:
-            _found, keyval, _egp, _lvl, consumed = self.keymap.translate_keyboard_state(
-                                              event.hardware_keycode, 
-                                              Gdk.ModifierType(event.get_state() & ~Gdk.ModifierType.LOCK_MASK),
-                                              event.group)
-        except TypeError:
-            err ("keybindings.lookup failed to translate keyboard event: %s" % 
-                     dir(event))
-            return None
-        mask = (event.get_state() & ~consumed) & self._masks
-        return self._lookup.get(mask, self.empty).get(keyval, None)
+    def _translate(self, event):
+        """Return the (mask, keyval) stroke of a keyboard event"""
+        state = int(event.get_state())
+        key = (event.hardware_keycode, event.group, state)
+        stroke = self._strokes.get(key)
+        if stroke is None:
+            try:
+                _found, keyval, _egp, _lvl, consumed = self.keymap.translate_keyboard_state(
+                                                  event.hardware_keycode, 
+                                                  Gdk.ModifierType(state & ~Gdk.ModifierType.LOCK_MASK),
+                                                  event.group)
+            except TypeError:
+                err ("keybindings.lookup failed to translate keyboard event: %s" % 
+                         dir(event))
+                return None
+            stroke = ((state & ~consumed) & self._masks, keyval)
+            self._strokes[key] = stroke
+        return(stroke)
 
+    def lookup(self, event):
+        """Translate a keyboard event into a mapped key. Returns
+        CHORD_PENDING for keys that are part of an unfinished chord. The
+        Window and the Terminal both look up each keypress, the result for
+        the last event is remembered so a chord advances only once"""
+        eventkey = (event.get_time(), event.hardware_keycode, event.group,
+                    int(event.get_state()))
+        if eventkey == self._lastevent:
+            return(self._lastmapping)
+        mapping = self._lookup_event(event)
+        self._lastevent = eventkey
+        self._lastmapping = mapping
+        return(mapping)
+
+    def _lookup_event(self, event):
+        """Find what a keyboard event is bound to, walking chords"""
+        if event.is_modifier:
+            # Pressing the modifiers of the next key of a chord
+            return(None)
+        stroke = self._translate(event)
+        if stroke is None:
+            return(None)
+
+        table = self._lookup
+        if self._pending is not None:
+            if event.get_time() - self._pendingtime <= CHORD_TIMEOUT:
+                table = self._pending
+            self._pending = None
+        mapping = table.get(stroke)
+        if isinstance(mapping, dict):
+            self._pending = mapping
+            self._pendingtime = event.get_time()
+            return(CHORD_PENDING)
+        return(mapping)
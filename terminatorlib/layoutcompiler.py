@@ -0,0 +1,140 @@
+#!/usr/bin/env python2
+# Terminator by Chris Jones <cmsj@tenshu.net>
+# GPL v2 only
+"""layoutcompiler.py - wind a flat layout section into a tree
+
+A layout is stored as flat objects that name their parent. compile_layout
+indexes the children of every object in one pass and then walks down from
+the windows, so building the tree is linear in the number of objects.
+Objects that can not be reached from a window are reported, either as
+orphans whose parent does not exist or as part of a parent cycle. The tree
+is made of LayoutNodes, which can not be changed by the widgets consuming
+them.
+
+>>> layout = {
+...     'window0': {'type': 'Window', 'parent': '', 'size': [800, 600]},
+...     'child1': {'type': 'VPaned', 'parent': 'window0', 'ratio': '0.5'},
+...     'terminal2': {'type': 'Terminal', 'parent': 'child1'},
+...     'terminal3': {'type': 'Terminal', 'parent': 'child1', 'title': ''},
+...     'NewT': {'type': 'Defstub'},
+...     'lost': {'type': 'Terminal', 'parent': 'nowhere'},
+...     'loop1': {'type': 'VPaned', 'parent': 'loop2'},
+...     'loop2': {'type': 'VPaned', 'parent': 'loop1'},
+... }
+>>> windows, problems = compile_layout(layout)
+>>> windows.keys()
+['window0']
+>>> window = windows['window0']
+>>> sorted(window.keys())
+['children', 'size', 'type']
+>>> window['size']
+(800, 600)
+>>> paned = window['children']['child1']
+>>> sorted(paned['children'].keys())
+['terminal2', 'terminal3']
+>>> paned['children']['terminal3']['title']
+''
+>>> for problem in problems:
+...     print problem
+layout objects loop1, loop2 are their own ancestors
+layout object lost is orphaned, its parent nowhere is missing
+>>> paned['ratio'] = '0.3'
+Traceback (most recent call last):
+...
+TypeError: layout nodes are read only
+
+"""
+
+class LayoutNode(dict):
+    """An object of a compiled layout. Read only, like the tree it is in"""
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError('layout nodes are read only')
+
+    __setitem__ = __delitem__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+    def __copy__(self):
+        return(self)
+
+    def __deepcopy__(self, memo):
+        return(self)
+
+def freeze(value):
+    """Make lists from the config into tuples"""
+    if isinstance(value, list):
+        return(tuple(value))
+    return(value)
+
+def compile_layout(layout):
+    """Return (windows, problems). windows maps the name of each Window of
+    layout to its tree, where every object has a children dict of its
+    children by name. problems lists the objects that were left out"""
+    problems = []
+    children = {}
+    windows = []
+    for name, obj in layout.iteritems():
+        objtype = obj.get('type')
+        if objtype == 'Defstub':
+            continue
+        if not objtype:
+            problems.append('layout object %s has no type' % name)
+        elif objtype.lower() == 'window':
+            windows.append(name)
+        elif not obj.get('parent'):
+            problems.append('layout object %s has no parent' % name)
+        else:
+            children.setdefault(obj['parent'], []).append(name)
+
+    # Parents come before their children in order
+    order = windows[:]
+    idx = 0
+    while idx < len(order):
+        order.extend(children.get(order[idx], ()))
+        idx += 1
+    placed = set(order)
+
+    # So a node's children are built by the time it is
+    built = {}
+    for name in reversed(order):
+        obj = layout[name]
+        if name in windows:
+            # Windows are always of type Window and skip empty settings
+            items = [(key, freeze(value)) for key, value in obj.iteritems()
+                     if value != '' and key != 'type']
+            items.append(('type', 'Window'))
+        else:
+            items = [(key, freeze(value)) for key, value in obj.iteritems()]
+        items.append(('children', LayoutNode([(kid, built[kid]) for kid in
+                                              children.get(name, ())])))
+        built[name] = LayoutNode(items)
+    tree = LayoutNode([(name, built[name]) for name in windows])
+
+    unplaced = set(name for parent in children for name in children[parent]
+                   if name not in placed)
+    problems.extend(explain_unplaced(layout, unplaced))
+    return(tree, problems)
+
+def explain_unplaced(layout, unplaced):
+    """Describe why objects could not be reached from a window. Each is
+    either below an orphan or in, or below, a parent cycle"""
+    problems = []
+    explained = set()
+    for name in sorted(unplaced):
+        chain = []
+        current = name
+        while current in unplaced and current not in explained and \
+              current not in chain:
+            chain.append(current)
+            current = layout[current]['parent']
+        explained.update(chain)
+        if current in chain:
+            cycle = sorted(chain[chain.index(current):])
+            problems.append('layout objects %s are their own ancestors' %
+                            ', '.join(cycle))
+        elif current not in unplaced:
+            problems.append('layout object %s is orphaned, its parent %s '
+                            'is missing' % (chain[-1], current))
+    return(problems)
+
+# vim: set expandtab ts=4 sw=4:
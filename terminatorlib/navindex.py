@@ -0,0 +1,127 @@
+#!/usr/bin/env python2
+# Terminator by Chris Jones <cmsj@tenshu.net>
+# GPL v2 only
+"""navindex.py - find the terminal to move to for directional navigation
+
+Window.navigate_terminal used to walk the widget tree twice for every
+keypress and compare the allocation of each visible terminal with the
+current one. A NavIndex is built from the terminals of a window and the
+allocations of the visible ones, and keeps them sorted by each edge. A
+query bisects to the terminals beyond the current edge and stops at the
+first distance that has a terminal overlapping the current one.
+
+>>> order = ['a', 'b', 'c', 'd', 'hidden']
+>>> rects = {'a': (0, 0, 50, 50), 'b': (50, 0, 50, 50),
+...          'c': (0, 50, 50, 50), 'd': (50, 50, 50, 50)}
+>>> index = NavIndex(order, rects)
+>>> index.find('a', 'right'), index.find('a', 'down'), index.find('d', 'up')
+('b', 'c', 'b')
+>>> index.find('a', 'left') is None
+True
+>>> index.find('d', 'next'), index.find('a', 'prev')
+('a', 'd')
+>>> index.find('hidden', 'next')
+'a'
+>>> wide = NavIndex(['top', 'left', 'right'], {'top': (0, 0, 100, 50),
+...     'left': (0, 50, 40, 50), 'right': (40, 50, 60, 50)})
+>>> wide.find('top', 'down')
+'right'
+
+"""
+
+from bisect import bisect_left, bisect_right
+
+class NavIndex(object):
+    """Visible terminals of a window sorted by each edge of them"""
+
+    order = None
+    position = None
+    rects = None
+    visible = None
+    visiblepos = None
+    edges = None
+
+    def __init__(self, order, rects):
+        """Class initialiser. order lists all terminals of the window in
+        the order of next/prev, rects maps the visible ones to their
+        (x, y, width, height)"""
+        self.order = list(order)
+        self.position = dict([(term, idx) for idx, term in
+                              enumerate(self.order)])
+        self.rects = dict(rects)
+        self.visible = [term for term in self.order if term in self.rects]
+        self.visiblepos = [self.position[term] for term in self.visible]
+        self.edges = {}
+        # Keyed by how far a terminal is beyond an edge, near ones first
+        for direction, near in (('left', lambda x, y, w, h: -(x + w)),
+                                ('right', lambda x, y, w, h: x),
+                                ('up', lambda x, y, w, h: -(y + h)),
+                                ('down', lambda x, y, w, h: y)):
+            entries = sorted([(near(*rect), self.position[term], term)
+                              for term, rect in self.rects.iteritems()])
+            self.edges[direction] = ([entry[0] for entry in entries],
+                                     [entry[2] for entry in entries])
+
+    def __contains__(self, terminal):
+        return(terminal in self.rects)
+
+    def __len__(self):
+        return(len(self.visible))
+
+    def find(self, terminal, direction):
+        """Return the terminal to move to from terminal, or None"""
+        if direction in ['next', 'prev']:
+            return(self.find_cyclic(terminal, direction))
+        if direction not in self.edges:
+            raise ValueError('Unknown direction: %s' % direction)
+        x, y, width, height = self.rects[terminal]
+        if direction == 'left':
+            edge, p1, p2 = -x, y, y + height
+        elif direction == 'right':
+            edge, p1, p2 = x + width, y, y + height
+        elif direction == 'up':
+            edge, p1, p2 = -y, x, x + width
+        else:
+            edge, p1, p2 = y + height, x, x + width
+
+        keys, terms = self.edges[direction]
+        winners = []
+        for idx in xrange(bisect_left(keys, edge), len(keys)):
+            if winners and keys[idx] != keys[idx - 1]:
+                break
+            rx, ry, rwidth, rheight = self.rects[terms[idx]]
+            if direction in ['left', 'right']:
+                q1, q2 = ry, ry + rheight
+            else:
+                q1, q2 = rx, rx + rwidth
+            if q1 <= p2 and q2 >= p1:
+                winners.append(terms[idx])
+        if len(winners) <= 1:
+            return(winners and winners[0] or None)
+
+        # Break an n-way tie using the middle of the current terminal
+        cursor_x = x + width / 2
+        cursor_y = y + height / 2
+        for term in winners:
+            rx, ry, rwidth, rheight = self.rects[term]
+            if direction in ['left', 'right']:
+                if cursor_y >= ry and cursor_y <= ry + rheight:
+                    return(term)
+            elif cursor_x >= rx and cursor_x <= rx + rwidth:
+                return(term)
+        return(winners[0])
+
+    def find_cyclic(self, terminal, direction):
+        """Return the visible terminal after (next) or before (prev)
+        terminal in the order of the window"""
+        if not self.visible:
+            return(None)
+        current = self.position[terminal]
+        # Visible terminals are in order too, so bisect for our neighbours
+        if direction == 'next':
+            idx = bisect_right(self.visiblepos, current)
+            return(self.visible[idx % len(self.visible)])
+        idx = bisect_left(self.visiblepos, current) - 1
+        return(self.visible[idx % len(self.visible)])
+
+# vim: set expandtab ts=4 sw=4:
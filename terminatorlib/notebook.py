@@ -21,10 +21,13 @@ from util import err, dbg, enumerate_descendants, make_uuid, uhoextract
 
 class Notebook(Container, Gtk.Notebook):
     """Class implementing a Gtk.Notebook container"""
+    node_kinds = frozenset(['Container', 'Notebook'])
+    node_type = 'Notebook'
     window = None
     last_active_term = None
     pending_on_tab_switch = None
     pending_on_tab_switch_args = None
+    pending_page = None
 
     def __init__(self, window):
         """Class initialiser"""
@@ -102,7 +105,7 @@ class Notebook(Container, Gtk.Notebook):
         layout  = {}
         name = "%sn" % self.config.name_next()
         self.config_section = name
-        dbg('~DESCRIBE  [Notebook:%s of %s]' % (name, parent))
+        dbg('~DESCRIBE  [Notebook:%s of %s]', name, parent)
 
         layout['type'] = 'Notebook'
         layout['parent'] = parent
@@ -174,12 +177,30 @@ class Notebook(Container, Gtk.Notebook):
             num = num + 1
 
         if layout.has_key('active_page'):
-            # Need to do it later, or layout changes result
-            GObject.idle_add(self.set_current_page, int(layout['active_page']))
+            # Need to do it later, or layout changes result. Until then
+            # get_shown_page() tells which page the user will see
+            self.pending_page = int(layout['active_page'])
+            GObject.idle_add(self.set_pending_page)
         else:
             self.set_current_page(0)
         dbg('XXY END layout for Notebook:%s of %s.' % (self.config_section, layout['parent']))
 
+    def set_pending_page(self):
+        """Idle callback, switch to the page the layout left active"""
+        if self.pending_page is not None:
+            self.set_current_page(self.pending_page)
+            self.pending_page = None
+            # Whatever page it ended up on, it is shown now
+            self.spawn_page(self.get_nth_page(self.get_current_page()))
+        return(False)
+
+    def get_shown_page(self):
+        """Return the number of the page that is, or is about to be, shown"""
+        if self.pending_page is not None and \
+           0 <= self.pending_page < self.get_n_pages():
+            return(self.pending_page)
+        return(self.get_current_page())
+
     def split_axis(self, widget, vertical=True, cwd=None, sibling=None, widgetfirst=True):
         """Split the axis of a terminal inside us"""
         dbg('~SPLIT PAgE: %s of %s [%s]' % (widget.config_section, self.config_section, sibling))
@@ -567,6 +588,7 @@ class Notebook(Container, Gtk.Notebook):
     ## WontFix. It does not bite hard and only once at start.
     def deferred_on_tab_switch(self, notebook, page,  page_num,  data=None):
         """Prime a single idle tab switch signal, using the most recent set of params"""
+        self.window.invalidate_navindex()
         tabs_last_active_term = self.last_active_term.get(self.get_nth_page(page_num),  None)
         data = {'tabs_last_active_term':tabs_last_active_term}
 
@@ -586,6 +608,7 @@ class Notebook(Container, Gtk.Notebook):
     ## descend here to the first child 'ensure_visible_and_focussed' capable
     def on_tab_switch(self, notebook, page,  page_num,  data=None):
         """Do the real work for a tab switch"""
+        self.spawn_page(self.get_nth_page(page_num))
         tabs_last_active_term = data['tabs_last_active_term']
         if tabs_last_active_term:
             term = self.terminator.find_terminal_by_uuid(tabs_last_active_term.urn)
@@ -593,6 +616,18 @@ class Notebook(Container, Gtk.Notebook):
                 GObject.idle_add(term.ensure_visible_and_focussed)
         return True
 
+    def spawn_page(self, page):
+        """Spawn the terminals of a page shown for the first time"""
+        if page is None:
+            return
+        maker = Factory()
+        if maker.isinstance(page, 'Terminal'):
+            terminals = [page]
+        else:
+            terminals = enumerate_descendants(page)[1]
+        for terminal in terminals:
+            terminal.ensure_spawned()
+
     def on_scroll_event(self, notebook, event):
         '''Handle scroll events for scrolling through tabs'''
         #print "self: %s" % self
@@ -14,15 +14,16 @@
 #  You should have received a copy of the GNU General Public License
 #  along with this program; if not, write to the Free Software
 #  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
-"""Terminator.optionparse - Parse commandline options"""
+"""Terminator.optionparse - Parse commandline options
+
+build_parser() only needs the standard library, so the DBus forwarding
+fast path can parse a command line without loading Gtk or the config.
+"""
 
 import sys
 import os
 
 from optparse import OptionParser, SUPPRESS_HELP
-from util import dbg, err
-import util
-import config
 import version
 from translation import _
 
@@ -38,8 +39,8 @@ def execute_cb(option, opt, value, lparser):
         del(lparser.rargs[0])
     setattr(lparser.values, option.dest, value)
 
-def parse_options():
-    """Parse the command line options"""
+def build_parser():
+    """Return the parser for our command line options"""
     usage = "usage: %prog [options]"
 
     is_x_terminal_emulator = os.path.basename(sys.argv[0]) == 'x-terminal-emulator'
@@ -99,13 +100,27 @@ icon for the window (by file or name)'))
             help=_('Comma separated list of classes to limit debugging to'))
     parser.add_option('--debug-methods', action='store', dest='debug_methods',
             help=_('Comma separated list of methods to limit debugging to'))
+    parser.add_option('--debug-ring', action='store', type='int',
+            dest='debug_ring', metavar='LINES',
+            help=_('Keep the last LINES debugging messages in memory instead of printing them'))
     parser.add_option('--new-tab', action='store_true', dest='new_tab',
             help=_('If Terminator is already running, just open a new tab'))
+    parser.add_option('--profile-startup', action='store_true',
+            dest='profile_startup',
+            help=_('Print how long each phase of the startup took'))
     for item in ['--sm-client-id', '--sm-config-prefix', '--screen', '-n',
                  '--no-gconf' ]:
         parser.add_option(item, dest='dummy', action='store',
                 help=SUPPRESS_HELP)
+    return(parser)
+
+def parse_options():
+    """Parse the command line options"""
+    import util
+    import config
+    from util import dbg, err
 
+    parser = build_parser()
     global options
     (options, args) = parser.parse_args()
     if len(args) != 0:
@@ -115,22 +130,21 @@ icon for the window (by file or name)'))
         print '%s %s' % (version.APP_NAME, version.APP_VERSION)
         sys.exit(0)
 
-    if options.debug_classes or options.debug_methods:
+    if options.debug_classes or options.debug_methods or options.debug_ring:
         if not options.debug > 0:
             options.debug = 1
 
     if options.debug:
-        util.DEBUG = True
-        if options.debug > 1:
-            util.DEBUGFILES = True
+        classes = []
+        methods = []
         if options.debug_classes:
-            classes = options.debug_classes.split(',')
-            for item in classes:
-                util.DEBUGCLASSES.append(item.strip())
+            for item in options.debug_classes.split(','):
+                classes.append(item.strip())
         if options.debug_methods:
-            methods = options.debug_methods.split(',')
-            for item in methods:
-                util.DEBUGMETHODS.append(item.strip())
+            for item in options.debug_methods.split(','):
+                methods.append(item.strip())
+        util.set_debug(files=options.debug > 1, classes=classes,
+                       methods=methods, ring=options.debug_ring)
 
     if options.working_directory:
         if os.path.exists(os.path.expanduser(options.working_directory)):
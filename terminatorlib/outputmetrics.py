@@ -0,0 +1,158 @@
+#!/usr/bin/env python2
+# Terminator by Chris Jones <cmsj@tenshu.net>
+# GPL v2 only
+"""outputmetrics.py - how much a terminal outputs, and what that costs us
+
+With the output_metrics option every terminal counts the lines scrolled in
+and the 'contents-changed' signals of its VTE, and times the handlers it
+connects through its Signalman and the drawing of the VTE. Rates are
+averaged over the last few seconds, the load is the share of wall clock
+time spent in our handlers or in VTE drawing.
+
+>>> class Vte(object):
+...     row = 0
+...     def get_cursor_position(self): return((0, self.row))
+>>> now = [0]
+>>> metrics = OutputMetrics(lambda: int(now[0] * 1000000))
+>>> vte = Vte()
+>>> def handler(widget):
+...     now[0] += 0.25
+...     return(True)
+>>> timed = metrics.timed('key-press-event', handler)
+>>> for second in range(1, 5):
+...     vte.row += 100
+...     now[0] = second
+...     metrics.on_contents_changed(vte)
+>>> timed(vte)
+True
+>>> summary = metrics.summary()
+>>> summary['lines'], summary['lines_per_second']
+(300.0, 70.58823529411765)
+>>> summary['handler_load'], summary['handler_seconds:key-press-event']
+(0.058823529411764705, 0.25)
+>>> metrics.describe()
+'71 lines/s 1 changes/s py 6% vte 0%'
+
+"""
+
+from collections import deque
+from gi.repository import GLib
+
+# Seconds the rates are averaged over
+WINDOW = 5
+
+class OutputMetrics(object):
+    """Output and main loop statistics of one terminal"""
+
+    clock = None
+    lines = None
+    changes = None
+    lastrow = None
+    handler_seconds = None
+    handler_calls = None
+    handlers = None
+    draw_seconds = None
+    draws = None
+    drawstart = None
+    history = None
+
+    def __init__(self, clock=GLib.get_monotonic_time, window=WINDOW):
+        """Class initialiser. clock() returns monotonic microseconds"""
+        self.clock = clock
+        self.lines = 0
+        self.changes = 0
+        self.handler_seconds = 0.0
+        self.handler_calls = 0
+        self.handlers = {}
+        self.draw_seconds = 0.0
+        self.draws = 0
+        # One snapshot of the totals per second, the oldest is the base
+        # of the rates
+        self.history = deque([self.snapshot()], window + 1)
+
+    def now(self):
+        """Return the monotonic time in seconds"""
+        return(self.clock() / 1000000.0)
+
+    def snapshot(self):
+        """Return the current totals"""
+        return((self.now(), self.lines, self.changes, self.handler_seconds,
+                self.draw_seconds))
+
+    def sample(self):
+        """Take a snapshot, if the last one is a second old"""
+        now = self.now()
+        if now - self.history[-1][0] >= 1:
+            self.history.append(self.snapshot())
+
+    def on_contents_changed(self, vte):
+        """Count a change of the contents of vte. The cursor row only
+        grows as lines are output, the scrollback included"""
+        self.changes += 1
+        row = vte.get_cursor_position()[1]
+        if self.lastrow is not None and row > self.lastrow:
+            self.lines += row - self.lastrow
+        self.lastrow = row
+        self.sample()
+
+    def on_draw(self, _widget, _cairo):
+        """VTE is about to draw"""
+        self.drawstart = self.now()
+        return(False)
+
+    def on_draw_after(self, _widget, _cairo):
+        """VTE has drawn"""
+        if self.drawstart is not None:
+            self.draw_seconds += self.now() - self.drawstart
+            self.draws += 1
+            self.drawstart = None
+        return(False)
+
+    def timed(self, signal, handler):
+        """Return handler wrapped to add its run time to our totals"""
+        if not self.handlers.has_key(signal):
+            self.handlers[signal] = 0.0
+        def _timed(*args):
+            start = self.now()
+            try:
+                return(handler(*args))
+            finally:
+                elapsed = self.now() - start
+                self.handler_seconds += elapsed
+                self.handler_calls += 1
+                self.handlers[signal] += elapsed
+        return(_timed)
+
+    def summary(self):
+        """Return the totals and the rates over the last seconds, as
+        floats by name"""
+        self.sample()
+        now, lines, changes, handler_seconds, draw_seconds = self.snapshot()
+        then, lines0, changes0, handler0, draw0 = self.history[0]
+        elapsed = max(now - then, 1.0)
+        result = {
+            'lines': float(self.lines),
+            'changes': float(self.changes),
+            'handler_calls': float(self.handler_calls),
+            'handler_seconds': self.handler_seconds,
+            'draws': float(self.draws),
+            'draw_seconds': self.draw_seconds,
+            'lines_per_second': (lines - lines0) / elapsed,
+            'changes_per_second': (changes - changes0) / elapsed,
+            'handler_load': (handler_seconds - handler0) / elapsed,
+            'draw_load': (draw_seconds - draw0) / elapsed,
+        }
+        for signal, seconds in self.handlers.items():
+            result['handler_seconds:%s' % signal] = seconds
+        return(result)
+
+    def describe(self):
+        """Return the rates in a few words, for the titlebar"""
+        summary = self.summary()
+        return('%d lines/s %d changes/s py %d%% vte %d%%' % (
+            round(summary['lines_per_second']),
+            round(summary['changes_per_second']),
+            round(summary['handler_load'] * 100),
+            round(summary['draw_load'] * 100)))
+
+# vim: set expandtab ts=4 sw=4:
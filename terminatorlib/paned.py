@@ -17,6 +17,7 @@ from container import Container
 class Paned(Container):
     """Base class for Paned Containers"""
 
+    node_kinds = frozenset(['Container', 'Paned'])
     position = None
     inPaned = ''
     maker = None
@@ -523,6 +524,9 @@ class Paned(Container):
 
 class HPaned(Paned, Gtk.HPaned):
     """Merge Gtk.HPaned into our base Paned Container"""
+    node_kinds = frozenset(['Container', 'Paned', 'HPaned'])
+    node_type = 'HPaned'
+
     def __init__(self):
         """Class initialiser"""
         Paned.__init__(self)
@@ -540,6 +544,9 @@ class HPaned(Paned, Gtk.HPaned):
 
 class VPaned(Paned, Gtk.VPaned):
     """Merge Gtk.VPaned into our base Paned Container"""
+    node_kinds = frozenset(['Container', 'Paned', 'VPaned'])
+    node_type = 'VPaned'
+
     def __init__(self):
         """Class initialiser"""
         Paned.__init__(self)
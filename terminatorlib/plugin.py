@@ -20,6 +20,10 @@
 []
 >>> plugins[0].do_test()
 'TestPluginWin'
+>>> registry.get_url_handler('not_a_handler') is None
+True
+>>> registry.get_available_plugins('test')
+['TestPlugin']
 
 """
 
@@ -27,6 +31,7 @@ import sys
 import os
 import borg
 from config import Config
+from pluginmanifest import Manifest
 from util import dbg, err, get_config_dir
 from terminator import Terminator
 
@@ -48,6 +53,11 @@ class PluginRegistry(borg.Borg):
     instances = None
     path = None
     done = None
+    # plugin name => (module name, capabilities) from the manifests
+    plugin_modules = None
+    # capability => plugins, and handler_name => url_handler plugin
+    by_capability = None
+    url_handlers = None
 
     def __init__(self):
         """Class initialiser"""
@@ -69,14 +79,19 @@ class PluginRegistry(borg.Borg):
             self.done = False
         if not self.available_plugins:
             self.available_plugins = {}
+        if not self.plugin_modules:
+            self.plugin_modules = {}
 
     def load_plugins(self, testing=False):
-        """Load all plugins present in the plugins/ directory in our module"""
+        """Load the enabled plugins present in the plugin directories. The
+        others are only listed from their manifests, and imported when
+        they are enabled"""
         if self.done:
             dbg('PluginRegistry::load_plugins: Already loaded')
             return
 
         config = Config()
+        manifest = Manifest(os.path.join(get_config_dir(), 'plugins.cache'))
 
         for plugindir in self.path:
             sys.path.insert(0, plugindir)
@@ -89,45 +104,115 @@ class PluginRegistry(borg.Borg):
                 if plugin == '__init__.py':
                     continue
                 pluginpath = os.path.join(plugindir, plugin)
-                if os.path.isfile(pluginpath) and plugin[-3:] == '.py':
-                    dbg('PluginRegistry::load_plugins: Importing plugin %s' % 
-                        plugin)
-                    try:
-                        module = __import__(plugin[:-3], None, None, [''])
-                        for item in getattr(module, 'AVAILABLE'):
-                            if item not in self.available_plugins.keys():
-                                func = getattr(module, item)
-                                self.available_plugins[item] = func
-
-                            if not testing and item not in config['enabled_plugins']:
-                                dbg('plugin %s not enabled, skipping' % item)
-                                continue
-                            if item not in self.instances:
+                if not os.path.isfile(pluginpath) or plugin[-3:] != '.py':
+                    continue
+                available = manifest.get(pluginpath)
+                if available is None:
+                    # Only importing it tells what it offers
+                    self.import_module(plugin[:-3])
+                    available = dict([(item, None) for item, module in
+                                      self.plugin_modules.items() if
+                                      module[0] == plugin[:-3]])
+                for item in available:
+                    if not self.plugin_modules.has_key(item):
+                        self.plugin_modules[item] = (plugin[:-3],
+                                                     available[item])
+
+                    if not testing and item not in config['enabled_plugins']:
+                        dbg('plugin %s not enabled, skipping' % item)
+                        continue
+                    if item not in self.instances:
+                        func = self.get_plugin_class(item)
+                        if func:
+                            try:
                                 self.instances[item] = func()
-                    except Exception, ex:
-                        err('PluginRegistry::load_plugins: Importing plugin %s \
-failed: %s' % (plugin, ex))
+                            except Exception, ex:
+                                err('PluginRegistry::load_plugins: \
+Instantiating plugin %s failed: %s' % (item, ex))
 
+        manifest.save()
         self.done = True
+        self.by_capability = None
+
+    def import_module(self, name):
+        """Import the plugin module name and register the classes it makes
+        available"""
+        dbg('PluginRegistry::import_module: Importing plugin %s' % name)
+        try:
+            module = __import__(name, None, None, [''])
+            for item in getattr(module, 'AVAILABLE'):
+                if item not in self.available_plugins.keys():
+                    self.available_plugins[item] = getattr(module, item)
+                if not self.plugin_modules.has_key(item):
+                    self.plugin_modules[item] = (name, None)
+        except Exception, ex:
+            err('PluginRegistry::import_module: Importing plugin %s \
+failed: %s' % (name, ex))
+
+    def get_plugin_class(self, plugin):
+        """Return the class of plugin, importing its module the first time,
+        or None if it can not be imported"""
+        if not self.available_plugins.has_key(plugin) and \
+           self.plugin_modules.has_key(plugin):
+            self.import_module(self.plugin_modules[plugin][0])
+        return(self.available_plugins.get(plugin))
+
+    def index_plugins(self):
+        """Index the enabled plugins by capability and the URL handlers by
+        the name of their match"""
+        dbg('PluginRegistry::index_plugins: indexing %d plugins' %
+            len(self.instances))
+        self.by_capability = {}
+        self.url_handlers = {}
+        for plugin in self.instances.values():
+            self.index_plugin(plugin)
+
+    def index_plugin(self, plugin):
+        """Add an enabled plugin to the indexes"""
+        for capability in plugin.capabilities:
+            self.by_capability.setdefault(capability, []).append(plugin)
+        if 'url_handler' in plugin.capabilities:
+            self.url_handlers[plugin.handler_name] = plugin
+
+    def unindex_plugin(self, plugin):
+        """Remove a disabled plugin from the indexes"""
+        for capability in plugin.capabilities:
+            plugins = self.by_capability.get(capability, [])
+            if plugin in plugins:
+                plugins.remove(plugin)
+        if self.url_handlers.get(getattr(plugin, 'handler_name', None)) is \
+           plugin:
+            del(self.url_handlers[plugin.handler_name])
 
     def get_plugins_by_capability(self, capability):
         """Return a list of plugins with a particular capability"""
-        result = []
-        dbg('PluginRegistry::get_plugins_by_capability: searching %d plugins \
-for %s' % (len(self.instances), capability))
-        for plugin in self.instances:
-            if capability in self.instances[plugin].capabilities:
-                result.append(self.instances[plugin])
-        return result
+        if self.by_capability is None:
+            self.index_plugins()
+        return(list(self.by_capability.get(capability, ())))
+
+    def get_url_handler(self, handler_name):
+        """Return the url_handler plugin for the URL match handler_name, or
+        None"""
+        self.load_plugins()
+        if self.by_capability is None:
+            self.index_plugins()
+        return(self.url_handlers.get(handler_name))
 
     def get_all_plugins(self):
         """Return all plugins"""
         return(self.instances)
 
-    def get_available_plugins(self):
+    def get_available_plugins(self, capability=None):
         """Return a list of all available plugins whether they are enabled or
-        disabled"""
-        return(self.available_plugins.keys())
+        disabled, optionally only those with capability as far as their
+        manifests tell"""
+        plugins = self.plugin_modules.keys()
+        if capability is None:
+            return(plugins)
+        return([plugin for plugin in plugins if
+                capability in (self.plugin_modules[plugin][1] or
+                               getattr(self.get_plugin_class(plugin),
+                                       'capabilities', None) or [])])
 
     def is_enabled(self, plugin):
         """Return a boolean value indicating whether a plugin is enabled or
@@ -138,13 +223,22 @@ for %s' % (len(self.instances), capability))
         """Enable a plugin"""
         if plugin in self.instances:
             err("Cannot enable plugin %s, already enabled" % plugin)
+            return
         dbg("Enabling %s" % plugin)
-        self.instances[plugin] = self.available_plugins[plugin]()
+        func = self.get_plugin_class(plugin)
+        if not func:
+            err("Cannot enable plugin %s, it is not available" % plugin)
+            return
+        self.instances[plugin] = func()
+        if self.by_capability is not None:
+            self.index_plugin(self.instances[plugin])
 
     def disable(self, plugin):
         """Disable a plugin"""
         dbg("Disabling %s" % plugin)
         self.instances[plugin].unload()
+        if self.by_capability is not None:
+            self.unindex_plugin(self.instances[plugin])
         del(self.instances[plugin])
 
 # This is where we should define a base class for each type of plugin we
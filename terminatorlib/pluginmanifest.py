@@ -0,0 +1,228 @@
+#!/usr/bin/env python2
+# Terminator by Chris Jones <cmsj@tenshu.net>
+# GPL v2 only
+"""pluginmanifest.py - what a plugin file offers, without importing it
+
+PluginRegistry.load_plugins used to import every .py in the plugin
+directories to read its AVAILABLE list, including the plugins that are not
+enabled, and some of them do real work when imported. The manifest of a
+plugin file is read from its syntax tree instead: the classes listed in
+AVAILABLE and the capabilities each of them declares or inherits from the
+base classes in plugin.py. Manifests are cached in a file, keyed by the
+mtime and size of each plugin, so only new or changed plugins are parsed.
+
+>>> import tempfile, shutil
+>>> tmpdir = tempfile.mkdtemp()
+>>> filename = os.path.join(tmpdir, 'myplugin.py')
+>>> open(filename, 'w').write('''
+... import terminatorlib.plugin as plugin
+... try:
+...     import something
+...     AVAILABLE = ['Handler', 'Menu', 'Odd']
+... except ImportError:
+...     AVAILABLE = []
+... class Handler(plugin.URLHandler):
+...     handler_name = 'handler'
+... class Menu(plugin.MenuItem):
+...     capabilities = ['terminal_menu', 'extra']
+... class Odd(make_base()):
+...     pass
+... ''')
+>>> sorted(scan(filename).items())
+[('Handler', ['url_handler']), ('Menu', ['terminal_menu', 'extra']), ('Odd', None)]
+>>> manifest = Manifest(os.path.join(tmpdir, 'plugins.cache'))
+>>> manifest.get(filename) == scan(filename)
+True
+>>> manifest.save()
+>>> Manifest(manifest.filename).entries.keys() == [filename]
+True
+>>> open(filename, 'w').write('AVAILABLE = [')
+>>> scan(filename) is None
+True
+>>> open(filename, 'w').write('''
+... AVAILABLE = ['Handler']
+... AVAILABLE.append('Menu')
+... ''')
+>>> scan(filename) is None
+True
+>>> open(filename, 'w').write('AVAILABLE = [name for name in dir()]')
+>>> scan(filename) is None
+True
+>>> open(filename, 'w').write('import os')
+>>> scan(filename) is None
+True
+>>> shutil.rmtree(tmpdir)
+
+"""
+
+import os
+import ast
+import cPickle as pickle
+from util import dbg, write_atomic
+
+CACHE_VERSION = 2
+
+# Capabilities of the base classes plugins derive from, see plugin.py
+BASE_CAPABILITIES = {
+    'Plugin': [],
+    'URLHandler': ['url_handler'],
+    'MenuItem': ['terminal_menu'],
+}
+
+def module_statements(body):
+    """Yield the statements run when a module is imported, looking into
+    if and try blocks but not into functions or classes"""
+    for node in body:
+        yield node
+        if not isinstance(node, (ast.If, ast.TryExcept, ast.TryFinally)):
+            continue
+        for field in ['body', 'orelse', 'finalbody']:
+            for child in module_statements(getattr(node, field, [])):
+                yield child
+        for handler in getattr(node, 'handlers', []):
+            for child in module_statements(handler.body):
+                yield child
+
+def literal_list(node):
+    """Return the strings of a list or tuple literal, or None"""
+    if not isinstance(node, (ast.List, ast.Tuple)):
+        return(None)
+    if [elt for elt in node.elts if not isinstance(elt, ast.Str)]:
+        return(None)
+    return([elt.s for elt in node.elts])
+
+def base_name(node):
+    """Return the name a base class is referred to by, plugin.MenuItem and
+    MenuItem both give 'MenuItem'"""
+    if isinstance(node, ast.Name):
+        return(node.id)
+    if isinstance(node, ast.Attribute):
+        return(node.attr)
+    return(None)
+
+def changes_available(node):
+    """Return whether a statement may build up or change AVAILABLE other
+    than by assigning it a literal: assigning it anything else, calling
+    its methods or assigning to its items"""
+    for child in ast.walk(node):
+        if isinstance(child, ast.Name) and child.id == 'AVAILABLE' and \
+           not isinstance(child.ctx, ast.Load):
+            return(True)
+        if isinstance(child, (ast.Attribute, ast.Subscript)) and \
+           isinstance(child.value, ast.Name) and \
+           child.value.id == 'AVAILABLE':
+            return(True)
+    return(False)
+
+def scan(filename):
+    """Return {class name: capabilities} for the classes in the AVAILABLE
+    list of a plugin file. The capabilities of a class are None if they
+    can not be told without importing it, the whole result is None if the
+    file can not be parsed or AVAILABLE is not only assigned list literals
+    of strings"""
+    try:
+        tree = ast.parse(open(filename).read(), filename)
+    except (IOError, SyntaxError, TypeError), ex:
+        dbg('pluginmanifest::scan: unable to parse %s: %s' % (filename, ex))
+        return(None)
+
+    available = None
+    classes = {}
+    for node in module_statements(tree.body):
+        if isinstance(node, ast.Assign) and \
+           [target for target in node.targets if
+            isinstance(target, ast.Name) and target.id == 'AVAILABLE']:
+            items = literal_list(node.value)
+            if items is None or len(node.targets) > 1:
+                dbg('pluginmanifest::scan: AVAILABLE of %s is not a literal'
+                    % filename)
+                return(None)
+            # A plugin may only list its classes when it can work,
+            # offer every class it might list
+            available = available or []
+            for item in items:
+                if item not in available:
+                    available.append(item)
+            continue
+        if not isinstance(node, (ast.If, ast.TryExcept, ast.TryFinally)) \
+           and changes_available(node):
+            dbg('pluginmanifest::scan: AVAILABLE of %s is computed' %
+                filename)
+            return(None)
+        if isinstance(node, ast.ClassDef):
+            capabilities = None
+            for statement in node.body:
+                if isinstance(statement, ast.Assign) and \
+                   'capabilities' in [target.id for target in
+                                      statement.targets if
+                                      isinstance(target, ast.Name)]:
+                    capabilities = literal_list(statement.value)
+            classes[node.name] = ([base_name(base) for base in node.bases],
+                                  capabilities)
+
+    def capabilities_of(name, seen):
+        """Declared or inherited capabilities of the class name"""
+        if classes.has_key(name) and name not in seen:
+            bases, capabilities = classes[name]
+            if capabilities is not None:
+                return(capabilities)
+            for base in bases:
+                capabilities = capabilities_of(base, seen + [name])
+                if capabilities:
+                    return(capabilities)
+            return(None)
+        return(BASE_CAPABILITIES.get(name))
+
+    if available is None:
+        dbg('pluginmanifest::scan: no AVAILABLE in %s' % filename)
+        return(None)
+    return(dict([(name, capabilities_of(name, [])) for name in available]))
+
+class Manifest(object):
+    """The manifests of plugin files, cached in a file"""
+
+    filename = None
+    entries = None
+    dirty = None
+
+    def __init__(self, filename):
+        """Class initialiser. filename is where the manifests are cached"""
+        self.filename = filename
+        self.entries = {}
+        self.dirty = False
+        try:
+            version, entries = pickle.load(open(filename, 'rb'))
+            if version == CACHE_VERSION:
+                self.entries = entries
+        except Exception, ex:
+            dbg('Manifest::__init__: no usable cache in %s: %s' %
+                (filename, ex))
+
+    def get(self, filename):
+        """Return the manifest of a plugin file, see scan()"""
+        try:
+            stat = os.stat(filename)
+        except OSError:
+            return(None)
+        key = (stat.st_mtime, stat.st_size)
+        entry = self.entries.get(filename)
+        if not entry or entry[0] != key:
+            entry = (key, scan(filename))
+            self.entries[filename] = entry
+            self.dirty = True
+        return(entry[1])
+
+    def save(self):
+        """Write the cache, if any manifest changed"""
+        if not self.dirty:
+            return
+        try:
+            write_atomic(self.filename,
+                         pickle.dumps((CACHE_VERSION, self.entries),
+                                      pickle.HIGHEST_PROTOCOL))
+            self.dirty = False
+        except (IOError, OSError), ex:
+            dbg('Manifest::save: unable to write %s: %s' % (self.filename,
+                                                            ex))
+
+# vim: set expandtab ts=4 sw=4:
@@ -4,16 +4,152 @@
 # See LICENSE of Terminator package.
 
 """ logger.py - Terminator Plugin to log 'content' of individual
-terminals """
+terminals
+
+New rows are snapshotted a few times a second from the GTK main loop and
+handed through a bounded queue to a writer thread, which owns the file,
+compresses and rotates it. When the writer falls behind, snapshots are
+postponed rather than blocking the UI. Plugin settings (in the [plugins]
+[[Logger]] config section):
+
+    snapshot_interval   ms between row snapshots (250)
+    queue_size          snapshots the writer may lag behind (256)
+    rotate_size         rotate after this many bytes, 0 never (0)
+    rotate_interval     rotate after this many seconds, 0 never (0)
+    compression         '', 'gzip' or 'zstd' ('')
+"""
 
 import os
 import sys
+import time
+import atexit
+import gzip
+import threading
+import Queue
 from gi.repository import Gtk
+from gi.repository import GObject
 import terminatorlib.plugin as plugin
+from terminatorlib.config import Config
 from terminatorlib.translation import _
+from terminatorlib.util import err, dbg
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 AVAILABLE = ['Logger']
 
+config = Config()
+snapshot_interval = int(config.plugin_get('Logger', 'snapshot_interval', 250))
+queue_size = int(config.plugin_get('Logger', 'queue_size', 256))
+rotate_size = int(config.plugin_get('Logger', 'rotate_size', 0))
+rotate_interval = int(config.plugin_get('Logger', 'rotate_interval', 0))
+compression = config.plugin_get('Logger', 'compression', '')
+
+def human_size(size):
+    """Format a byte count for the menu tooltip"""
+    for unit in ['B', 'KiB', 'MiB', 'GiB']:
+        if size < 1024 or unit == 'GiB':
+            break
+        size = size / 1024.0
+    return('%.1f %s' % (size, unit))
+
+# Writers that have not been closed yet. They are closed at exit, so a
+# compressed log is never cut short
+WRITERS = set()
+
+def close_writers():
+    """Let every running writer write out its queue and close its file"""
+    for writer in list(WRITERS):
+        writer.close()
+
+atexit.register(close_writers)
+
+class LogWriter(threading.Thread):
+    """Background thread writing queued snapshots to a log file"""
+
+    def __init__(self, filepath):
+        threading.Thread.__init__(self, name='Logger')
+        self.daemon = True
+        self.filepath = filepath
+        self.compression = compression
+        if self.compression == 'zstd' and not zstandard:
+            err('Logger: zstandard module missing, using gzip instead')
+            self.compression = 'gzip'
+        self.queue = Queue.Queue(queue_size)
+        self.fd = None
+        self.opened = 0
+        self.file_bytes = 0
+        self.started = time.time()
+        self.bytes_written = 0
+        self.rotations = 0
+        self.open_log()
+
+    def open_log(self):
+        """Open the log file for appending, wrapped in a compressor"""
+        if self.compression == 'gzip':
+            self.fd = gzip.open(self.filepath, 'ab')
+        elif self.compression == 'zstd':
+            self.fd = zstandard.ZstdCompressor().stream_writer(
+                    open(self.filepath, 'ab'))
+        else:
+            self.fd = open(self.filepath, 'a')
+        self.opened = time.time()
+        self.file_bytes = 0
+
+    def rotate(self):
+        """Move the current file aside and start a new one"""
+        self.fd.close()
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        root, ext = os.path.splitext(self.filepath)
+        if self.compression == '':
+            root, ext = self.filepath, ''
+        os.rename(self.filepath, '%s-%s%s' % (root, stamp, ext))
+        self.rotations += 1
+        self.open_log()
+
+    def due_rotation(self):
+        """Has the current file grown too big or too old"""
+        if rotate_size and self.file_bytes >= rotate_size:
+            return(True)
+        if rotate_interval and time.time() - self.opened >= rotate_interval:
+            return(True)
+        return(False)
+
+    def run(self):
+        """Write snapshots until told to stop by a None"""
+        while True:
+            content = self.queue.get()
+            if content is None:
+                break
+            try:
+                if self.file_bytes and self.due_rotation():
+                    self.rotate()
+                self.fd.write(content)
+                self.file_bytes += len(content)
+                self.bytes_written += len(content)
+            except (IOError, OSError), ex:
+                err('Logger: writing %s failed: %s' % (self.filepath, ex))
+        self.fd.close()
+
+    def start(self):
+        """Start writing"""
+        WRITERS.add(self)
+        threading.Thread.start(self)
+
+    def close(self):
+        """Write out what is queued, close the file and wait for that"""
+        if self in WRITERS:
+            WRITERS.discard(self)
+            self.queue.put(None)
+            self.join()
+
+    def throughput(self):
+        """Bytes per second written since the logger started"""
+        elapsed = max(time.time() - self.started, 1)
+        return(self.bytes_written / elapsed)
+
 class Logger(plugin.MenuItem):
     """ Add custom command to the terminal menu"""
     capabilities = ['terminal_menu']
@@ -34,34 +170,73 @@ class Logger(plugin.MenuItem):
             item = Gtk.MenuItem.new_with_mnemonic(_('Start _Logger'))
             item.connect("activate", self.start_logger, terminal)
         else:
+            logger = self.loggers[vte_terminal]
+            writer = logger["writer"]
             item = Gtk.MenuItem.new_with_mnemonic(_('Stop _Logger'))
             item.connect("activate", self.stop_logger, terminal)
             item.set_has_tooltip(True)
-            item.set_tooltip_text("Saving at '" + self.loggers[vte_terminal]["filepath"] + "'")
+            item.set_tooltip_text(_("Saving at '%s'\n%s written, %s/s, "
+                                    "%d rotations, %d postponed snapshots") %
+                                  (writer.filepath,
+                                   human_size(writer.bytes_written),
+                                   human_size(writer.throughput()),
+                                   writer.rotations, logger["postponed"]))
         menuitems.append(item)
-        
-    def write_content(self, terminal, row_start, col_start, row_end, col_end):
-        """ Final function to write a file """
-        content = terminal.get_text_range(row_start, col_start, row_end, col_end,
-                                          lambda *a: True)
-        content = content[0]
-        fd = self.loggers[terminal]["fd"]
-        # Don't write the last char which is always '\n'
-        fd.write(content[:-1])
-        self.loggers[terminal]["col"] = col_end
-        self.loggers[terminal]["row"] = row_end
-
-    def save(self, terminal):
-        """ 'contents-changed' callback """
-        last_saved_col = self.loggers[terminal]["col"]
-        last_saved_row = self.loggers[terminal]["row"]
+
+    def snapshot(self, terminal, final=False):
+        """ Queue the rows completed since the last snapshot, the physical
+        rows above the cursor. The final one also takes the partial line up
+        to the cursor """
+        logger = self.loggers[terminal]
+        logger["pending"] = False
+        writer = logger["writer"]
         (col, row) = terminal.get_cursor_position()
-        # Save only when buffer is nearly full,
-        # for the sake of efficiency
-        if row - last_saved_row < terminal.get_row_count():
-            return
-        self.write_content(terminal, last_saved_row, last_saved_col, row, col)
-        
+        last_row = logger["row"]
+        if row < last_row:
+            # The terminal was reset, carry on from where the cursor is now
+            logger["row"] = row
+            return(False)
+        if row == last_row and not final:
+            return(False)
+        if writer.queue.full() and not final:
+            # Let the writer catch up, the rows stay in the scrollback
+            logger["postponed"] += 1
+            self.schedule(terminal)
+            return(False)
+        if final:
+            content = terminal.get_text_range(last_row, 0, row, col,
+                                              lambda *a: True)[0]
+        else:
+            # Rows above the cursor are complete. A row that wraps into the
+            # next comes without a newline, and the rest of its line
+            # follows in a later snapshot. The cursor row is still being
+            # written
+            content = terminal.get_text_range(last_row, 0, row - 1,
+                                              terminal.get_column_count(),
+                                              lambda *a: True)[0]
+        logger["row"] = row
+        if content:
+            writer.queue.put(content, block=final)
+        return(False)
+
+    def schedule(self, terminal):
+        """ Arrange for a snapshot soon, at most one pending per terminal """
+        logger = self.loggers[terminal]
+        if not logger["pending"]:
+            logger["pending"] = True
+            GObject.timeout_add(snapshot_interval, self.on_snapshot_due,
+                                terminal)
+
+    def on_snapshot_due(self, terminal):
+        """ Timer callback, the logger may have been stopped meanwhile """
+        if self.loggers.has_key(terminal):
+            self.snapshot(terminal)
+        return(False)
+
+    def on_contents_changed(self, terminal):
+        """ 'contents-changed' callback """
+        self.schedule(terminal)
+
     def start_logger(self, _widget, Terminal):
         """ Handle menu item callback by saving text to a file"""
         savedialog = Gtk.FileChooserDialog(title=_("Save Log File As"),
@@ -76,18 +251,23 @@ class Logger(plugin.MenuItem):
             try:
                 logfile = os.path.join(savedialog.get_current_folder(),
                                        savedialog.get_filename())
-                fd = open(logfile, 'w+')
-                # Save log file path, 
-                # associated file descriptor, signal handler id
-                # and last saved col,row positions respectively.
+                # Truncate, the writer appends across rotations
+                open(logfile, 'w').close()
+                writer = LogWriter(logfile)
+                # Save the writer, signal handler ids, the last saved row
+                # and the snapshot bookkeeping respectively.
                 vte_terminal = Terminal.get_vte()
                 (col, row) = vte_terminal.get_cursor_position()
 
-                self.loggers[vte_terminal] = {"filepath":logfile,
-                                              "handler_id":0, "fd":fd,
-                                              "col":col, "row":row}
+                self.loggers[vte_terminal] = {"writer":writer,
+                                              "handler_id":0,
+                                              "destroy_id":0,
+                                              "row":row, "pending":False,
+                                              "postponed":0}
+                writer.start()
                 # Add contents-changed callback
-                self.loggers[vte_terminal]["handler_id"] = vte_terminal.connect('contents-changed', self.save)
+                self.loggers[vte_terminal]["handler_id"] = vte_terminal.connect('contents-changed', self.on_contents_changed)
+                self.loggers[vte_terminal]["destroy_id"] = vte_terminal.connect('destroy', self.on_destroy)
             except:
                 e = sys.exc_info()[1]
                 error = Gtk.MessageDialog(None, Gtk.DialogFlags.MODAL, Gtk.MessageType.ERROR,
@@ -97,15 +277,27 @@ class Logger(plugin.MenuItem):
                 error.destroy()
         savedialog.destroy()
 
+    def on_destroy(self, vte_terminal):
+        """ The terminal is going away, flush what we have """
+        self.finish(vte_terminal)
+
     def stop_logger(self, _widget, terminal):
-        vte_terminal = terminal.get_vte()
-        last_saved_col = self.loggers[vte_terminal]["col"]
-        last_saved_row = self.loggers[vte_terminal]["row"]
-        (col, row) = vte_terminal.get_cursor_position()
-        if last_saved_col != col or last_saved_row != row:
-            # Save unwritten bufer to the file
-            self.write_content(vte_terminal, last_saved_row, last_saved_col, row, col)
-        fd = self.loggers[vte_terminal]["fd"]
-        fd.close()
-        vte_terminal.disconnect(self.loggers[vte_terminal]["handler_id"])
+        self.finish(terminal.get_vte())
+
+    def unload(self):
+        """ Stop all loggers """
+        for vte_terminal in self.loggers.keys():
+            self.finish(vte_terminal)
+
+    def finish(self, vte_terminal):
+        """ Write out the unsaved buffer and wait for the writer to close
+        the file """
+        # Save unwritten bufer to the file
+        self.snapshot(vte_terminal, final=True)
+        logger = self.loggers[vte_terminal]
+        vte_terminal.disconnect(logger["handler_id"])
+        vte_terminal.disconnect(logger["destroy_id"])
+        logger["writer"].close()
+        dbg('Logger: stopped %s, %d bytes' % (logger["writer"].filepath,
+                                              logger["writer"].bytes_written))
         del(self.loggers[vte_terminal])
@@ -36,6 +36,7 @@ class PrefsEditor:
     registry = None
     plugins = None
     keybindings = None
+    chords = None
     window = None
     builder = None
     layouteditor = None
@@ -419,17 +420,28 @@ class PrefsEditor:
         liststore = widget.get_model()
         liststore.set_sort_column_id(0, Gtk.SortType.ASCENDING)
         keybindings = self.config['keybindings']
+        # Chords can not be shown by the accel renderer, their binding is
+        # shown as it is written
+        self.chords = {}
         for keybinding in keybindings:
             keyval = 0
             mask = 0
             value = keybindings[keybinding]
             if value is not None and value != '':
                 try:
-                    (keyval, mask) = self.keybindings._parsebinding(value)
+                    parsed = [self.keybindings._parsebinding(part) for part
+                              in value.split()]
+                    if len(parsed) > 1:
+                        self.chords[keybinding] = value
+                    else:
+                        (keyval, mask) = parsed[0]
                 except KeymapError:
                     pass
             liststore.append([keybinding, self.keybindingnames[keybinding],
                              keyval, mask])
+        column = guiget('treeviewcolumn3')
+        column.set_cell_data_func(guiget('cellrendereraccel1'),
+                                  self.on_keybinding_cell_data)
 
         ## Plugins tab
         # Populate the plugin list
@@ -1453,7 +1465,7 @@ class PrefsEditor:
             # Plugin is currently enabled, unload it
             self.registry.disable(plugin)
 
-        self.plugins[plugin] = not self.plugins[plugin]
+        self.plugins[plugin] = self.registry.is_enabled(plugin)
         # Update the treeview
         model[path][1] = self.plugins[plugin]
 
@@ -1614,12 +1626,28 @@ class PrefsEditor:
         self.config['use_theme_colors'] = active
         self.config.set_dirty()
 
+    def on_keybinding_cell_data(self, _column, cell, liststore, celliter,
+                                _data=None):
+        """Show a chord as it is written, and other bindings as the accel
+        renderer does"""
+        binding = liststore.get_value(celliter, 0)
+        if self.chords.has_key(binding):
+            cell.set_property('text', self.chords[binding])
+            return
+        keyval = liststore.get_value(celliter, 2)
+        mask = liststore.get_value(celliter, 3)
+        if keyval:
+            cell.set_property('text', Gtk.accelerator_get_label(keyval, mask))
+        else:
+            cell.set_property('text', _('Disabled'))
+
     def on_cellrenderer_accel_edited(self, liststore, path, key, mods, _code):
         """Handle an edited keybinding"""
         celliter = liststore.get_iter_from_string(path)
         liststore.set(celliter, 2, key, 3, mods)
 
         binding = liststore.get_value(liststore.get_iter(path), 0)
+        self.chords.pop(binding, None)
         accel = Gtk.accelerator_name(key, mods)
         self.config['keybindings'][binding] = accel
         self.config.set_dirty()
@@ -1630,6 +1658,7 @@ class PrefsEditor:
         liststore.set(celliter, 2, 0, 3, 0)
 
         binding = liststore.get_value(liststore.get_iter(path), 0)
+        self.chords.pop(binding, None)
         self.config['keybindings'][binding] = None
         self.config.set_dirty()
 
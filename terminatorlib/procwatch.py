@@ -0,0 +1,172 @@
+#!/usr/bin/env python2
+# Terminator by Chris Jones <cmsj@tenshu.net>
+# GPL v2 only
+"""procwatch.py - one timer sampling the children of all terminals
+
+Titlebars, describe_layout and the popup menu ask a terminal for its cwd
+all the time, and each ask used to be a /proc lookup on the main loop.
+The ProcWatcher samples the cwd, the foreground process group of the pty
+and the command name of that group for every terminal with a running
+child, once per interval, and answers from that cache. A terminal is told
+about changes with its 'cwd-changed' and 'foreground-changed' signals.
+
+>>> class Vte(object):
+...     def connect(self, signal, handler, *args): return 1
+...     def disconnect(self, handler_id): pass
+...     def get_pty(self): return None
+>>> class Terminal(object):
+...     pid = 42
+...     vte = Vte()
+...     def emit(self, signal, value): print signal, value
+>>> cwds = {42: '/home'}
+>>> watcher = ProcWatcher(cwds.get, 1000)
+>>> terminal = Terminal()
+>>> watcher.watch(terminal)
+>>> watcher.get_cwd(terminal)
+'/home'
+>>> cwds[42] = '/tmp'
+>>> watcher.get_cwd(terminal)
+'/home'
+>>> watcher.refresh(terminal)
+cwd-changed /tmp
+>>> watcher.get_cwd(terminal)
+'/tmp'
+>>> watcher.unwatch(terminal)
+>>> cwds[42] = '/'
+>>> watcher.get_cwd(terminal)
+'/'
+
+"""
+
+import os
+from gi.repository import GObject
+from util import dbg
+
+def proc_command(pid):
+    """The command name of pid, where /proc tells it"""
+    try:
+        return(open('/proc/%d/comm' % pid).read().strip())
+    except (IOError, OSError):
+        return('')
+
+class ProcState(object):
+    """What was last seen of a terminal's child"""
+
+    cwd = None
+    pgrp = None
+    command = None
+    handler_id = None
+
+class ProcWatcher(object):
+    """Caches the cwd and foreground process of every watched terminal"""
+
+    pid_cwd = None
+    interval = None
+    watched = None
+    timer = None
+
+    def __init__(self, pid_cwd, interval):
+        """Class initialiser. pid_cwd(pid) returns the cwd of pid. Every
+        interval ms all terminals are sampled. With 0 nothing is sampled
+        and get_cwd() asks pid_cwd every time"""
+        self.pid_cwd = pid_cwd
+        self.interval = interval
+        self.watched = {}
+
+    def set_interval(self, interval):
+        """Change the sampling interval"""
+        if interval == self.interval:
+            return
+        self.interval = interval
+        self.stop_timer()
+        self.start_timer()
+
+    def start_timer(self):
+        """Sample periodically while anything is watched"""
+        if self.interval and self.watched and not self.timer:
+            self.timer = GObject.timeout_add(self.interval, self.poll)
+
+    def stop_timer(self):
+        """Stop sampling"""
+        if self.timer:
+            GObject.source_remove(self.timer)
+            self.timer = None
+
+    def watch(self, terminal):
+        """Start sampling the child terminal has just spawned"""
+        self.unwatch(terminal)
+        state = ProcState()
+        state.handler_id = terminal.vte.connect('child-exited',
+                                                self.on_child_exited,
+                                                terminal)
+        self.watched[terminal] = state
+        self.start_timer()
+
+    def unwatch(self, terminal):
+        """Stop sampling terminal, its child or the terminal is gone"""
+        state = self.watched.pop(terminal, None)
+        if state:
+            terminal.vte.disconnect(state.handler_id)
+        if not self.watched:
+            self.stop_timer()
+
+    def on_child_exited(self, _vte, _status, terminal):
+        """There is nothing left to sample"""
+        self.unwatch(terminal)
+
+    def get_cwd(self, terminal):
+        """Return the cwd of terminal's child"""
+        state = self.watched.get(terminal)
+        if not state or not self.interval:
+            return(self.pid_cwd(terminal.pid))
+        if state.cwd is None:
+            self.sample(terminal, state, notify=False)
+        return(state.cwd)
+
+    def get_foreground(self, terminal):
+        """Return (process group, command name) of the foreground job of
+        terminal, or (None, None) if it is not known"""
+        state = self.watched.get(terminal)
+        if not state or not self.interval:
+            return(None, None)
+        if state.cwd is None:
+            self.sample(terminal, state, notify=False)
+        return(state.pgrp, state.command)
+
+    def refresh(self, terminal):
+        """Sample terminal now, something hints its child has moved on"""
+        state = self.watched.get(terminal)
+        if state and self.interval:
+            self.sample(terminal, state)
+
+    def poll(self):
+        """Timer callback, sample every watched terminal"""
+        for terminal, state in self.watched.items():
+            self.sample(terminal, state)
+        return(True)
+
+    def sample(self, terminal, state, notify=True):
+        """Look at terminal's child, tell the terminal what changed"""
+        cwd = self.pid_cwd(terminal.pid)
+        pgrp = None
+        pty = terminal.vte.get_pty()
+        if pty:
+            try:
+                pgrp = os.tcgetpgrp(pty.get_fd())
+            except OSError:
+                pass
+
+        if cwd != state.cwd:
+            known = state.cwd is not None
+            state.cwd = cwd
+            if notify and known:
+                dbg('ProcWatcher::sample: %s moved to %s' % (terminal.pid,
+                                                             cwd))
+                terminal.emit('cwd-changed', cwd)
+        if pgrp != state.pgrp:
+            state.pgrp = pgrp
+            state.command = pgrp and proc_command(pgrp) or ''
+            if notify:
+                terminal.emit('foreground-changed', state.command)
+
+# vim: set expandtab ts=4 sw=4:
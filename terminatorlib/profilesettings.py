@@ -0,0 +1,198 @@
+#!/usr/bin/env python2
+# Terminator by Chris Jones <cmsj@tenshu.net>
+# GPL v2 only
+"""profilesettings.py - the settings of a profile, resolved for VTE
+
+Terminal.reconfigure used to look up every setting in the config and parse
+the font, the colours and the palette again, for each terminal. The
+ProfileSettings of a profile hold all of them resolved and parsed, and are
+built once per profile per config change and shared by every terminal
+using it. The colours are shared too, terminals must not change them.
+
+>>> css_class('my profile')
+'terminator-profile-my-profile'
+
+"""
+
+from gi.repository import Pango, Gdk
+from gi.repository import Vte
+from util import dbg
+
+# (Vte constant name, value for VTE versions without the constants)
+ERASE_BINDINGS = {
+    'ascii-del': ('ERASE_ASCII_DELETE', 2),
+    'control-h': ('ERASE_ASCII_BACKSPACE', 1),
+    'escape-sequence': ('ERASE_DELETE_SEQUENCE', 3),
+}
+
+def erase_binding(name):
+    """Return the VTE erase binding for a backspace_binding or
+    delete_binding setting"""
+    constname, value = ERASE_BINDINGS.get(name, ('ERASE_AUTO', 0))
+    return(getattr(Vte, constname, value))
+
+def parse_color(spec):
+    """Return spec parsed into a Gdk.RGBA"""
+    color = Gdk.RGBA()
+    color.parse(spec)
+    return(color)
+
+def dim_color(color, factor):
+    """Return a copy of color with its red, green and blue scaled by
+    factor"""
+    newcolor = color.copy()
+    for bit in ['red', 'green', 'blue']:
+        setattr(newcolor, bit, getattr(color, bit) * factor)
+    return(newcolor)
+
+def make_palette(palette):
+    """Parse a palette setting. A palette of 16 colours is extended to the
+    256 colours VTE uses, so they can be dimmed too"""
+    colors = palette.split(':')
+    result = [parse_color(color) for color in colors if color]
+    if len(colors) == 16:
+        # RGB values for indices 16..255 copied from vte source in order to dim them
+        shades = [0, 95, 135, 175, 215, 255]
+        for r in xrange(0, 6):
+            for g in xrange(0, 6):
+                for b in xrange(0, 6):
+                    newcolor = Gdk.RGBA()
+                    setattr(newcolor, "red",   shades[r] / 255.0)
+                    setattr(newcolor, "green", shades[g] / 255.0)
+                    setattr(newcolor, "blue",  shades[b] / 255.0)
+                    result.append(newcolor)
+        for y in xrange(8, 248, 10):
+            newcolor = Gdk.RGBA()
+            setattr(newcolor, "red",   y / 255.0)
+            setattr(newcolor, "green", y / 255.0)
+            setattr(newcolor, "blue",  y / 255.0)
+            result.append(newcolor)
+    return(result)
+
+def css_class(profile):
+    """Return the style class of the terminals of profile"""
+    return("terminator-profile-%s" % (
+        "".join([c if c.isalnum() else "-" for c in profile])))
+
+class ProfileSettings(object):
+    """Everything Terminal.reconfigure applies, for one profile"""
+
+    profile = None
+    exit_action = None
+    encoding = None
+    word_chars = None
+    mouse_autohide = None
+    backspace_binding = None
+    delete_binding = None
+    font = None
+    allow_bold = None
+    use_theme_colors = None
+    fgcolor_active = None
+    fgcolor_inactive = None
+    bgcolor = None
+    bgalpha = None
+    inactive_factor = None
+    palette_active = None
+    palette_inactive = None
+    css_class = None
+    profile_classes = None
+    cursor_color = None
+    cursor_shape = None
+    cursor_blink_mode = None
+    audible_bell = None
+    bell_handler = None
+    scrollback_lines = None
+    scroll_on_keystroke = None
+    scroll_on_output = None
+    scrollbar_position = None
+    rewrap_on_resize = None
+
+    def __init__(self, config):
+        """Class initialiser. Resolves the settings of config's profile"""
+        dbg('ProfileSettings::__init__: compiling profile %s' %
+            config.get_profile())
+        self.profile = config.get_profile()
+        self.exit_action = config['exit_action']
+        self.encoding = config['encoding']
+        self.word_chars = config['word_chars']
+        self.mouse_autohide = config['mouse_autohide']
+        self.backspace_binding = erase_binding(config['backspace_binding'])
+        self.delete_binding = erase_binding(config['delete_binding'])
+
+        if config['use_system_font'] == True:
+            font = config.get_system_mono_font()
+        else:
+            font = config['font']
+        try:
+            self.font = Pango.FontDescription(font)
+        except Exception, ex:
+            dbg('ProfileSettings::__init__: unusable font %s: %s' %
+                (font, ex))
+        self.allow_bold = config['allow_bold']
+
+        # Theme colours are read from each terminal's style context
+        self.use_theme_colors = config['use_theme_colors']
+        if not self.use_theme_colors:
+            self.fgcolor_active = parse_color(config['foreground_color'])
+            self.bgcolor = parse_color(config['background_color'])
+        if config['background_type'] == 'transparent':
+            self.bgalpha = config['background_darkness']
+        else:
+            self.bgalpha = 1
+        if self.bgcolor:
+            self.bgcolor.alpha = self.bgalpha
+
+        self.inactive_factor = min(config['inactive_color_offset'], 1.0)
+        if self.fgcolor_active:
+            self.fgcolor_inactive = dim_color(self.fgcolor_active,
+                                              self.inactive_factor)
+        self.palette_active = make_palette(config['palette'])
+        self.palette_inactive = [dim_color(color, self.inactive_factor)
+                                 for color in self.palette_active]
+        self.css_class = css_class(self.profile)
+        self.profile_classes = [css_class(profile) for profile in
+                                config.list_profiles()]
+
+        if not config['cursor_color_fg']:
+            self.cursor_color = parse_color(config['cursor_color'])
+        self.cursor_shape = getattr(Vte.CursorShape,
+                                    config['cursor_shape'].upper())
+        if config['cursor_blink'] == True:
+            self.cursor_blink_mode = Vte.CursorBlinkMode.ON
+        else:
+            self.cursor_blink_mode = Vte.CursorBlinkMode.OFF
+
+        if config['force_no_bell'] == True:
+            self.audible_bell = False
+            self.bell_handler = False
+        else:
+            self.audible_bell = config['audible_bell']
+            self.bell_handler = config['urgent_bell'] == True or \
+                                config['icon_bell'] == True or \
+                                config['visible_bell'] == True
+
+        if config['scrollback_infinite'] == True:
+            self.scrollback_lines = -1
+        else:
+            self.scrollback_lines = config['scrollback_lines']
+        self.scroll_on_keystroke = config['scroll_on_keystroke']
+        self.scroll_on_output = config['scroll_on_output']
+        self.scrollbar_position = config['scrollbar_position']
+        self.rewrap_on_resize = config['rewrap_on_resize']
+
+_SETTINGS = {}
+_GENERATION = None
+
+def get_settings(config):
+    """Return the ProfileSettings of config's profile, compiling them the
+    first time they are asked for after a config change"""
+    global _GENERATION
+    if _GENERATION != config.base.generation:
+        _SETTINGS.clear()
+        _GENERATION = config.base.generation
+    key = (config.get_profile(), config.fingerprint())
+    if not _SETTINGS.has_key(key):
+        _SETTINGS[key] = ProfileSettings(config)
+    return(_SETTINGS[key])
+
+# vim: set expandtab ts=4 sw=4:
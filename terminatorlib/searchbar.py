@@ -9,6 +9,30 @@ import re
 
 from translation import _
 from config import Config
+from searchindex import ScrollbackSearch
+from terminator import Terminator
+
+# Hit rows listed per terminal in the global search results
+MAX_LISTED_HITS = 500
+# Milliseconds between updates of the global search results
+UPDATE_DELAY = 200
+
+def vte_buffer_range(vte, config):
+    """Get the range of rows a vte widget holds"""
+    column, endrow = vte.get_cursor_position()
+    if config['scrollback_infinite']:
+        startrow = 0
+    else:
+        startrow = max(0, endrow - config['scrollback_lines'])
+    return(startrow, endrow)
+
+def vte_read_rows(vte, start, end):
+    """Return the text of rows [start, end) of a vte widget"""
+    if end <= start:
+        return(u'')
+    buffer = vte.get_text_range(start, 0, end - 1, vte.get_column_count(),
+                                lambda *args: True)
+    return(buffer[0].decode('utf-8', 'replace'))
 
 # pylint: disable-msg=R0904
 class Searchbar(Gtk.HBox):
@@ -23,6 +47,8 @@ class Searchbar(Gtk.HBox):
     next = None
     prev = None
     wrap = None
+    allterms = None
+    globalsearch = None
 
     vte = None
     config = None
@@ -33,11 +59,19 @@ class Searchbar(Gtk.HBox):
 
     searchits = None
 
+    engine = None
+    indexed_end = None
+    changed_id = None
+    pending_refresh = None
+
     def __init__(self):
         """Class initialiser"""
         GObject.GObject.__init__(self)
 
         self.config = Config()
+        self.engine = ScrollbackSearch(self.read_rows, GObject.idle_add,
+                                       self.on_search_update)
+        self.pending_refresh = False
 
         self.get_style_context().add_class("terminator-terminal-searchbar")
 
@@ -87,12 +121,19 @@ class Searchbar(Gtk.HBox):
         self.wrap.set_sensitive(True)
         self.wrap.connect('toggled', self.wrap_toggled)
 
+        # Global search checkbox
+        self.allterms = Gtk.CheckButton(_('All terminals'))
+        self.allterms.show()
+        if hasattr(self.allterms, 'set_tooltip_text'):
+            self.allterms.set_tooltip_text(_('Search the scrollback of every terminal'))
+
         self.pack_start(label, False, True, 0)
         self.pack_start(self.entry, True, True, 0)
         self.pack_start(self.reslabel, False, True, 0)
         self.pack_start(self.prev, False, False, 0)
         self.pack_start(self.next, False, False, 0)
         self.pack_start(self.wrap, False, False, 0)
+        self.pack_start(self.allterms, False, False, 0)
         self.pack_end(close, False, False, 0)
 
         self.hide()
@@ -136,71 +177,117 @@ class Searchbar(Gtk.HBox):
         if searchtext == '':
             return
 
+        if self.allterms.get_active():
+            try:
+                searchre = re.compile(searchtext.decode('utf-8'),
+                                      re.UNICODE | re.MULTILINE)
+            except re.error:
+                self.reslabel.set_text(_('Invalid search pattern'))
+                return
+            if not self.globalsearch:
+                self.globalsearch = GlobalSearch(self.get_toplevel())
+            self.reslabel.set_text(_('Searching all terminals'))
+            self.globalsearch.search(searchre)
+            return
+
         if searchtext != self.searchstring:
-            self.searchrow = self.get_vte_buffer_range()[0] - 1
+            try:
+                searchre = re.compile(searchtext.decode('utf-8'),
+                                      re.UNICODE | re.MULTILINE)
+            except re.error:
+                self.reslabel.set_text(_('Invalid search pattern'))
+                return
             self.searchstring = searchtext
-            self.searchre = re.compile(searchtext)
+            self.searchre = searchre
+            startrow, endrow = self.get_vte_buffer_range()
+            self.searchrow = startrow - 1
+            self.indexed_end = endrow
+            self.reslabel.set_text(_("Searching scrollback"))
+            self.engine.search(self.searchre, startrow, endrow,
+                               self.vte.get_column_count())
+            if not self.changed_id:
+                self.changed_id = self.vte.connect('contents-changed',
+                                                   self.on_contents_changed)
+            # The first hit is shown as soon as the scan finds it
+            return
 
-        self.reslabel.set_text(_("Searching scrollback"))
         self.next.set_sensitive(True)
         self.prev.set_sensitive(True)
         self.next_search(None)
 
+    def read_rows(self, start, end):
+        """Return the text of rows [start, end) for the search engine"""
+        return(vte_read_rows(self.vte, start, end))
+
+    def on_search_update(self):
+        """The search engine has new hits"""
+        hits = self.engine.hits
+        if self.searchrow < self.get_vte_buffer_range()[0] and len(hits):
+            # Nothing shown yet, jump to the first hit
+            self.next_search(None)
+        elif hits.position(self.searchrow):
+            self.search_hit(self.searchrow)
+        elif self.engine.scanning:
+            self.reslabel.set_text(_('Searching scrollback, %d matches') %
+                                   len(hits))
+        elif not len(hits):
+            self.reslabel.set_text(_('No matches'))
+            self.prev.set_sensitive(False)
+            self.next.set_sensitive(False)
+
+    def on_contents_changed(self, _vte):
+        """Keep the hits up to date while the terminal prints"""
+        if not self.pending_refresh:
+            self.pending_refresh = True
+            GObject.timeout_add(250, self.do_deferred_refresh)
+
+    def do_deferred_refresh(self):
+        """Rescan the part of the buffer that may have changed"""
+        self.pending_refresh = False
+        if not self.searchre:
+            return(False)
+        startrow, endrow = self.get_vte_buffer_range()
+        volatile_row = min(self.indexed_end, endrow) - self.vte.get_row_count()
+        self.engine.refresh(startrow, volatile_row, endrow)
+        if not self.engine.scanning:
+            self.indexed_end = endrow
+        return(False)
+
     def next_search(self, widget):
         """Search forwards and jump to the next result, if any"""
-        startrow,endrow = self.get_vte_buffer_range()
-        found = startrow <= self.searchrow and self.searchrow < endrow
-        row = self.searchrow
-        while True:
-            row += 1
-            if row >= endrow:
-                if found and self.wrap.get_active():
-                    row = startrow - 1
-                else:
-                    self.prev.set_sensitive(found)
-                    self.next.set_sensitive(False)
-                    self.reslabel.set_text(_('No more results'))
-                    return
-            buffer = self.vte.get_text_range(row, 0, row + 1, 0, self.search_character)
-
-            buffer = buffer[0]
-            buffer = buffer[:buffer.find('\n')]
-            matches = self.searchre.search(buffer)
-            if matches:
-                self.searchrow = row
-                self.prev.set_sensitive(True)
-                self.search_hit(self.searchrow)
-                return
+        row = self.engine.hits.next(self.searchrow, self.wrap.get_active())
+        if row is None:
+            if not self.engine.scanning:
+                self.next.set_sensitive(False)
+                self.reslabel.set_text(_('No more results'))
+            return
+        self.searchrow = row
+        self.next.set_sensitive(True)
+        self.prev.set_sensitive(True)
+        self.search_hit(self.searchrow)
 
     def prev_search(self, widget):
         """Jump back to the previous search"""
-        startrow,endrow = self.get_vte_buffer_range()
-        found = startrow <= self.searchrow and self.searchrow < endrow
-        row = self.searchrow
-        while True:
-            row -= 1
-            if row <= startrow:
-                if found and self.wrap.get_active():
-                    row = endrow
-                else:
-                    self.next.set_sensitive(found)
-                    self.prev.set_sensitive(False)
-                    self.reslabel.set_text(_('No more results'))
-                    return
-            buffer = self.vte.get_text_range(row, 0, row + 1, 0, self.search_character)
-
-            buffer = buffer[0]
-            buffer = buffer[:buffer.find('\n')]
-            matches = self.searchre.search(buffer)
-            if matches:
-                self.searchrow = row
-                self.next.set_sensitive(True)
-                self.search_hit(self.searchrow)
-                return
+        row = self.engine.hits.prev(self.searchrow, self.wrap.get_active())
+        if row is None:
+            if not self.engine.scanning:
+                self.prev.set_sensitive(False)
+                self.reslabel.set_text(_('No more results'))
+            return
+        self.searchrow = row
+        self.next.set_sensitive(True)
+        self.prev.set_sensitive(True)
+        self.search_hit(self.searchrow)
 
     def search_hit(self, row):
         """Update the UI for a search hit"""
-        self.reslabel.set_text("%s %d" % (_('Found at row'), row))
+        hits = self.engine.hits
+        if self.engine.scanning:
+            self.reslabel.set_text(_('Match %d of %d so far') %
+                                   (hits.position(row), len(hits)))
+        else:
+            self.reslabel.set_text(_('Match %d of %d') %
+                                   (hits.position(row), len(hits)))
         self.get_parent().scrollbar_jump(row)
         self.next.show()
         self.prev.show()
@@ -211,18 +298,17 @@ class Searchbar(Gtk.HBox):
 
     def get_vte_buffer_range(self):
         """Get the range of a vte widget"""
-        column, endrow = self.vte.get_cursor_position()
-        if self.config['scrollback_infinite']:
-            startrow = 0
-        else:
-            startrow = max(0, endrow - self.config['scrollback_lines'])
-        return(startrow, endrow)
+        return(vte_buffer_range(self.vte, self.config))
 
     def end_search(self, widget=None):
         """Trap and re-emit the end-search signal"""
         self.searchrow = 0
         self.searchstring = None
         self.searchre = None
+        self.engine.cancel()
+        if self.changed_id:
+            self.vte.disconnect(self.changed_id)
+            self.changed_id = None
         self.reslabel.set_text('')
         self.emit('end-search')
 
@@ -231,3 +317,171 @@ class Searchbar(Gtk.HBox):
         return(self.entry.get_text())
 
 GObject.type_register(Searchbar)
+
+class GlobalSearch(Gtk.Window):
+    """Window listing the hits of one search across every terminal,
+    terminals with the most hits first"""
+
+    # TreeStore columns
+    (COL_LABEL, COL_HITS, COL_RANK, COL_ROW, COL_TERMINAL) = range(0, 5)
+
+    store = None
+    status = None
+    engines = None
+    close_ids = None
+    dirty = None
+    update_timer = None
+
+    def __init__(self, parent):
+        """Class initialiser"""
+        Gtk.Window.__init__(self, title=_('Search all terminals'))
+        self.set_transient_for(parent)
+        self.set_destroy_with_parent(True)
+        self.set_default_size(480, 360)
+        self.engines = {}
+        self.close_ids = {}
+        self.dirty = set()
+
+        self.store = Gtk.TreeStore(str, str, int, int, object)
+        # Terminals rank by hit count, hit rows (ranked -row) in row order
+        self.store.set_sort_column_id(self.COL_RANK, Gtk.SortType.DESCENDING)
+
+        view = Gtk.TreeView(model=self.store)
+        view.append_column(Gtk.TreeViewColumn(_('Terminal'),
+                                              Gtk.CellRendererText(),
+                                              text=self.COL_LABEL))
+        view.append_column(Gtk.TreeViewColumn(_('Matches'),
+                                              Gtk.CellRendererText(),
+                                              text=self.COL_HITS))
+        view.connect('row-activated', self.on_row_activated)
+
+        scrolled = Gtk.ScrolledWindow()
+        scrolled.add(view)
+        self.status = Gtk.Label(label='')
+        self.status.set_alignment(0, 0.5)
+
+        box = Gtk.VBox()
+        box.pack_start(scrolled, True, True, 0)
+        box.pack_start(self.status, False, False, 0)
+        self.add(box)
+        self.connect('delete-event', self.on_delete)
+
+    def search(self, searchre):
+        """Start a search of every terminal"""
+        self.cancel()
+        for terminal in Terminator().terminals:
+            vte = terminal.get_vte()
+            engine = ScrollbackSearch(
+                    lambda start, end, vte=vte: vte_read_rows(vte, start, end),
+                    GObject.idle_add,
+                    lambda terminal=terminal: self.on_update(terminal))
+            # The engine, the terminal's row and the hit rows listed under it
+            self.engines[terminal] = [engine, None, []]
+            self.close_ids[terminal] = terminal.connect('close-term',
+                                                        self.on_close_term)
+            startrow, endrow = vte_buffer_range(vte, terminal.config)
+            engine.search(searchre, startrow, endrow, vte.get_column_count())
+        self.status.set_text(_('Searching %d terminals') % len(self.engines))
+        self.show_all()
+        self.present()
+
+    def cancel(self):
+        """Stop every running search and forget the results"""
+        for engine, _iter, _listed in self.engines.values():
+            engine.cancel()
+        for terminal, close_id in self.close_ids.items():
+            terminal.disconnect(close_id)
+        self.engines = {}
+        self.close_ids = {}
+        self.dirty = set()
+        if self.update_timer:
+            GObject.source_remove(self.update_timer)
+            self.update_timer = None
+        self.store.clear()
+
+    def on_close_term(self, terminal):
+        """A terminal is closing, stop reading it and drop its results"""
+        terminal.disconnect(self.close_ids.pop(terminal))
+        engine, treeiter, _listed = self.engines.pop(terminal)
+        engine.cancel()
+        self.dirty.discard(terminal)
+        if treeiter is not None:
+            self.store.remove(treeiter)
+        self.update_status()
+
+    def on_update(self, terminal):
+        """A terminal's search has new hits, show them shortly. Every
+        chunk searched reports, the model is only updated a few times a
+        second"""
+        self.dirty.add(terminal)
+        if not self.update_timer:
+            self.update_timer = GObject.timeout_add(UPDATE_DELAY,
+                                                    self.on_update_timer)
+
+    def on_update_timer(self):
+        """Show the hits of the terminals that reported since the last
+        update"""
+        self.update_timer = None
+        dirty, self.dirty = self.dirty, set()
+        for terminal in dirty:
+            if self.engines.has_key(terminal):
+                self.update_terminal(terminal)
+        self.update_status()
+        return(False)
+
+    def update_terminal(self, terminal):
+        """Bring the rows of a terminal up to date with its hits"""
+        engine, treeiter, listed = self.engines[terminal]
+        hits = engine.hits
+        if treeiter is None:
+            if not len(hits):
+                return
+            label = terminal.titlebar.get_custom_title() or \
+                    terminal.get_window_title()
+            treeiter = self.store.append(None, [label, '', 0, 0, terminal])
+            self.engines[terminal][1] = treeiter
+        self.store.set(treeiter, self.COL_HITS, str(len(hits)),
+                       self.COL_RANK, len(hits),
+                       self.COL_ROW, hits.rows[0] if len(hits) else 0)
+        rows = hits.rows[:MAX_LISTED_HITS]
+        if rows == listed:
+            return
+        if rows[:len(listed)] == listed:
+            # Chunks are searched in row order, usually the hits only grew
+            new = rows[len(listed):]
+        else:
+            while self.store.iter_has_child(treeiter):
+                self.store.remove(self.store.iter_children(treeiter))
+            new = rows
+        for row in new:
+            self.store.append(treeiter, [_('row %d') % row, '', -row, row,
+                                         terminal])
+        self.engines[terminal][2] = rows
+
+    def update_status(self):
+        """Summarise the search progress"""
+        engines = [engine for engine, _iter, _listed in self.engines.values()]
+        found = [engine for engine in engines if len(engine.hits)]
+        text = _('%d matches in %d of %d terminals') % \
+                (sum([len(engine.hits) for engine in found]), len(found),
+                 len(engines))
+        if [engine for engine in engines if engine.scanning]:
+            text += _(', searching')
+        self.status.set_text(text)
+
+    def on_row_activated(self, view, path, _column):
+        """Jump to the terminal and row of a result"""
+        treeiter = self.store.get_iter(path)
+        terminal = self.store.get_value(treeiter, self.COL_TERMINAL)
+        row = self.store.get_value(treeiter, self.COL_ROW)
+        if terminal not in Terminator().terminals:
+            return
+        terminal.ensure_visible_and_focussed()
+        terminal.get_toplevel().present()
+        terminal.scrollbar_jump(row)
+
+    def on_delete(self, _widget, _event):
+        """Hide rather than destroy, cancelling the searches"""
+        self.cancel()
+        self.hide()
+        return(True)
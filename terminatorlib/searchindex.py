@@ -0,0 +1,217 @@
+#!/usr/bin/env python2
+# Terminator by Chris Jones <cmsj@tenshu.net>
+# GPL v2 only
+"""searchindex.py - indexed regex search over terminal scrollback
+
+Text is pulled from the terminal in large chunks of whole rows and the
+regex is run over each chunk in one go. Hits are mapped back to rows with
+a row-offset index and kept as a sorted list of rows, so next/prev and the
+hit count are bisections. Chunks are read and matched one per idle
+callback, so a long scrollback or a search of all terminals never blocks
+the main loop for more than a chunk. The matching is not handed to
+threads: the re module holds the GIL while it runs, so they would only
+add overhead and not run in parallel.
+
+>>> import re
+>>> text = u'foo\\nbar\\nfoo bar\\n' + u'x' * 10 + u'foo\\n'
+>>> row_starts(text, 8)
+[0, 4, 8, 16, 24, 30]
+>>> find_rows(re.compile('foo'), text, 100, 8)
+[100, 102, 104]
+>>> find_rows(re.compile('baz'), text, 100, 8)
+[]
+>>> lines = u'foo\\nbar\\nfoo\\nxfoo\\n'
+>>> find_rows(re.compile('^foo', re.MULTILINE), lines, 0, 80)
+[0, 2]
+>>> find_rows(re.compile('foo$', re.MULTILINE), lines, 0, 80)
+[0, 2, 3]
+>>> find_rows(re.compile(r'o\sb', re.MULTILINE), lines, 0, 80)
+[]
+>>> find_rows(re.compile(r'o\s*b|xf', re.MULTILINE), lines, 0, 80)
+[3]
+>>> hits = SearchHits()
+>>> hits.replace_from(100, [100, 102, 104])
+>>> len(hits), hits.next(100), hits.prev(100), hits.prev(100, wrap=True)
+(3, 102, None, 104)
+>>> hits.position(102)
+2
+>>> hits.replace_from(103, [105])
+>>> hits.rows
+[100, 102, 105]
+>>> hits.trim_before(101)
+>>> hits.rows
+[102, 105]
+>>> hits.replace_range(103, 200, [150])
+>>> hits.replace_range(0, 103, [50, 60])
+>>> hits.rows
+[50, 60, 150]
+
+"""
+
+from bisect import bisect_left, bisect_right
+
+CHUNK_ROWS = 5000
+
+def row_starts(text, columns):
+    """Return the offset of each row start in text. Lines longer than the
+    terminal are soft wrapped by VTE over several rows (wide characters are
+    counted as one column)"""
+    starts = []
+    pos = 0
+    for line in text.split(u'\n'):
+        starts.append(pos)
+        length = len(line)
+        if columns and length > columns:
+            starts.extend(xrange(pos + columns, pos + length, columns))
+        pos += length + 1
+    return(starts)
+
+def find_rows(regex, text, first_row, columns):
+    """Return the sorted rows of text, which starts at first_row, that
+    regex matches. regex should be compiled with re.MULTILINE, so ^ and $
+    match at every line. A match may not span lines, the terminal was
+    searched one line at a time before"""
+    rows = []
+    starts = None
+    pos = 0
+    while True:
+        match = regex.search(text, pos)
+        if not match:
+            return(rows)
+        lineend = text.find(u'\n', match.start(), match.end())
+        if lineend != -1:
+            # Crossed a line break, look for a match within the line only
+            linestart = text.rfind(u'\n', 0, match.start()) + 1
+            match = regex.search(text, max(pos, linestart), lineend)
+            if not match:
+                pos = lineend + 1
+                continue
+        if starts is None:
+            # Only pay for the row index if anything matched at all
+            starts = row_starts(text, columns)
+        idx = bisect_right(starts, match.start()) - 1
+        rows.append(first_row + idx)
+        if idx + 1 >= len(starts):
+            return(rows)
+        # One hit per row is enough, carry on from the next row
+        pos = max(starts[idx + 1], match.end())
+
+class SearchHits(object):
+    """Sorted rows that matched the current search"""
+
+    rows = None
+
+    def __init__(self):
+        self.rows = []
+
+    def __len__(self):
+        return(len(self.rows))
+
+    def replace_from(self, row, rows):
+        """Replace every hit at or after row with rows"""
+        del(self.rows[bisect_left(self.rows, row):])
+        self.rows.extend(rows)
+
+    def replace_range(self, start, end, rows):
+        """Replace the hits in rows [start, end) with rows"""
+        self.rows[bisect_left(self.rows, start):
+                  bisect_left(self.rows, end)] = rows
+
+    def trim_before(self, row):
+        """Forget hits that have scrolled out of the buffer"""
+        del(self.rows[:bisect_left(self.rows, row)])
+
+    def next(self, row, wrap=False):
+        """The first hit after row, or None"""
+        idx = bisect_right(self.rows, row)
+        if idx < len(self.rows):
+            return(self.rows[idx])
+        if wrap and self.rows:
+            return(self.rows[0])
+        return(None)
+
+    def prev(self, row, wrap=False):
+        """The last hit before row, or None"""
+        idx = bisect_left(self.rows, row)
+        if idx > 0:
+            return(self.rows[idx - 1])
+        if wrap and self.rows:
+            return(self.rows[-1])
+        return(None)
+
+    def position(self, row):
+        """1-based index of the hit at row, 0 if row is not a hit"""
+        idx = bisect_left(self.rows, row)
+        if idx < len(self.rows) and self.rows[idx] == row:
+            return(idx + 1)
+        return(0)
+
+class ScrollbackSearch(object):
+    """Run a search over a terminal buffer, a chunk at a time from the main
+    loop.
+
+    read_rows(start, end) returns the text of rows [start, end).
+    idle_add(func, *args) must run func on the main loop when it is idle.
+    on_update() is called whenever hits changed."""
+
+    read_rows = None
+    idle_add = None
+    on_update = None
+    columns = None
+
+    hits = None
+    regex = None
+    generation = None
+    scanning = None
+
+    def __init__(self, read_rows, idle_add, on_update):
+        self.read_rows = read_rows
+        self.idle_add = idle_add
+        self.on_update = on_update
+        self.hits = SearchHits()
+        self.generation = 0
+        self.scanning = False
+
+    def search(self, regex, startrow, endrow, columns):
+        """Start a new search, cancelling any that is running"""
+        self.cancel()
+        self.regex = regex
+        self.columns = columns
+        self.scanning = True
+        self.idle_add(self.scan_chunk, self.generation, startrow, endrow)
+
+    def cancel(self):
+        """Drop the current search and any work still queued for it"""
+        self.generation += 1
+        self.scanning = False
+        self.regex = None
+        self.hits = SearchHits()
+
+    def scan_chunk(self, generation, row, endrow):
+        """Idle callback: match the next chunk of rows, and queue the one
+        after it"""
+        if generation != self.generation:
+            return(False)
+        end = min(row + CHUNK_ROWS, endrow)
+        text = self.read_rows(row, end)
+        self.hits.replace_range(row, end, find_rows(self.regex, text, row,
+                                                    self.columns))
+        if end >= endrow:
+            self.scanning = False
+        else:
+            self.idle_add(self.scan_chunk, generation, end, endrow)
+        self.on_update()
+        return(False)
+
+    def refresh(self, startrow, volatile_row, endrow):
+        """Rescan the rows from volatile_row on, which the terminal may
+        have rewritten, and forget rows that scrolled out before startrow"""
+        if self.scanning or not self.regex:
+            return
+        volatile_row = max(startrow, volatile_row)
+        text = self.read_rows(volatile_row, endrow)
+        self.hits.replace_from(volatile_row, find_rows(self.regex, text,
+                                                       volatile_row,
+                                                       self.columns))
+        self.hits.trim_before(startrow)
+        self.on_update()
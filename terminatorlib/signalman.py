@@ -9,6 +9,8 @@ class Signalman(object):
     """Class providing glib signal tracking and management"""
 
     cnxids = None
+    # Optional wrap(signal, handler) returning the handler to connect
+    wrap = None
 
     def __init__(self):
         """Class initialiser"""
@@ -28,6 +30,8 @@ class Signalman(object):
         if self.cnxids[widget].has_key(signal):
             err('%s already has a handler for %s' % (id(widget), signal))
 
+        if self.wrap:
+            handler = self.wrap(signal, handler)
         self.cnxids[widget][signal] = widget.connect(signal, handler, *args)
         dbg('connected %s::%s to %s' % (type(widget), signal, handler))
         return(self.cnxids[widget][signal])
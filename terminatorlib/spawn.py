@@ -0,0 +1,97 @@
+#!/usr/bin/env python2
+# Terminator by Chris Jones <cmsj@tenshu.net>
+# GPL v2 only
+"""spawn.py - describe and start the child process of a terminal
+
+A SpawnRequest holds the argv, cwd and environment of a child, plus the
+text to feed it once it runs (sourcing an envfile, a prefilled command).
+The child is started with the asynchronous VTE spawn API where available,
+so the main loop keeps running while the fork/exec happens; older VTEs
+fall back to spawn_sync with the same completion callback.
+"""
+
+import os
+from gi.repository import GLib, Vte
+from util import dbg, get_home_dir
+
+SPAWN_FLAGS = GLib.SpawnFlags.FILE_AND_ARGV_ZERO | \
+              GLib.SpawnFlags.DO_NOT_REAP_CHILD
+
+class SpawnRequest(object):
+    """A child waiting to be spawned in a VTE"""
+
+    shell = None
+    argv = None
+    cwd = None
+    envv = None
+    feeds = None
+    envfname = None
+
+    def __init__(self, shell, args, cwd):
+        """Class initialiser. args excludes argv[0], which is the shell"""
+        self.shell = shell
+        self.argv = [shell] + args
+        self.cwd = cwd
+        self.envv = []
+        self.feeds = []
+        self.envfname = ''
+
+    def add_env(self, name, value):
+        """Set an environment variable for the child"""
+        self.envv.append('%s=%s' % (name, value))
+
+    def add_envlist(self, envlist):
+        """Add already formatted NAME=value entries"""
+        self.envv.extend(envlist)
+
+    def set_histfile(self, histfile):
+        """Give the child its own shell history, relative to home"""
+        self.add_env('HISTFILE', '%s/%s' % (get_home_dir(), histfile))
+
+    def set_envfile(self, envfile):
+        """Source envfile, relative to home, once the shell runs. Sets
+        envfname to the name shown in the titlebar: .envSmth or Smth.env
+        gives SMTH, an unreadable file gives INVALID"""
+        fenv = "%s/%s" % (get_home_dir(), envfile)
+        if os.access(fenv, os.R_OK):
+            self.envfname = envfile.replace('.env','').upper()
+            self.add_feed("source %s\n" % fenv)
+        else:
+            self.envfname = 'INVALID'
+
+    def add_feed(self, text):
+        """Queue text to feed the child once it has started"""
+        self.feeds.append(text)
+
+    def spawn(self, vte, callback):
+        """Start the child in vte. callback(pid) is called from the main
+        loop once it runs, with a pid of -1 if it could not be started"""
+        dbg('SpawnRequest::spawn: "%s" with args: %s' % (self.shell,
+                                                         self.argv[1:]))
+        if hasattr(vte, 'spawn_async'):
+            vte.spawn_async(Vte.PtyFlags.DEFAULT, self.cwd, self.argv,
+                            self.envv, SPAWN_FLAGS, None, None, -1, None,
+                            self.on_spawned, callback)
+            return
+        try:
+            result, pid = vte.spawn_sync(Vte.PtyFlags.DEFAULT, self.cwd,
+                                         self.argv, self.envv, SPAWN_FLAGS,
+                                         None, None, None)
+        except GLib.GError, ex:
+            dbg('SpawnRequest::spawn: failed: %s' % ex)
+            pid = -1
+        callback(pid)
+
+    def on_spawned(self, _vte, pid, error, callback):
+        """spawn_async completion"""
+        if error:
+            dbg('SpawnRequest::on_spawned: failed: %s' % error)
+            pid = -1
+        callback(pid)
+
+    def feed(self, feeder):
+        """Hand the queued text to feeder, a function taking a string"""
+        for text in self.feeds:
+            feeder(text)
+
+# vim: set expandtab ts=4 sw=4:
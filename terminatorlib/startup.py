@@ -0,0 +1,89 @@
+#!/usr/bin/env python2
+# Terminator by Chris Jones <cmsj@tenshu.net>
+# GPL v2 only
+"""startup.py - startup helpers that must not pull in Gtk
+
+The startup timeline records named phases from the very first line of the
+terminator script, before Gtk is imported, and prints them when
+--profile-startup is given.
+
+>>> timeline = StartupTimeline(start=100.0)
+>>> timeline.mark('imports', now=100.25)
+>>> timeline.mark('first prompt', now=101.0)
+>>> print timeline.format()
+startup timeline (ms):
+  imports                         250.0  +250.0
+  first prompt                   1000.0  +750.0
+
+"""
+
+import os
+import sys
+import time
+import glob
+
+class StartupTimeline(object):
+    """Named points in time since the process started"""
+
+    start = None
+    marks = None
+
+    def __init__(self, start=None):
+        self.start = start or time.time()
+        self.marks = []
+
+    def mark(self, phase, now=None):
+        """Record that phase has just finished"""
+        self.marks.append((phase, now or time.time()))
+
+    def format(self):
+        """Return the timeline as text"""
+        lines = ['startup timeline (ms):']
+        last = self.start
+        for phase, when in self.marks:
+            lines.append('  %-28s %8.1f  +%.1f' % (phase,
+                                                   (when - self.start) * 1000,
+                                                   (when - last) * 1000))
+            last = when
+        return('\n'.join(lines))
+
+TIMELINE = None
+
+def profile_startup(start=None):
+    """Start recording the startup timeline"""
+    global TIMELINE
+    TIMELINE = StartupTimeline(start)
+
+def mark(phase):
+    """Record a phase if the startup is being profiled"""
+    if TIMELINE:
+        TIMELINE.mark(phase)
+
+def report():
+    """Print the timeline once, if the startup is being profiled"""
+    global TIMELINE
+    if TIMELINE:
+        sys.stderr.write(TIMELINE.format() + '\n')
+        TIMELINE = None
+
+def ibus_daemon_running():
+    """Is an ibus-daemon serving this user, without scanning processes.
+    Every ibus-daemon writes its pid to an address file under the user's
+    config dir, one per machine and display, so check those pids"""
+    if os.environ.get('IBUS_ADDRESS_FILE'):
+        candidates = [os.environ['IBUS_ADDRESS_FILE']]
+    else:
+        confdir = os.environ.get('XDG_CONFIG_HOME',
+                                 os.path.expanduser('~/.config'))
+        candidates = glob.glob(os.path.join(confdir, 'ibus', 'bus', '*'))
+    for address_file in candidates:
+        try:
+            for line in open(address_file):
+                if line.startswith('IBUS_DAEMON_PID='):
+                    os.kill(int(line.split('=', 1)[1]), 0)
+                    return(True)
+        except (IOError, OSError, ValueError):
+            continue
+    return(False)
+
+# vim: set expandtab ts=4 sw=4:
@@ -24,8 +24,13 @@ from terminal_popup_menu import TerminalPopupMenu
 from searchbar import Searchbar
 from translation import _
 from signalman import Signalman
+from outputmetrics import OutputMetrics
+from spawn import SpawnRequest
+from profilesettings import get_settings, dim_color
+from keybindings import CHORD_PENDING
+from urlmatch import BUILTIN_MATCHES, MERGED_NAME, REGEX_FLAGS, \
+        get_regex, merge_patterns, matches_text
 import plugin
-from terminatorlib.layoutlauncher import LayoutLauncher
 #import pout
 #pout.inject()
 
@@ -33,6 +38,9 @@ from terminatorlib.layoutlauncher import LayoutLauncher
 class Terminal(Gtk.VBox):
     """Class implementing the VTE widget and its wrappings"""
 
+    node_kinds = frozenset(['Terminal'])
+    node_type = 'Terminal'
+
     __gsignals__ = {
         'close-term': (GObject.SignalFlags.RUN_LAST, None, ()),
         'title-change': (GObject.SignalFlags.RUN_LAST, None,
@@ -68,6 +76,10 @@ class Terminal(Gtk.VBox):
         'group-all-toggle': (GObject.SignalFlags.RUN_LAST, None, ()),
         'move-tab': (GObject.SignalFlags.RUN_LAST, None,
             (GObject.TYPE_STRING,)),
+        'cwd-changed': (GObject.SignalFlags.RUN_LAST, None,
+            (GObject.TYPE_STRING,)),
+        'foreground-changed': (GObject.SignalFlags.RUN_LAST, None,
+            (GObject.TYPE_STRING,)),
     }
 
     TARGET_TYPE_VTE = 8
@@ -90,10 +102,17 @@ class Terminal(Gtk.VBox):
     command = None
     clipboard = None
     pid = None
+    spawn_deferred = False
+    spawn_pending = False
 
     matches = None
+    plugin_matches = None
+    matches_merged = False
+    match_names = None
     regex_flags = None
     config = None
+    configured = None
+    metrics = None
     default_encoding = None
     custom_encoding = None
     custom_font_size = None
@@ -109,6 +128,7 @@ class Terminal(Gtk.VBox):
     term_envlist = None
     directory = ''
     _cwdprev = ''
+    _cwdstale = True
     dirfixed = False
     profile = 'default'
     title = ''
@@ -141,9 +161,13 @@ class Terminal(Gtk.VBox):
         self.connect('layout-save', self.terminator.save_yourself)
 
         self.matches = {}
+        self.plugin_matches = []
         self.cnxids = Signalman()
 
         self.config = Config()
+        if self.config['output_metrics']:
+            self.metrics = OutputMetrics()
+            self.cnxids.wrap = self.metrics.timed
 
         self.cwd = get_default_cwd()
         self.origcwd = self.terminator.origcwd
@@ -163,8 +187,7 @@ class Terminal(Gtk.VBox):
         self.vte.show()
 
         self.default_encoding = self.vte.get_encoding()
-        self.regex_flags = (GLib.RegexCompileFlags.OPTIMIZE | \
-                            GLib.RegexCompileFlags.MULTILINE)
+        self.regex_flags = REGEX_FLAGS
         self.update_url_matches()
 
         self.terminalbox = self.create_terminalbox()
@@ -174,6 +197,7 @@ class Terminal(Gtk.VBox):
         self.titlebar.connect('edit-done', self.on_edit_done)
         #self.connect('title-change', self.titlebar.update_terminal_title)
         self.connect('title-change', self.on_title_change)
+        self.connect('cwd-changed', self.on_cwd_changed)
         self.titlebar.connect('create-group', self.really_create_group)
         self.titlebar.show_all()
 
@@ -242,9 +266,21 @@ class Terminal(Gtk.VBox):
         if vte_cwd:
             # OSC7 pwd gives an answer
             return(GLib.filename_from_uri(vte_cwd)[0])
+        elif self.spawn_deferred:
+            # No child yet, it will start where the layout says
+            return(self.directory or self.cwd)
         else:
-            # Fall back to old gtk2 method
-            return(self.terminator.pid_cwd(self.pid))
+            # Ask /proc, through the cache of the watcher
+            return(self.terminator.procwatcher.get_cwd(self))
+
+    def layout_cwd(self):
+        """Return our cwd for describe_layout. Only a terminal that had the
+        focus since the last look can have been cd'ed by the user, the
+        others reuse the cwd seen then instead of asking /proc again"""
+        if self._cwdstale or not self._cwdprev:
+            self._cwdprev = self.get_cwd()
+            self._cwdstale = False
+        return(self._cwdprev)
 
     def close(self):
         """Close ourselves"""
@@ -252,14 +288,17 @@ class Terminal(Gtk.VBox):
         self.zombie = True
         self.cnxids.remove_widget(self.vte)
         self.emit('close-term')
-        try:
-            dbg('close: killing %d' % self.pid)
-            os.kill(self.pid, signal.SIGHUP)
-        except Exception, ex:
-            # We really don't want to care if this failed. Deep OS voodoo is
-            # not what we should be doing.
-            dbg('os.kill failed: %s' % ex)
-            pass
+        if self.spawn_pending:
+            # There is no child yet, on_child_spawned hangs it up
+            dbg('close: child not spawned yet')
+        elif self.pid and self.pid > 0:
+            try:
+                dbg('close: killing %d' % self.pid)
+                os.kill(self.pid, signal.SIGHUP)
+            except Exception, ex:
+                # We really don't want to care if this failed. Deep OS
+                # voodoo is not what we should be doing.
+                dbg('os.kill failed: %s' % ex)
 
         if self.vte:
             self.terminalbox.remove(self.vte)
@@ -280,84 +319,122 @@ class Terminal(Gtk.VBox):
 
     def update_url_matches(self):
         """Update the regexps used to match URLs"""
-        userchars = "-A-Za-z0-9"
-        passchars = "-A-Za-z0-9,?;.:/!%$^*&~\"#'"
-        hostchars = "-A-Za-z0-9:\[\]"
-        pathchars = "-A-Za-z0-9_$.+!*(),;:@&=?/~#%'"
-        schemes   = "(news:|telnet:|nntp:|file:/|https?:|ftps?:|webcal:)"
-        user      = "[" + userchars + "]+(:[" + passchars + "]+)?"
-        urlpath   = "/[" + pathchars + "]*[^]'.}>) \t\r\n,\\\"]"
-
-        lboundry = "\\b"
-        rboundry = "\\b"
-
-        re = (lboundry + schemes +
-                "//(" + user + "@)?[" + hostchars  +".]+(:[0-9]+)?(" +
-                urlpath + ")?" + rboundry + "/?")
-        reg = GLib.Regex.new(re, self.regex_flags, 0)
-        self.matches['full_uri'] = self.vte.match_add_gregex(reg, 0)
-
-        if self.matches['full_uri'] == -1:
-            err ('Terminal::update_url_matches: Failed adding URL matches')
+        self.match_names = None
+        for name, pattern in BUILTIN_MATCHES:
+            self.matches[name] = self.vte.match_add_gregex(
+                    get_regex(pattern), 0)
+            if self.matches[name] == -1:
+                err ('Terminal::update_url_matches: Failed adding URL matches')
+                return
+
+        # Now add any matches from plugins. While starting up they are
+        # loaded after the first window is shown, and add their matches
+        # to every terminal themselves.
+        registry = plugin.PluginRegistry()
+        if self.terminator.plugins_deferred and not registry.done:
+            return
+        try:
+            registry.load_plugins()
+            plugins = registry.get_plugins_by_capability('url_handler')
+
+            for urlplugin in plugins:
+                name = urlplugin.handler_name
+                if name in self.matches or \
+                   name in [entry[0] for entry in self.plugin_matches]:
+                    dbg('refusing to add duplicate match %s' % name)
+                    continue
+                self.plugin_matches.append((name, urlplugin.match))
+                dbg('added plugin URL handler for %s (%s)' %
+                    (name, urlplugin.__class__.__name__))
+        except Exception, ex:
+            err('Exception occurred adding plugin URL match: %s' % ex)
+        self.add_plugin_matches()
+
+    def clear_plugin_matches(self):
+        """Unregister the URL matches of plugins from VTE"""
+        self.match_names = None
+        for name, _pattern in self.plugin_matches:
+            if name in self.matches and not self.matches_merged:
+                self.vte.match_remove(self.matches[name])
+            self.matches.pop(name, None)
+        if self.matches.has_key(MERGED_NAME):
+            self.vte.match_remove(self.matches[MERGED_NAME])
+            del(self.matches[MERGED_NAME])
+
+    def add_plugin_matches(self):
+        """Register the URL matches of plugins with VTE, one by one or
+        merged into one regex as merge_url_matches says"""
+        self.match_names = None
+        self.matches_merged = self.config['merge_url_matches']
+        if not self.plugin_matches:
+            return
+        if self.matches_merged:
+            merged = merge_patterns([pattern for _name, pattern in
+                                     self.plugin_matches])
+            tag = self.vte.match_add_gregex(get_regex(merged), 0)
+            self.matches[MERGED_NAME] = tag
+            for name, _pattern in self.plugin_matches:
+                self.matches[name] = tag
         else:
-            re = (lboundry +
-                    '(callto:|h323:|sip:)' + "[" + userchars + "+][" +
-                    userchars + ".]*(:[0-9]+)?@?[" + pathchars + "]+" +
-                    rboundry)
-            reg = GLib.Regex.new(re, self.regex_flags, 0)
-            self.matches['voip'] = self.vte.match_add_gregex(reg, 0)
-            re = (lboundry +
-                    "(www|ftp)[" + hostchars + "]*\.[" + hostchars +
-                    ".]+(:[0-9]+)?(" + urlpath + ")?" + rboundry + "/?")
-            reg = GLib.Regex.new(re, self.regex_flags, 0)
-            self.matches['addr_only'] = self.vte.match_add_gregex(reg, 0)
-            re = (lboundry +
-                    "(mailto:)?[a-zA-Z0-9][a-zA-Z0-9.+-]*@[a-zA-Z0-9]" +
-                            "[a-zA-Z0-9-]*\.[a-zA-Z0-9][a-zA-Z0-9-]+" +
-                            "[.a-zA-Z0-9-]*" + rboundry)
-            reg = GLib.Regex.new(re, self.regex_flags, 0)
-            self.matches['email'] = self.vte.match_add_gregex(reg, 0)
-            re = (lboundry +
-                  """news:[-A-Z\^_a-z{|}~!"#$%&'()*+,./0-9;:=?`]+@""" +
-                            "[-A-Za-z0-9.]+(:[0-9]+)?" + rboundry)
-            reg = GLib.Regex.new(re, self.regex_flags, 0)
-            self.matches['nntp'] = self.vte.match_add_gregex(reg, 0)
-
-            # Now add any matches from plugins
-            try:
-                registry = plugin.PluginRegistry()
-                registry.load_plugins()
-                plugins = registry.get_plugins_by_capability('url_handler')
-
-                for urlplugin in plugins:
-                    name = urlplugin.handler_name
-                    match = urlplugin.match
-                    if name in self.matches:
-                        dbg('refusing to add duplicate match %s' % name)
-                        continue
-                    reg = GLib.Regex.new(match, self.regex_flags, 0)
-                    self.matches[name] = self.vte.match_add_gregex(reg, 0)
-                    dbg('added plugin URL handler for %s (%s) as %d' %
-                        (name, urlplugin.__class__.__name__,
-                        self.matches[name]))
-            except Exception, ex:
-                err('Exception occurred adding plugin URL match: %s' % ex)
+            for name, pattern in self.plugin_matches:
+                self.matches[name] = self.vte.match_add_gregex(
+                        get_regex(pattern), 0)
 
     def match_add(self, name, match):
         """Register a URL match"""
         if name in self.matches:
             err('Terminal::match_add: Refusing to create duplicate match %s' % name)
             return
-        reg = GLib.Regex.new(match, self.regex_flags, 0)
-        self.matches[name] = self.vte.match_add_gregex(reg, 0)
+        if not self.matches_merged:
+            self.match_names = None
+            self.plugin_matches.append((name, match))
+            self.matches[name] = self.vte.match_add_gregex(get_regex(match), 0)
+            return
+        self.clear_plugin_matches()
+        self.plugin_matches.append((name, match))
+        self.add_plugin_matches()
 
     def match_remove(self, name):
         """Remove a previously registered URL match"""
         if name not in self.matches:
             err('Terminal::match_remove: Unable to remove non-existent match %s' % name)
             return
-        self.vte.match_remove(self.matches[name])
-        del(self.matches[name])
+        plugin_names = [entry[0] for entry in self.plugin_matches]
+        if name not in plugin_names or not self.matches_merged:
+            self.match_names = None
+            self.vte.match_remove(self.matches[name])
+            del(self.matches[name])
+            if name in plugin_names:
+                del(self.plugin_matches[plugin_names.index(name)])
+            return
+        self.clear_plugin_matches()
+        del(self.plugin_matches[plugin_names.index(name)])
+        self.add_plugin_matches()
+
+    def get_match_name(self, tag):
+        """Return the name of the URL match VTE knows as tag. All merged
+        plugin matches share the name MERGED_NAME"""
+        if self.match_names is None:
+            self.match_names = {}
+            for name, matchtag in self.matches.items():
+                if self.matches_merged and \
+                   self.matches.get(MERGED_NAME) == matchtag:
+                    name = MERGED_NAME
+                self.match_names[matchtag] = name
+        return(self.match_names.get(tag))
+
+    def get_url_handler(self, urlmatch):
+        """Return the url_handler plugin responsible for a VTE match, or
+        None if it is one of ours"""
+        url, tag = urlmatch
+        name = self.get_match_name(tag)
+        if name == MERGED_NAME:
+            for name, pattern in self.plugin_matches:
+                if matches_text(pattern, url):
+                    break
+            else:
+                return(None)
+        return(plugin.PluginRegistry().get_url_handler(name))
 
     def maybe_copy_clipboard(self):
         if self.config['copy_on_selection'] and self.vte.get_has_selection():
@@ -440,6 +517,20 @@ class Terminal(Gtk.VBox):
 
         self.cnxids.new(self.vte, 'realize', self.reconfigure)
 
+        if self.metrics:
+            # Not through cnxids, the metrics must not time themselves
+            self.vte.connect('contents-changed',
+                             self.metrics.on_contents_changed)
+            self.vte.connect('draw', self.metrics.on_draw)
+            self.vte.connect_after('draw', self.metrics.on_draw_after)
+
+    def get_metrics(self):
+        """Return the output metrics of this terminal, empty unless the
+        output_metrics option is on"""
+        if not self.metrics:
+            return({})
+        return(self.metrics.summary())
+
     def create_popup_group_menu(self, widget, event = None):
         """Pop up a menu for the group widget"""
         if event:
@@ -586,7 +677,7 @@ class Terminal(Gtk.VBox):
             # already in this group, no action needed
             return
         dbg('Terminal::set_group: Setting group to %s' % name)
-        self.group = name
+        self.terminator.set_terminal_group(self, name)
         self.titlebar.set_group_label(name)
         self.terminator.group_hoover()
 
@@ -603,9 +694,8 @@ class Terminal(Gtk.VBox):
     def ungroup(self, _widget, data):
         """Remove a group"""
         # FIXME: Could we emit and have Terminator do this?
-        for term in self.terminator.terminals:
-            if term.group == data:
-                term.set_group(None, None)
+        for term in list(self.terminator.get_group_members(data)):
+            term.set_group(None, None)
         self.terminator.group_hoover()
 
     def set_groupsend(self, _widget, value):
@@ -626,207 +716,92 @@ class Terminal(Gtk.VBox):
     def reconfigure(self, _widget=None):
         """Reconfigure our settings"""
         dbg('Terminal::reconfigure')
+        self.configured = self.terminator.config_fingerprint(self.config)
+        settings = get_settings(self.config)
         self.cnxids.remove_signal(self.vte, 'realize')
 
         # Handle child command exiting
         self.cnxids.remove_signal(self.vte, 'child-exited')
 
-        if self.config['exit_action'] == 'restart':
+        if settings.exit_action == 'restart':
             self.cnxids.new(self.vte, 'child-exited', self.spawn_child, True)
-        elif self.config['exit_action'] in ('close', 'left'):
+        elif settings.exit_action in ('close', 'left'):
             self.cnxids.new(self.vte, 'child-exited',
                                             lambda x, y: self.emit('close-term'))
 
         if self.custom_encoding != True:
-            self.vte.set_encoding(self.config['encoding'])
+            self.vte.set_encoding(settings.encoding)
         # Word char support was missing from vte 0.38, silently skip this setting
         if hasattr(self.vte, 'set_word_char_exceptions'):
-            self.vte.set_word_char_exceptions(self.config['word_chars'])
-        self.vte.set_mouse_autohide(self.config['mouse_autohide'])
+            self.vte.set_word_char_exceptions(settings.word_chars)
+        self.vte.set_mouse_autohide(settings.mouse_autohide)
 
-        backspace = self.config['backspace_binding']
-        delete = self.config['delete_binding']
+        self.vte.set_backspace_binding(settings.backspace_binding)
+        self.vte.set_delete_binding(settings.delete_binding)
 
-        try:
-            if backspace == 'ascii-del':
-                backbind = Vte.ERASE_ASCII_DELETE
-            elif backspace == 'control-h':
-                backbind = Vte.ERASE_ASCII_BACKSPACE
-            elif backspace == 'escape-sequence':
-                backbind = Vte.ERASE_DELETE_SEQUENCE
-            else:
-                backbind = Vte.ERASE_AUTO
-        except AttributeError:
-            if backspace == 'ascii-del':
-                backbind = 2
-            elif backspace == 'control-h':
-                backbind = 1
-            elif backspace == 'escape-sequence':
-                backbind = 3
-            else:
-                backbind = 0
-
-        try:
-            if delete == 'ascii-del':
-                delbind = Vte.ERASE_ASCII_DELETE
-            elif delete == 'control-h':
-                delbind = Vte.ERASE_ASCII_BACKSPACE
-            elif delete == 'escape-sequence':
-                delbind = Vte.ERASE_DELETE_SEQUENCE
-            else:
-                delbind = Vte.ERASE_AUTO
-        except AttributeError:
-            if delete == 'ascii-del':
-                delbind = 2
-            elif delete == 'control-h':
-                delbind = 1
-            elif delete == 'escape-sequence':
-                delbind = 3
-            else:
-                delbind = 0
-
-        self.vte.set_backspace_binding(backbind)
-        self.vte.set_delete_binding(delbind)
-
-        if not self.custom_font_size:
-            try:
-                if self.config['use_system_font'] == True:
-                    font = self.config.get_system_mono_font()
-                else:
-                    font = self.config['font']
-                self.set_font(Pango.FontDescription(font))
-            except:
-                pass
-        self.vte.set_allow_bold(self.config['allow_bold'])
-        if self.config['use_theme_colors']:
+        if not self.custom_font_size and settings.font:
+            self.set_font(settings.font.copy())
+        self.vte.set_allow_bold(settings.allow_bold)
+        if settings.use_theme_colors:
             self.fgcolor_active = self.vte.get_style_context().get_color(Gtk.StateType.NORMAL)  # VERIFY FOR GTK3: do these really take the theme colors?
             self.bgcolor = self.vte.get_style_context().get_background_color(Gtk.StateType.NORMAL)
+            self.bgcolor.alpha = settings.bgalpha
+            self.fgcolor_inactive = dim_color(self.fgcolor_active,
+                                              settings.inactive_factor)
         else:
-            self.fgcolor_active = Gdk.RGBA()
-            self.fgcolor_active.parse(self.config['foreground_color'])
-            self.bgcolor = Gdk.RGBA()
-            self.bgcolor.parse(self.config['background_color'])
-
-        if self.config['background_type'] == 'transparent':
-            self.bgcolor.alpha = self.config['background_darkness']
-        else:
-            self.bgcolor.alpha = 1
-
-        factor = self.config['inactive_color_offset']
-        if factor > 1.0:
-          factor = 1.0
-        self.fgcolor_inactive = self.fgcolor_active.copy()
-        dbg(("fgcolor_inactive set to: RGB(%s,%s,%s)", getattr(self.fgcolor_inactive, "red"),
-                                                      getattr(self.fgcolor_inactive, "green"),
-                                                      getattr(self.fgcolor_inactive, "blue")))
-
-        for bit in ['red', 'green', 'blue']:
-            setattr(self.fgcolor_inactive, bit,
-                    getattr(self.fgcolor_inactive, bit) * factor)
-
-        dbg(("fgcolor_inactive set to: RGB(%s,%s,%s)", getattr(self.fgcolor_inactive, "red"),
-                                                      getattr(self.fgcolor_inactive, "green"),
-                                                      getattr(self.fgcolor_inactive, "blue")))
-        colors = self.config['palette'].split(':')
-        self.palette_active = []
-        for color in colors:
-            if color:
-                newcolor = Gdk.RGBA()
-                newcolor.parse(color)
-                self.palette_active.append(newcolor)
-        if len(colors) == 16:
-            # RGB values for indices 16..255 copied from vte source in order to dim them
-            shades = [0, 95, 135, 175, 215, 255]
-            for r in xrange(0, 6):
-                for g in xrange(0, 6):
-                    for b in xrange(0, 6):
-                        newcolor = Gdk.RGBA()
-                        setattr(newcolor, "red",   shades[r] / 255.0)
-                        setattr(newcolor, "green", shades[g] / 255.0)
-                        setattr(newcolor, "blue",  shades[b] / 255.0)
-                        self.palette_active.append(newcolor)
-            for y in xrange(8, 248, 10):
-                newcolor = Gdk.RGBA()
-                setattr(newcolor, "red",   y / 255.0)
-                setattr(newcolor, "green", y / 255.0)
-                setattr(newcolor, "blue",  y / 255.0)
-                self.palette_active.append(newcolor)
-        self.palette_inactive = []
-        for color in self.palette_active:
-            newcolor = Gdk.RGBA()
-            for bit in ['red', 'green', 'blue']:
-                setattr(newcolor, bit,
-                        getattr(color, bit) * factor)
-            self.palette_inactive.append(newcolor)
+            self.fgcolor_active = settings.fgcolor_active
+            self.bgcolor = settings.bgcolor
+            self.fgcolor_inactive = settings.fgcolor_inactive
+        self.palette_active = settings.palette_active
+        self.palette_inactive = settings.palette_inactive
         if self.terminator.last_focused_term == self:
             self.vte.set_colors(self.fgcolor_active, self.bgcolor,
                                 self.palette_active)
         else:
             self.vte.set_colors(self.fgcolor_inactive, self.bgcolor,
                                 self.palette_inactive)
-        profiles = self.config.base.profiles
         terminal_box_style_context = self.terminalbox.get_style_context()
-        for profile in profiles.keys():
-            munged_profile = "terminator-profile-%s" % (
-                "".join([c if c.isalnum() else "-" for c in profile]))
-            if terminal_box_style_context.has_class(munged_profile):
-                terminal_box_style_context.remove_class(munged_profile)
-        munged_profile = "".join([c if c.isalnum() else "-" for c in self.get_profile()])
-        css_class_name = "terminator-profile-%s" % (munged_profile)
-        terminal_box_style_context.add_class(css_class_name)
+        for profile_class in settings.profile_classes:
+            if terminal_box_style_context.has_class(profile_class):
+                terminal_box_style_context.remove_class(profile_class)
+        terminal_box_style_context.add_class(settings.css_class)
         self.set_cursor_color()
-        self.vte.set_cursor_shape(getattr(Vte.CursorShape,
-                                          self.config['cursor_shape'].upper()));
-
-        if self.config['cursor_blink'] == True:
-            self.vte.set_cursor_blink_mode(Vte.CursorBlinkMode.ON)
-        else:
-            self.vte.set_cursor_blink_mode(Vte.CursorBlinkMode.OFF)
+        self.vte.set_cursor_shape(settings.cursor_shape)
+        self.vte.set_cursor_blink_mode(settings.cursor_blink_mode)
 
-        if self.config['force_no_bell'] == True:
-            self.vte.set_audible_bell(False)
-            self.cnxids.remove_signal(self.vte, 'bell')
-        else:
-            self.vte.set_audible_bell(self.config['audible_bell'])
-            self.cnxids.remove_signal(self.vte, 'bell')
-            if self.config['urgent_bell'] == True or \
-               self.config['icon_bell'] == True or \
-               self.config['visible_bell'] == True:
-                try:
-                    self.cnxids.new(self.vte, 'bell', self.on_bell)
-                except TypeError:
-                    err('bell signal unavailable with this version of VTE')
+        self.vte.set_audible_bell(settings.audible_bell)
+        self.cnxids.remove_signal(self.vte, 'bell')
+        if settings.bell_handler:
+            try:
+                self.cnxids.new(self.vte, 'bell', self.on_bell)
+            except TypeError:
+                err('bell signal unavailable with this version of VTE')
 
-        if self.config['scrollback_infinite'] == True:
-            scrollback_lines = -1
-        else:
-            scrollback_lines = self.config['scrollback_lines']
-        self.vte.set_scrollback_lines(scrollback_lines)
-        self.vte.set_scroll_on_keystroke(self.config['scroll_on_keystroke'])
-        self.vte.set_scroll_on_output(self.config['scroll_on_output'])
+        self.vte.set_scrollback_lines(settings.scrollback_lines)
+        self.vte.set_scroll_on_keystroke(settings.scroll_on_keystroke)
+        self.vte.set_scroll_on_output(settings.scroll_on_output)
 
-        if self.config['scrollbar_position'] in ['disabled', 'hidden']:
+        if settings.scrollbar_position in ['disabled', 'hidden']:
             self.scrollbar.hide()
         else:
             self.scrollbar.show()
-            if self.config['scrollbar_position'] == 'left':
+            if settings.scrollbar_position == 'left':
                 self.terminalbox.reorder_child(self.scrollbar, 0)
-            elif self.config['scrollbar_position'] == 'right':
+            elif settings.scrollbar_position == 'right':
                 self.terminalbox.reorder_child(self.vte, 0)
 
-        self.vte.set_rewrap_on_resize(self.config['rewrap_on_resize'])
+        self.vte.set_rewrap_on_resize(settings.rewrap_on_resize)
+
+        if self.matches_merged != self.config['merge_url_matches']:
+            self.clear_plugin_matches()
+            self.add_plugin_matches()
 
         self.titlebar.update()
         self.vte.queue_draw()
 
     def set_cursor_color(self):
         """Set the cursor color appropriately"""
-        if self.config['cursor_color_fg']:
-            self.vte.set_color_cursor(None)
-        else:
-            cursor_color = Gdk.RGBA()
-            cursor_color.parse(self.config['cursor_color'])
-            self.vte.set_color_cursor(cursor_color)
+        self.vte.set_color_cursor(get_settings(self.config).cursor_color)
 
     def get_window_title(self):
         """Return the window title"""
@@ -891,6 +866,9 @@ class Terminal(Gtk.VBox):
         if mapping == "hide_window":
             return(False)
 
+        if mapping == CHORD_PENDING:
+            return(True)
+
         if mapping and mapping not in ['close_window',
                                        'full_screen']:
             dbg('Terminal::on_keypress: lookup found: %r' % mapping)
@@ -1141,8 +1119,8 @@ class Terminal(Gtk.VBox):
                                                                     '\'\\\'\''))
                         str += fname + ' '
                     txt=str
-            for term in self.terminator.get_target_terms(self):
-                term.feed(txt)
+            self.terminator.broadcaster.feed(
+                    self.terminator.get_target_terms(self), txt)
             return
 
         widgetsrc = data.terminator.terminals[int(selection_data.get_data())]
@@ -1233,6 +1211,7 @@ class Terminal(Gtk.VBox):
 
     def on_vte_focus_in(self, _widget, _event):
         """Inform other parts of the application when focus is received"""
+        self._cwdstale = True
         self.vte.set_colors(self.fgcolor_active, self.bgcolor,
                             self.palette_active)
         self.set_cursor_color()
@@ -1249,6 +1228,7 @@ class Terminal(Gtk.VBox):
 
     def on_vte_focus_out(self, _widget, _event):
         """Inform other parts of the application when focus is lost"""
+        self._cwdstale = True
         self.emit('focus-out')
 
     def on_window_focus_out(self):
@@ -1280,14 +1260,23 @@ class Terminal(Gtk.VBox):
 
     def on_title_change(self, widget, title): # 'title-change' handler
         #dbg('~CHANGE %s title: %s f[%d]' % (title, self.config_section, self.dirfixed))
+        # A new title usually comes with a new prompt, look at the child now
+        self.terminator.procwatcher.refresh(self)
         if not self.dirfixed:
-            cwd = self.get_cwd()
-            if self._cwdprev != cwd:
-                self._cwdprev = cwd
-                self.config.commit(self.config_section, 'directory', cwd)
+            self.on_cwd_changed(self, self.get_cwd())
         self.titlebar.update_terminal_title(widget, title)
 
+    def on_cwd_changed(self, _widget, cwd): # 'cwd-changed' handler
+        """Keep the directory of our layout entry up to date"""
+        if not self.dirfixed and self._cwdprev != cwd:
+            self._cwdprev = cwd
+            self.config.commit(self.config_section, 'directory', cwd)
+
     def deferred_on_vte_size_allocate(self, widget, allocation):
+        # Navigation has to look at the allocations again
+        window = self.get_toplevel()
+        if Factory().isinstance(window, 'Window'):
+            window.invalidate_navindex()
         # widget & allocation are not used in on_vte_size_allocate, so we
         # can use the on_vte_size_allocate instead of duplicating the code
         if self.pending_on_vte_size_allocate == True:
@@ -1392,6 +1381,28 @@ class Terminal(Gtk.VBox):
         if cwd is not None:
             self.cwd = cwd
 
+    def is_on_hidden_tab(self):
+        """Are we on a notebook page that is not the current one"""
+        maker = Factory()
+        child = self
+        parent = self.get_parent()
+        while parent:
+            if maker.isinstance(parent, 'Notebook'):
+                return(parent.get_nth_page(parent.get_shown_page()) != child)
+            child, parent = parent, parent.get_parent()
+        return(False)
+
+    def defer_spawn(self):
+        """Keep only our layout metadata until we are first shown"""
+        dbg('deferring spawn of %s' % self.config_section)
+        self.spawn_deferred = True
+
+    def ensure_spawned(self):
+        """Spawn the child we put off while we were hidden"""
+        if self.spawn_deferred and not self.zombie:
+            self.spawn_deferred = False
+            self.spawn_child(respawn=True)
+
     def spawn_child(self, widget=None, respawn=False, debugserver=False):
         args = []
         shell = None
@@ -1450,61 +1461,68 @@ class Terminal(Gtk.VBox):
 
         if shell is None:
             self.vte.feed(_('Unable to find a shell'))
-            return(-1)
+            return
 
         try:
             os.putenv('WINDOWID', '%s' % self.vte.get_parent_window().xid)
         except AttributeError:
             pass
 
-        envv = []
+        request = SpawnRequest(shell, args, self.cwd)
         if self.term_envlist:
-            for v in self.term_envlist:
-                envv.append(v)
+            request.add_envlist(self.term_envlist)
         if self.histfile:
-            envv.append('HISTFILE=%s/%s' % (get_home_dir(), self.histfile))
-        envv.append('TERM=%s' % self.config['term'])
-        envv.append('COLORTERM=%s' % self.config['colorterm'])
-        envv.append('PWD=%s' % self.cwd)
-        envv.append('TERMINATOR_CFG=%s' % self.config_section)
-        envv.append('TERMINATOR_UUID=%s' % self.uuid.urn)
+            request.set_histfile(self.histfile)
+        request.add_env('TERM', self.config['term'])
+        request.add_env('COLORTERM', self.config['colorterm'])
+        request.add_env('PWD', self.cwd)
+        request.add_env('TERMINATOR_CFG', self.config_section)
+        request.add_env('TERMINATOR_UUID', self.uuid.urn)
         if self.terminator.dbus_name:
-            envv.append('TERMINATOR_DBUS_NAME=%s' % self.terminator.dbus_name)
+            request.add_env('TERMINATOR_DBUS_NAME', self.terminator.dbus_name)
         if self.terminator.dbus_path:
-            envv.append('TERMINATOR_DBUS_PATH=%s' % self.terminator.dbus_path)
-
-        dbg('EXE Forking shell: "%s" with args: %s' % (shell, args))
-        args.insert(0, shell)
-        result,  self.pid = self.vte.spawn_sync(Vte.PtyFlags.DEFAULT,
-                                       self.cwd,
-                                       args,
-                                       envv,
-                                       GLib.SpawnFlags.FILE_AND_ARGV_ZERO | GLib.SpawnFlags.DO_NOT_REAP_CHILD,
-                                       None,
-                                       None,
-                                       None)
+            request.add_env('TERMINATOR_DBUS_PATH', self.terminator.dbus_path)
+        if self.envfile:
+            request.set_envfile(self.envfile)
+        if fcmd:
+            request.add_feed(fcmd)
+
         self.command = shell
-        self.titlebar.update()
+        self.spawn_pending = True
+        request.spawn(self.vte, lambda pid: self.on_child_spawned(request,
+                                                                  pid))
+
+    def on_child_spawned(self, request, pid):
+        """Our child is running, or failed to start"""
+        self.spawn_pending = False
+        if self.zombie or not self.vte:
+            # We were closed while the child was being spawned
+            dbg('Terminal::on_child_spawned: closed meanwhile, hanging up %s',
+                pid)
+            if pid > 0:
+                try:
+                    os.kill(pid, signal.SIGHUP)
+                except OSError, ex:
+                    dbg('os.kill failed: %s' % ex)
+            return
 
-        if self.pid == -1:
-            self.vte.feed(_('Unable to start shell:') + shell)
-            return(-1)
+        if pid <= 0:
+            # Leave self.pid None, killing -1 would hang up every process
+            # we can signal
+            self.titlebar.update()
+            self.vte.feed(_('Unable to start shell:') + request.shell)
+            return
 
-        dbg('EXE Forked shell: "%s" with args: %s' % (shell, args))
+        self.pid = pid
+        self.titlebar.update()
+
+        dbg('EXE Forked shell: "%s" with args: %s' % (request.shell,
+                                                      request.argv[1:]))
+        self.terminator.procwatcher.watch(self)
+        self.envfname = request.envfname
         if self.envfile:
-            fenv = "%s/%s" % (get_home_dir(), self.envfile)
-            if os.access(fenv, os.R_OK):            # .envSmth Smth.env => SMTH
-                self.envfname = self.envfile.replace('.env','').upper()
-                #self.envfname = self.envfile.replace('.env','')
-                fenv = "source %s/%s\n" % (get_home_dir(), self.envfile)
-                self.feed(fenv)
-            else:
-                self.envfname = 'INVALID'
             self.update_subwidgets()
-        else:
-            self.envfname = ''
-        if fcmd:
-            self.feed(fcmd)
+        request.feed(self.feed)
 
         self.terminator.layout_changed()
 
@@ -1520,21 +1538,16 @@ class Terminal(Gtk.VBox):
             url = 'ftp://' + url
         elif match == self.matches['addr_only']:
             url = 'http://' + url
-        elif match in self.matches.values():
+        else:
             # We have a match, but it's not a hard coded one, so it's a plugin
             try:
-                registry = plugin.PluginRegistry()
-                registry.load_plugins()
-                plugins = registry.get_plugins_by_capability('url_handler')
-
-                for urlplugin in plugins:
-                    if match == self.matches[urlplugin.handler_name]:
-                        newurl = urlplugin.callback(url)
-                        if newurl is not None:
-                            dbg('Terminal::prepare_url: URL prepared by \
+                urlplugin = self.get_url_handler(urlmatch)
+                if urlplugin:
+                    newurl = urlplugin.callback(url)
+                    if newurl is not None:
+                        dbg('Terminal::prepare_url: URL prepared by \
 %s plugin' % urlplugin.handler_name)
-                            url = newurl
-                        break
+                        url = newurl
             except Exception, ex:
                 err('Exception occurred preparing URL: %s' % ex)
 
@@ -1605,12 +1618,10 @@ class Terminal(Gtk.VBox):
 
     def zoom_orig(self):
         """Restore original font size"""
-        if self.config['use_system_font'] == True:
-            font = self.config.get_system_mono_font()
-        else:
-            font = self.config['font']
+        font = get_settings(self.config).font
         dbg("Terminal::zoom_orig: restoring font to: %s" % font)
-        self.set_font(Pango.FontDescription(font))
+        if font:
+            self.set_font(font.copy())
         self.custom_font_size = None
 
     def set_font(self, fontdesc):
@@ -1680,10 +1691,10 @@ class Terminal(Gtk.VBox):
         name = "%st" % self.config.name_next()
         # name = self.config.name_next()
         if not self.config_section:
-            dbg('~TERMINAL EMPTY at describe self new[%s]' % name)
+            dbg('~TERMINAL EMPTY at describe self new[%s]', name)
         self.config_section = name
         global_layout[name] = layout
-        dbg('~DESCRIBE  [Terminal:%s of %s]' % (name, parent))
+        dbg('~DESCRIBE  [Terminal:%s of %s]', name, parent)
         self.from_subwidgets()
         layout['type'] = 'Terminal'
         layout['parent'] = parent
@@ -1692,7 +1703,7 @@ class Terminal(Gtk.VBox):
         layout['title'] = self.title # bar.get_custom_title()
         layout['titlefixed'] = self.titlefixed
         layout['dirfixed'] = self.dirfixed
-        layout['_lastwdir'] = self.get_cwd()
+        layout['_lastwdir'] = self.layout_cwd()
         if self.dirfixed:
             layout['directory'] = self.directory
         else:
@@ -1706,7 +1717,7 @@ class Terminal(Gtk.VBox):
             layout['_histfile'] = self.histfile
             layout['_histcust'] = True
             self._sufix = self.histfile.split('.')[-1]
-            dbg('LAY got sufix: %s' % self._sufix)
+            dbg('LAY got sufix: %s', self._sufix)
         else:
             if not self._sufix:
                 self._sufix = str(self.uuid).split('-')[0]
@@ -1721,7 +1732,7 @@ class Terminal(Gtk.VBox):
             layout['_envcust'] = False
         if self.group:
             layout['group'] = self.group
-        dbg('DESCribed [Terminal:%s]' % self.config_section)
+        dbg('DESCribed [Terminal:%s]', self.config_section)
         return(True)
 
     def from_subwidgets(self):
@@ -2134,6 +2145,7 @@ class Terminal(Gtk.VBox):
         self.titlebar.label.edit()
 
     def key_layout_launcher(self):
+        from layoutlauncher import LayoutLauncher
         LAYOUTLAUNCHER=LayoutLauncher()
 
     def key_page_up(self):
@@ -14,7 +14,6 @@ from encoding import TerminatorEncoding
 from terminator import Terminator
 from util import err, dbg
 from config import Config
-from prefseditor import PrefsEditor
 import plugin
 
 class TerminalPopupMenu(object):
@@ -51,36 +50,27 @@ class TerminalPopupMenu(object):
 
         if url and url[0]:
             dbg("URL matches id: %d" % url[1])
-            if not url[1] in terminal.matches.values():
+            matchname = terminal.get_match_name(url[1])
+            if matchname is None:
                 err("Unknown URL match id: %d" % url[1])
                 dbg("Available matches: %s" % terminal.matches)
 
             nameopen = None
             namecopy = None
-            if url[1] == terminal.matches['email']:
+            if matchname == 'email':
                 nameopen = _('_Send email to...')
                 namecopy = _('_Copy email address')
-            elif url[1] == terminal.matches['voip']:
+            elif matchname == 'voip':
                 nameopen = _('Ca_ll VoIP address')
                 namecopy = _('_Copy VoIP address')
-            elif url[1] in terminal.matches.values():
+            elif matchname is not None:
                 # This is a plugin match
-                for pluginname in terminal.matches:
-                    if terminal.matches[pluginname] == url[1]:
-                        break
-
-                dbg("Found match ID (%d) in terminal.matches plugin %s" %
-                        (url[1], pluginname))
-                registry = plugin.PluginRegistry()
-                registry.load_plugins()
-                plugins = registry.get_plugins_by_capability('url_handler')
-                for urlplugin in plugins:
-                    if urlplugin.handler_name == pluginname:
-                        dbg("Identified matching plugin: %s" %
-                                urlplugin.handler_name)
-                        nameopen = _(urlplugin.nameopen)
-                        namecopy = _(urlplugin.namecopy)
-                        break
+                urlplugin = terminal.get_url_handler(url)
+                if urlplugin:
+                    dbg("Identified matching plugin: %s" %
+                            urlplugin.handler_name)
+                    nameopen = _(urlplugin.nameopen)
+                    namecopy = _(urlplugin.namecopy)
 
             if not nameopen:
                 nameopen = _('_Open link')
@@ -189,7 +179,7 @@ class TerminalPopupMenu(object):
         if not self.terminator.doing_prefs:
             if hasattr(Gtk, 'Builder'):  # VERIFY FOR GTK3: is this ever false?
                 item = Gtk.MenuItem.new_with_mnemonic(_('_Preferences'))
-                item.connect('activate', lambda x: PrefsEditor(self.terminal))
+                item.connect('activate', self.show_prefs)
                 menu.append(item)
 
         profilelist = sorted(self.config.list_profiles(), key=string.lower)
@@ -256,6 +246,11 @@ class TerminalPopupMenu(object):
         return(True)
 
 
+    def show_prefs(self, _widget):
+        """Open the preferences editor, only imported when first needed"""
+        from prefseditor import PrefsEditor
+        PrefsEditor(self.terminal)
+
     def add_encoding_items(self, menu):
         """Add the encoding list to the menu"""
         terminal = self.terminal
@@ -10,7 +10,7 @@ import gi
 gi.require_version('Gtk', '3.0')
 gi.require_version('Gdk', '3.0')
 gi.require_version('Vte', '2.91')
-from gi.repository import Gtk, Gdk, Vte, GdkX11
+from gi.repository import Gtk, Gdk, Vte, GdkX11, GObject
 from gi.repository.GLib import GError
 
 import borg
@@ -19,25 +19,15 @@ from config import Config
 from keybindings import Keybindings
 from util import dbg, err, enumerate_descendants
 from factory import Factory
+from broadcast import Broadcaster, eventkey2gdkevent
+from procwatch import ProcWatcher
+from activitymonitor import ActivityMonitor
+from layoutcompiler import compile_layout
 from cwd import get_pid_cwd
 from version import APP_NAME, APP_VERSION
 #import pout
 #pout.inject()
 
-def eventkey2gdkevent(eventkey):  # FIXME FOR GTK3: is there a simpler way of casting from specific EventKey to generic (union) GdkEvent?
-    gdkevent = Gdk.Event.new(eventkey.type)
-    gdkevent.key.window = eventkey.window
-    gdkevent.key.send_event = eventkey.send_event
-    gdkevent.key.time = eventkey.time
-    gdkevent.key.state = eventkey.state
-    gdkevent.key.keyval = eventkey.keyval
-    gdkevent.key.length = eventkey.length
-    gdkevent.key.string = eventkey.string
-    gdkevent.key.hardware_keycode = eventkey.hardware_keycode
-    gdkevent.key.group = eventkey.group
-    gdkevent.key.is_modifier = eventkey.is_modifier
-    return gdkevent
-
 class Terminator(Borg):
     """master object for the application"""
 
@@ -46,15 +36,24 @@ class Terminator(Borg):
     windowtitle = None
     terminals = None
     groups = None
+    group_members = None
+    terminal_seq = None
+    next_seq = None
     config = None
     keybindings = None
+    broadcaster = None
     style_providers = None
+    style_parts = None
+    css_providers = None
     last_focused_term = None
 
     origcwd = None
     dbus_path = None
     dbus_name = None
     pid_cwd = None
+    procwatcher = None
+    activitymonitor = None
+    metrics_timer = None
     gnome_client = None
     debug_address = None
     ibus_running = None
@@ -63,6 +62,8 @@ class Terminator(Borg):
     doing_quit = None
     doing_layout = None
     doing_prefs = False
+    plugins_deferred = None
+    prewarm_timer = None
     layoutname = None
     last_active_window = None
     prelayout_windows = None
@@ -71,6 +72,7 @@ class Terminator(Borg):
     groupsend_type = {'all':0, 'group':1, 'off':2}
 
     cur_gtk_theme_name = None
+    theme_bgcolor = None
     gtk_settings = None
 
     def __init__(self):
@@ -90,19 +92,37 @@ class Terminator(Borg):
             self.terminals = []
         if not self.groups:
             self.groups = []
+        if not self.group_members:
+            self.group_members = {}
+        if not self.terminal_seq:
+            self.terminal_seq = {}
+            self.next_seq = 0
         if not self.config:
             self.config = Config()
         if self.groupsend == None:
             self.groupsend = self.groupsend_type[self.config['broadcast_default']]
         if not self.keybindings:
             self.keybindings = Keybindings()
+            self.keybindings.watch_keymap()
             self.keybindings.configure(self.config['keybindings'])
+        if not self.broadcaster:
+            self.broadcaster = Broadcaster(self.get_group_members,
+                                           self.config['broadcast_coalesce'])
         if not self.style_providers:
             self.style_providers = []
+        if not self.css_providers:
+            self.css_providers = {}
         if not self.doing_layout:
             self.doing_layout = False
+        if self.plugins_deferred is None:
+            self.plugins_deferred = True
         if not self.pid_cwd:
             self.pid_cwd = get_pid_cwd()
+        if not self.procwatcher:
+            self.procwatcher = ProcWatcher(self.pid_cwd,
+                                           self.config['proc_poll_interval'])
+        if not self.activitymonitor:
+            self.activitymonitor = ActivityMonitor()
         if self.gnome_client is None:
             self.attempt_gnome_client()
         self.connect_signals()
@@ -146,6 +166,7 @@ class Terminator(Borg):
         dbg('session manager asked us to die')
         # FIXME: Test this
         self.config.save()
+        self.config.flush_save()
         self.config.set_nosave(True)
         for w in self.windows:
             w.close()
@@ -206,12 +227,21 @@ class Terminator(Borg):
             dbg('Terminator::register_terminal: registering %s:%s' %
                     (id(terminal), type(terminal)))
             self.terminals.append(terminal)
+            # Orders the members of a group like self.terminals
+            self.terminal_seq[terminal] = self.next_seq
+            self.next_seq += 1
+            self.broadcaster.invalidate()
 
     def deregister_terminal(self, terminal):
         """De-register a terminal widget"""
         dbg('Terminator::deregister_terminal: de-registering %s:%s' %
                 (id(terminal), type(terminal)))
         self.terminals.remove(terminal)
+        self.group_discard(terminal)
+        self.terminal_seq.pop(terminal, None)
+        self.procwatcher.unwatch(terminal)
+        self.activitymonitor.unwatch(terminal)
+        self.broadcaster.invalidate(terminal)
 
         if len(self.terminals) == 0:
             dbg('no terminals remain, destroying all windows')
@@ -263,13 +293,12 @@ class Terminator(Borg):
     def create_layout(self, layoutname):
         """Create all the parts necessary to satisfy the specified layout"""
         layout = None
-        objects = {}
 
         self.doing_layout = True
         self.last_active_window = None
         self.prelayout_windows = self.windows[:]
 
-        layout = copy.deepcopy(self.config.layout_get_config(layoutname))
+        layout = self.config.layout_get_config(layoutname)
         if not layout:
             # User specified a non-existent layout. default to one Terminal
             err('layout %s not defined' % layout)
@@ -277,53 +306,9 @@ class Terminator(Borg):
             return
 
         # Wind the flat objects into a hierarchy
-        hierarchy = {}
-        count = 0
-        # Loop over the layout until we have consumed it, or hit 1000 loops.
-        # This is a stupid artificial limit, but it's safe.
-        while len(layout) > 0 and count < 1000:
-            count = count + 1
-            if count == 1000:
-                err('hit maximum loop boundary. THIS IS VERY LIKELY A BUG')
-                #pout.v(layout)
-
-            for obj in layout.keys():
-                # all other top-level keys need to be deleted
-                if layout[obj]['type'] == 'Defstub':
-                    del(layout[obj])
-                elif layout[obj]['type'].lower() == 'window':
-                    hierarchy[obj] = {}
-                    hierarchy[obj]['type'] = 'Window'
-                    hierarchy[obj]['children'] = {}
-
-                    # Copy any additional keys
-                    for objkey in layout[obj].keys():
-                        if layout[obj][objkey] != '' and not hierarchy[obj].has_key(objkey):
-                            hierarchy[obj][objkey] = layout[obj][objkey]
-
-                    objects[obj] = hierarchy[obj]
-                    del(layout[obj])
-                else:
-                    # Now examine children to see if their parents exist yet
-                    if not layout[obj].has_key('parent'):
-                        err('Invalid object: %s' % obj)
-                        del(layout[obj])
-                        continue
-                    if objects.has_key(layout[obj]['parent']):
-                        # Our parent has been created, add ourselves
-                        childobj = {}
-                        childobj['type'] = layout[obj]['type']
-                        childobj['children'] = {}
-
-                        # Copy over any additional object keys
-                        for objkey in layout[obj].keys():
-                            if not childobj.has_key(objkey):
-                                childobj[objkey] = layout[obj][objkey]
-
-                        objects[layout[obj]['parent']]['children'][obj] = childobj
-                        objects[obj] = childobj
-                        del(layout[obj])
-        layout = hierarchy
+        layout, problems = compile_layout(layout)
+        for problem in problems:
+            err('layout %s: %s' % (layoutname, problem))
 
         for windef in layout:
             if layout[windef]['type'] != 'Window':
@@ -374,9 +359,23 @@ class Terminator(Borg):
                 source = window
             window_last_active_term_mapping[window] = copy.copy(source.last_active_term)
 
+        # Command line commands go to the first terminal to spawn, which
+        # has to stay the first one in the layout
+        options = self.config.options_get()
+        lazy = self.config['lazy_spawn'] and not (options and
+                                                  (options.command or
+                                                   options.execute))
         for terminal in self.terminals:
-            if not terminal.pid:
-                terminal.spawn_child()
+            if not (terminal.pid or terminal.spawn_pending or
+                    terminal.spawn_deferred):
+                if lazy and terminal.is_on_hidden_tab():
+                    terminal.defer_spawn()
+                else:
+                    terminal.spawn_child()
+        if lazy and self.config['prewarm_interval'] > 0 and \
+           not self.prewarm_timer:
+            self.prewarm_timer = GObject.timeout_add(
+                    self.config['prewarm_interval'], self.prewarm_next)
 
         for window in self.windows:
             if window.is_child_notebook():
@@ -446,27 +445,93 @@ class Terminator(Borg):
                 window.get_window().focus(t)
 
         self.prelayout_windows = None
+        if self.plugins_deferred:
+            GObject.idle_add(self.load_deferred_plugins)
         dbg('~on_layout_done: ENABLE SAVES')
         self.config.set_dirty(False)
         self.config.set_nosave(False)
 
+    def load_deferred_plugins(self):
+        """Load the plugins put off until the first window was shown. URL
+        handlers add their matches to the existing terminals themselves"""
+        from plugin import PluginRegistry
+        self.plugins_deferred = False
+        PluginRegistry().load_plugins()
+        return(False)
+
+    def prewarm_next(self):
+        """Spawn one deferred terminal, until none are left"""
+        for terminal in self.terminals:
+            if terminal.spawn_deferred:
+                dbg('pre-warming %s' % terminal.config_section)
+                terminal.ensure_spawned()
+                return(True)
+        self.prewarm_timer = None
+        return(False)
+
     def on_gtk_theme_name_notify(self, settings, prop):
         """Reconfigure if the gtk theme name changes"""
         new_gtk_theme_name = settings.get_property(prop.name)
         if new_gtk_theme_name != self.cur_gtk_theme_name:
             self.cur_gtk_theme_name = new_gtk_theme_name
+            self.theme_bgcolor = None
             self.reconfigure()
 
     def reconfigure(self):
         """Update configuration for the whole application"""
+        parts = self.get_style_parts()
+        if parts != self.style_parts:
+            self.apply_style_parts(parts)
 
-        if self.style_providers != []:
-            for style_provider in self.style_providers:
-                Gtk.StyleContext.remove_provider_for_screen(
-                    Gdk.Screen.get_default(),
-                    style_provider)
-        self.style_providers = []
+        # Cause the terminals whose settings changed to reconfigure
+        for terminal in self.terminals:
+            if terminal.configured != self.config_fingerprint(terminal.config):
+                terminal.reconfigure()
+            else:
+                # The titlebar options are not in the fingerprint
+                terminal.titlebar.update()
 
+        # Reparse our keybindings
+        self.keybindings.configure(self.config['keybindings'])
+        self.broadcaster.coalesce = self.config['broadcast_coalesce']
+        self.procwatcher.set_interval(self.config['proc_poll_interval'])
+        self.update_metrics_timer()
+
+        # Update tab position if appropriate
+        maker = Factory()
+        for window in self.windows:
+            child = window.get_child()
+            if maker.isinstance(child, 'Notebook'):
+                child.configure()
+        # FIXME TODO describe_layout where?
+
+    def update_metrics_timer(self):
+        """Refresh the metrics in the titlebars once a second, if they are
+        shown"""
+        wanted = self.config['output_metrics'] and \
+                 self.config['title_show_metrics']
+        if wanted and not self.metrics_timer:
+            self.metrics_timer = GObject.timeout_add(1000,
+                                                     self.on_metrics_timer)
+        elif not wanted and self.metrics_timer:
+            GObject.source_remove(self.metrics_timer)
+            self.metrics_timer = None
+
+    def on_metrics_timer(self):
+        """Timer callback, show the current metrics in the titlebars"""
+        for terminal in self.terminals:
+            if terminal.metrics:
+                terminal.titlebar.update()
+        return(True)
+
+    def config_fingerprint(self, config):
+        """Return what a terminal configured from config depends on, it has
+        to reconfigure when this changes"""
+        return((self.cur_gtk_theme_name, config.fingerprint()))
+
+    def get_style_parts(self):
+        """Return the CSS to apply, as a list of ('data', css) and
+        ('path', filename, mtime) parts in order of priority"""
         # Force the window background to be transparent for newer versions of
         # GTK3. We then have to fix all the widget backgrounds because the
         # widgets theming may not render it's own background.
@@ -501,23 +566,10 @@ class Terminator(Borg):
                 background-color: alpha(%s, %s); }
             """
         profiles = self.config.base.profiles
-        for profile in profiles.keys():
+        for profile in sorted(profiles.keys()):
             if profiles[profile]['use_theme_colors']:
-                # Create a dummy window/vte and realise it so it has correct
-                # values to read from
-                tmp_win = Gtk.Window()
-                tmp_vte = Vte.Terminal()
-                tmp_win.add(tmp_vte)
-                tmp_win.realize()
-                bgcolor = tmp_vte.get_style_context().get_background_color(Gtk.StateType.NORMAL)
-                bgcolor = "#{0:02x}{1:02x}{2:02x}".format(int(bgcolor.red  * 255),
-                                                          int(bgcolor.green * 255),
-                                                          int(bgcolor.blue * 255))
-                tmp_win.remove(tmp_vte)
-                del(tmp_vte)
-                del(tmp_win)
+                bgcolor = self.get_theme_bgcolor()
             else:
-                bgcolor = Gdk.RGBA()
                 bgcolor = profiles[profile]['background_color']
             if profiles[profile]['background_type'] == 'transparent':
                 bgalpha = profiles[profile]['background_darkness']
@@ -526,10 +578,7 @@ class Terminator(Borg):
 
             munged_profile = "".join([c if c.isalnum() else "-" for c in profile])
             css += template % (munged_profile, bgcolor, bgalpha)
-
-        style_provider = Gtk.CssProvider()
-        style_provider.load_from_data(css)
-        self.style_providers.append(style_provider)
+        parts = [('data', css)]
 
         # Attempt to load some theme specific stylistic tweaks for appearances
         usr_theme_dir = os.path.expanduser('~/.local/share/themes')
@@ -548,18 +597,9 @@ class Terminator(Borg):
                                                           'gtk-3.0/apps',
                                                           theme_part_file)
                 if os.path.isfile(path_to_theme_specific_css):
-                    style_provider = Gtk.CssProvider()
-                    style_provider.connect('parsing-error', self.on_css_parsing_error)
-                    try:
-                        style_provider.load_from_path(path_to_theme_specific_css)
-                    except GError:
-                        # Hmmm. Should we try to provide GTK version specific files here on failure?
-                        gtk_version_string = '.'.join([str(Gtk.get_major_version()),
-                                                       str(Gtk.get_minor_version()),
-                                                       str(Gtk.get_micro_version())])
-                        err('Error(s) loading css from %s into Gtk %s' % (path_to_theme_specific_css,
-                                                                          gtk_version_string))
-                    self.style_providers.append(style_provider)
+                    # Edited theme files are loaded again
+                    mtime = os.path.getmtime(path_to_theme_specific_css)
+                    parts.append(('path', path_to_theme_specific_css, mtime))
                     break
 
         # Size the GtkPaned splitter handle size.
@@ -570,32 +610,69 @@ class Terminator(Borg):
                 .terminator-terminal-window paned {
                     -GtkPaned-handle-size: %s; }
                 """ % self.config['handle_size']
+        parts.append(('data', css))
+        return(parts)
+
+    def get_css_provider(self, part):
+        """Return the style provider for part, parsing it only if it was
+        not used by the last style"""
+        if self.css_providers.has_key(part):
+            return(self.css_providers[part])
         style_provider = Gtk.CssProvider()
-        style_provider.load_from_data(css)
-        self.style_providers.append(style_provider)
+        if part[0] == 'data':
+            style_provider.load_from_data(part[1])
+        else:
+            path_to_theme_specific_css = part[1]
+            style_provider.connect('parsing-error', self.on_css_parsing_error)
+            try:
+                style_provider.load_from_path(path_to_theme_specific_css)
+            except GError:
+                # Hmmm. Should we try to provide GTK version specific files here on failure?
+                gtk_version_string = '.'.join([str(Gtk.get_major_version()),
+                                               str(Gtk.get_minor_version()),
+                                               str(Gtk.get_micro_version())])
+                err('Error(s) loading css from %s into Gtk %s' % (path_to_theme_specific_css,
+                                                                  gtk_version_string))
+        return(style_provider)
+
+    def apply_style_parts(self, parts):
+        """Replace the style providers on the screen with those of parts"""
+        dbg('Terminator::apply_style_parts: the style changed')
+        screen = Gdk.Screen.get_default()
+        for style_provider in self.style_providers:
+            Gtk.StyleContext.remove_provider_for_screen(screen,
+                                                        style_provider)
+        providers = {}
+        for part in parts:
+            providers[part] = self.get_css_provider(part)
+        self.css_providers = providers
+        self.style_providers = [providers[part] for part in parts]
+        self.style_parts = parts
 
         # Apply the providers, incrementing priority so they don't cancel out
         # each other
         for idx in xrange(0, len(self.style_providers)):
             Gtk.StyleContext.add_provider_for_screen(
-                Gdk.Screen.get_default(),
+                screen,
                 self.style_providers[idx],
                 Gtk.STYLE_PROVIDER_PRIORITY_APPLICATION+idx)
 
-        # Cause all the terminals to reconfigure
-        for terminal in self.terminals:
-            terminal.reconfigure()
-
-        # Reparse our keybindings
-        self.keybindings.configure(self.config['keybindings'])
-
-        # Update tab position if appropriate
-        maker = Factory()
-        for window in self.windows:
-            child = window.get_child()
-            if maker.isinstance(child, 'Notebook'):
-                child.configure()
-        # FIXME TODO describe_layout where?
+    def get_theme_bgcolor(self):
+        """Return the terminal background colour of the current theme. It
+        takes a realized dummy window/vte to read, so do it once per theme"""
+        if self.theme_bgcolor is None:
+            tmp_win = Gtk.Window()
+            tmp_vte = Vte.Terminal()
+            tmp_win.add(tmp_vte)
+            tmp_win.realize()
+            bgcolor = tmp_vte.get_style_context().get_background_color(Gtk.StateType.NORMAL)
+            self.theme_bgcolor = "#{0:02x}{1:02x}{2:02x}".format(int(bgcolor.red  * 255),
+                                                                 int(bgcolor.green * 255),
+                                                                 int(bgcolor.blue * 255))
+            tmp_win.remove(tmp_vte)
+            del(tmp_vte)
+            del(tmp_win)
+        return(self.theme_bgcolor)
 
     def on_css_parsing_error(self, provider, section, error, user_data=None):
         """Report CSS parsing issues"""
@@ -614,44 +691,55 @@ class Terminator(Borg):
 
     def closegroupedterms(self, group):
         """Close all terminals in a group"""
-        for terminal in self.terminals[:]:
-            if terminal.group == group:
-                terminal.close()
+        for terminal in list(self.get_group_members(group)):
+            terminal.close()
 
     def group_hoover(self):
         """Clean out unused groups"""
 
         if self.config['autoclean_groups']:
-            inuse = []
-            todestroy = []
-
-            for terminal in self.terminals:
-                if terminal.group:
-                    if not terminal.group in inuse:
-                        inuse.append(terminal.group)
-
-            for group in self.groups:
-                if not group in inuse:
-                    todestroy.append(group)
+            todestroy = [group for group in self.groups
+                         if not self.group_members.has_key(group)]
 
             dbg('Terminator::group_hoover: %d groups, hoovering %d' %
                     (len(self.groups), len(todestroy)))
             for group in todestroy:
                 self.groups.remove(group)
 
+    def set_terminal_group(self, terminal, name):
+        """Move a terminal into the named group, or out of any group when
+        name is None, keeping the group index in step"""
+        self.group_discard(terminal)
+        terminal.group = name
+        if name is not None:
+            self.group_members.setdefault(name, set()).add(terminal)
+        self.broadcaster.invalidate()
+
+    def group_discard(self, terminal):
+        """Drop a terminal from the group index. Empty groups are removed"""
+        members = self.group_members.get(terminal.group)
+        if members is not None:
+            members.discard(terminal)
+            if not members:
+                del(self.group_members[terminal.group])
+
+    def get_group_members(self, group):
+        """Return the terminals in a group, or all terminals for None, in
+        the order of self.terminals"""
+        if group is None:
+            return(self.terminals)
+        return(sorted(self.group_members.get(group, ()),
+                      key=self.terminal_seq.get))
+
     def group_emit(self, terminal, group, type, event):
         """Emit to each terminal in a group"""
         dbg('Terminator::group_emit: emitting a keystroke for group %s' %
                 group)
-        for term in self.terminals:
-            if term != terminal and term.group == group:
-                term.vte.emit(type, eventkey2gdkevent(event))
+        self.broadcaster.emit_key(terminal, group, event)
 
     def all_emit(self, terminal, type, event):
         """Emit to all terminals"""
-        for term in self.terminals:
-            if term != terminal:
-                term.vte.emit(type, eventkey2gdkevent(event))
+        self.broadcaster.emit_key(terminal, None, event)
 
     def do_enumerate(self, widget, pad):
         """Insert the number of each terminal in a group, into that terminal"""
@@ -667,14 +755,13 @@ class Terminator(Borg):
 
         for term in self.get_target_terms(widget):
             idx = terminals.index(term)
-            term.feed(numstr % (idx + 1))
+            self.broadcaster.feed([term], numstr % (idx + 1))
 
     def get_sibling_terms(self, widget):
-        termset = []
-        for term in self.terminals:
-            if term.group == widget.group:
-                termset.append(term)
-        return(termset)
+        """Get the terminals sharing a group with widget"""
+        if widget.group is None:
+            return([term for term in self.terminals if term.group is None])
+        return(self.get_group_members(widget.group))
 
     def get_target_terms(self, widget):
         """Get the terminals we should currently be broadcasting to"""
@@ -16,6 +16,38 @@ from terminator import Terminator
 from editablelabel import EditableLabel
 from translation import _
 
+class TitlebarStyle(object):
+    """The font and colours of all titlebars, parsed once per config
+    generation instead of by every titlebar on every update"""
+
+    generation = None
+    font = None
+    colors = None
+
+    def __init__(self, config):
+        """Class initialiser"""
+        self.generation = config.base.generation
+        if (not config['title_use_system_font']) and config['title_font']:
+            self.font = Pango.FontDescription(config['title_font'])
+        else:
+            self.font = Pango.FontDescription(config.get_system_prop_font())
+        self.colors = {}
+
+    def color(self, spec):
+        """Return the parsed colour spec"""
+        if not self.colors.has_key(spec):
+            self.colors[spec] = Gdk.color_parse(spec)
+        return(self.colors[spec])
+
+_STYLE = None
+
+def get_style(config):
+    """Return the TitlebarStyle of the current config"""
+    global _STYLE
+    if _STYLE is None or _STYLE.generation != config.base.generation:
+        _STYLE = TitlebarStyle(config)
+    return(_STYLE)
+
 # pylint: disable-msg=R0904
 # pylint: disable-msg=W0613
 class Titlebar(Gtk.EventBox):
@@ -34,6 +66,7 @@ class Titlebar(Gtk.EventBox):
     bellicon = None
     _autotext = ''
     _tsize = ''
+    _metricstext = ''
     _tabcapt = ''
     sizetext = ''
     titlefixed = False # True # False
@@ -45,6 +78,7 @@ class Titlebar(Gtk.EventBox):
     custom_env = ''
     _custenv = ''
     hidesize = None
+    rendered = None
 
     __gsignals__ = {
             'clicked': (GObject.SignalFlags.RUN_LAST, None, ()),
@@ -60,6 +94,7 @@ class Titlebar(Gtk.EventBox):
         self.terminator = Terminator()
         self.terminal = terminal
         self.config = self.terminal.config
+        self.rendered = {}
 
         self.label = EditableLabel()
         self.label.connect('edit-done', self.on_edit_done)
@@ -110,6 +145,8 @@ class Titlebar(Gtk.EventBox):
         self.show()
 
         self.connect('button-press-event', self.on_clicked)
+        self.terminal.connect('cwd-changed', self.on_cwd_changed)
+        self.terminal.connect('foreground-changed', self.on_foreground_changed)
 
     def connect_icon(self, func):
         """Connect the supplied function to clicking on the group icon"""
@@ -138,6 +175,9 @@ class Titlebar(Gtk.EventBox):
 
     def set_from_icon_name(self, name, size = Gtk.IconSize.MENU):
         """Set an icon for the group label"""
+        if self.rendered.get('icon') == (name, size):
+            return
+        self.rendered['icon'] = (name, size)
         if not name:
             self.groupicon.hide()
             return
@@ -145,6 +185,14 @@ class Titlebar(Gtk.EventBox):
         self.groupicon.set_from_icon_name(APP_NAME + name, size)
         self.groupicon.show()
 
+    def restyle(self, field, value):
+        """Record value as rendered for field. Returns False if it already
+        was, and the widgets need not be touched"""
+        if self.rendered.has_key(field) and self.rendered[field] is value:
+            return(False)
+        self.rendered[field] = value
+        return(True)
+
     def update_terminal_size(self, width, height):
         """Update the displayed terminal size"""
         self.sizetext = " %sx%s" % (width, height)
@@ -158,6 +206,18 @@ class Titlebar(Gtk.EventBox):
         # Return False so we don't interrupt any chains of signal handling
         return False
 
+    def on_cwd_changed(self, _terminal, _cwd):
+        """The path we may show has changed"""
+        if self.config['title_hide_userhost'] and \
+           not self.config['title_hide_path']:
+            self.update()
+        return False
+
+    def on_foreground_changed(self, _terminal, command):
+        """Name what is running in the terminal in our tooltip"""
+        self.set_tooltip_text(command or None)
+        return False
+
     def get_custom_title(self):
         """Return custom title if it is set, otherwise return empty """
         return self.custom_title
@@ -233,21 +293,23 @@ class Titlebar(Gtk.EventBox):
             self._tsize = ''
         else:
             self._tsize = self.sizetext
+        if self.config['title_show_metrics'] and self.terminal.metrics:
+            self._metricstext = " %s" % self.terminal.metrics.describe()
+        else:
+            self._metricstext = ''
 
     def update(self, other=None):
-        """Update our contents"""
-        default_bg = False
-
+        """Update our contents. Focus changes update every titlebar, so
+        only the properties that differ from what was last rendered are
+        set on the widgets"""
         self.make_labeltext()
         #self.label.set_text("%s%s%s%s%s" % (self._tabcapt, self._ctitle, self._custenv, self._autotext, self._tsize), force=True)
-        self.label.set_text("%s%s%s%s%s" % (self._custenv, self._tabcapt, self._ctitle, self._autotext, self._tsize), force=True)
+        self.label.set_text("%s%s%s%s%s%s" % (self._custenv, self._tabcapt, self._ctitle, self._autotext, self._tsize, self._metricstext), force=True)
 
-        if (not self.config['title_use_system_font']) and self.config['title_font']:
-            title_font = Pango.FontDescription(self.config['title_font'])
-        else:
-            title_font = Pango.FontDescription(self.config.get_system_prop_font())
-        self.label.modify_font(title_font)
-        self.grouplabel.modify_font(title_font)
+        style = get_style(self.config)
+        if self.restyle('font', style.font):
+            self.label.modify_font(style.font)
+            self.grouplabel.modify_font(style.font)
 
         if other:
             term = self.terminal
@@ -256,7 +318,6 @@ class Titlebar(Gtk.EventBox):
                 title_fg = self.config['title_inactive_fg_color']
                 title_bg = self.config['title_inactive_bg_color']
                 icon = '_receive_off'
-                default_bg = True
                 group_fg = self.config['title_inactive_fg_color']
                 group_bg = self.config['title_inactive_bg_color']
             elif term != other and term.group and term.group == other.group:
@@ -264,7 +325,6 @@ class Titlebar(Gtk.EventBox):
                     title_fg = self.config['title_inactive_fg_color']
                     title_bg = self.config['title_inactive_bg_color']
                     icon = '_receive_off'
-                    default_bg = True
                 else:
                     title_fg = self.config['title_receive_fg_color']
                     title_bg = self.config['title_receive_bg_color']
@@ -280,7 +340,6 @@ class Titlebar(Gtk.EventBox):
                     title_fg = self.config['title_inactive_fg_color']
                     title_bg = self.config['title_inactive_bg_color']
                     icon = '_receive_off'
-                    default_bg = True
                 group_fg = self.config['title_inactive_fg_color']
                 group_bg = self.config['title_inactive_bg_color']
             else:
@@ -296,20 +355,19 @@ class Titlebar(Gtk.EventBox):
                 group_fg = self.config['title_transmit_fg_color']
                 group_bg = self.config['title_transmit_bg_color']
 
-            self.label.modify_fg(Gtk.StateType.NORMAL,
-                    Gdk.color_parse(title_fg))
-            self.grouplabel.modify_fg(Gtk.StateType.NORMAL,
-                    Gdk.color_parse(group_fg))
-            self.modify_bg(Gtk.StateType.NORMAL,
-                    Gdk.color_parse(title_bg))
-            if not self.get_desired_visibility():
-                if default_bg == True:
-                    color = term.get_style_context().get_background_color(Gtk.StateType.NORMAL)  # VERIFY FOR GTK3
-                else:
-                    color = Gdk.color_parse(title_bg)
+            title_fg = style.color(title_fg)
+            if self.restyle('title_fg', title_fg):
+                self.label.modify_fg(Gtk.StateType.NORMAL, title_fg)
+            group_fg = style.color(group_fg)
+            if self.restyle('group_fg', group_fg):
+                self.grouplabel.modify_fg(Gtk.StateType.NORMAL, group_fg)
+            title_bg = style.color(title_bg)
+            if self.restyle('title_bg', title_bg):
+                self.modify_bg(Gtk.StateType.NORMAL, title_bg)
             self.update_visibility()
-            self.ebox.modify_bg(Gtk.StateType.NORMAL,
-                    Gdk.color_parse(group_bg))
+            group_bg = style.color(group_bg)
+            if self.restyle('group_bg', group_bg):
+                self.ebox.modify_bg(Gtk.StateType.NORMAL, group_bg)
             self.set_from_icon_name(icon, Gtk.IconSize.MENU)
 
     def set_group_label(self, name):
@@ -18,7 +18,6 @@
 """Terminator by Chris Jones <cmsj@tenshu.net>"""
 
 from version import APP_NAME
-from util import dbg
 
 _ = None
 
@@ -28,6 +27,8 @@ try:
     gettext.textdomain(APP_NAME)
     _ = gettext.gettext
 except:
+    # util pulls in Gtk, only pay for it when gettext is missing
+    from util import dbg
     dbg("Using fallback _()")
 
     def dummytrans (text):
@@ -0,0 +1,80 @@
+#!/usr/bin/env python2
+# Terminator by Chris Jones <cmsj@tenshu.net>
+# GPL v2 only
+"""urlmatch.py - the URL matches shared by all terminals
+
+Every terminal registers the same URL regexes with its VTE, plus those of
+the url_handler plugins. They used to be compiled again for each new
+terminal. Here each pattern is compiled once per process and the same
+GLib.Regex is handed to every VTE. The patterns of the plugins can also be
+merged into one alternation, so VTE tries one regex instead of one per
+plugin when the pointer moves.
+
+>>> [name for name, pattern in BUILTIN_MATCHES]
+['full_uri', 'voip', 'addr_only', 'email', 'nntp']
+>>> merge_patterns(['a+', 'b|c'])
+'(?:a+)|(?:b|c)'
+
+"""
+
+from gi.repository import GLib
+
+REGEX_FLAGS = (GLib.RegexCompileFlags.OPTIMIZE | \
+               GLib.RegexCompileFlags.MULTILINE)
+
+# Name used in Terminal.matches for the merged plugin matches
+MERGED_NAME = '_plugins'
+
+def builtin_matches():
+    """Return the (name, pattern) of the URL matches every terminal has"""
+    userchars = "-A-Za-z0-9"
+    passchars = "-A-Za-z0-9,?;.:/!%$^*&~\"#'"
+    hostchars = "-A-Za-z0-9:\[\]"
+    pathchars = "-A-Za-z0-9_$.+!*(),;:@&=?/~#%'"
+    schemes   = "(news:|telnet:|nntp:|file:/|https?:|ftps?:|webcal:)"
+    user      = "[" + userchars + "]+(:[" + passchars + "]+)?"
+    urlpath   = "/[" + pathchars + "]*[^]'.}>) \t\r\n,\\\"]"
+
+    lboundry = "\\b"
+    rboundry = "\\b"
+
+    matches = []
+    matches.append(('full_uri', lboundry + schemes +
+            "//(" + user + "@)?[" + hostchars  +".]+(:[0-9]+)?(" +
+            urlpath + ")?" + rboundry + "/?"))
+    matches.append(('voip', lboundry +
+            '(callto:|h323:|sip:)' + "[" + userchars + "+][" +
+            userchars + ".]*(:[0-9]+)?@?[" + pathchars + "]+" +
+            rboundry))
+    matches.append(('addr_only', lboundry +
+            "(www|ftp)[" + hostchars + "]*\.[" + hostchars +
+            ".]+(:[0-9]+)?(" + urlpath + ")?" + rboundry + "/?"))
+    matches.append(('email', lboundry +
+            "(mailto:)?[a-zA-Z0-9][a-zA-Z0-9.+-]*@[a-zA-Z0-9]" +
+            "[a-zA-Z0-9-]*\.[a-zA-Z0-9][a-zA-Z0-9-]+" +
+            "[.a-zA-Z0-9-]*" + rboundry))
+    matches.append(('nntp', lboundry +
+            """news:[-A-Z\^_a-z{|}~!"#$%&'()*+,./0-9;:=?`]+@""" +
+            "[-A-Za-z0-9.]+(:[0-9]+)?" + rboundry))
+    return(matches)
+
+BUILTIN_MATCHES = builtin_matches()
+
+_REGEXES = {}
+
+def get_regex(pattern):
+    """Return pattern compiled, compiling it only the first time"""
+    if not _REGEXES.has_key(pattern):
+        _REGEXES[pattern] = GLib.Regex.new(pattern, REGEX_FLAGS, 0)
+    return(_REGEXES[pattern])
+
+def merge_patterns(patterns):
+    """Join patterns into one alternation"""
+    return('|'.join(['(?:%s)' % pattern for pattern in patterns]))
+
+def matches_text(pattern, text):
+    """Check if pattern matches text, to tell which of merged patterns
+    matched"""
+    return(get_regex(pattern).match(text, 0)[0])
+
+# vim: set expandtab ts=4 sw=4:
@@ -19,8 +19,8 @@
 import sys
 import cairo
 import os
+import stat
 import pwd
-import inspect
 import uuid
 import subprocess
 import re
@@ -43,6 +43,10 @@ DEBUGFILES = False
 DEBUGCLASSES = []
 # list of methods to show debugging for. empty list means show all methods
 DEBUGMETHODS = []
+# a collections.deque keeping the latest messages instead of printing them
+DEBUGRING = None
+# (code, classname) => message prefix, or None if filtered out
+_DEBUGPREFIXES = {}
 
 ourhost = None # set once
 def uhoextract(instr='', user=True, host=True, smart=None):
@@ -73,36 +77,77 @@ def uhoextract(instr='', user=True, host=True, smart=None):
     elif host:
         return h
 
-def dbg(log = ""):
-    """Print a message if debugging is enabled"""
+def set_debug(files=False, classes=None, methods=None, ring=0):
+    """Configure the debugging output and turn it on. The class and method
+    filters are resolved once per method that logs, not on every message,
+    so change them only through here. With ring, the last ring messages
+    are kept in memory for dump_debug() instead of being printed"""
+    global DEBUG, DEBUGFILES, DEBUGCLASSES, DEBUGMETHODS, DEBUGRING
+    DEBUG = True
+    DEBUGFILES = files
+    DEBUGCLASSES = classes or []
+    DEBUGMETHODS = methods or []
+    if ring:
+        import collections
+        DEBUGRING = collections.deque(maxlen=ring)
+    else:
+        DEBUGRING = None
+    _DEBUGPREFIXES.clear()
+
+def dbg_prefix(method, classname):
+    """Return the prefix of messages from method of classname, or None if
+    the filters leave them out"""
+    if DEBUGCLASSES != [] and classname not in DEBUGCLASSES:
+        return(None)
+    if DEBUGMETHODS != [] and method not in DEBUGMETHODS:
+        return(None)
+    return("%s::%s: " % (classname, method))
+
+def dbg(log = "", *args):
+    """Print a message if debugging is enabled. args are interpolated into
+    log only if the message is shown, so pass them instead of formatting
+    log in hot paths"""
     if DEBUG:
         ## local print-debug: add tilde as the first character
-        if DEBUGTILDE and not log[0] == '~':
+        if DEBUGTILDE and not log[:1] == '~':
             return
-        stackitem = inspect.stack()[1]
-        parent_frame = stackitem[0]
-        method = parent_frame.f_code.co_name
-        names, varargs, keywords, local_vars = inspect.getargvalues(parent_frame)
-        try:
-            self_name = names[0]
-            classname = local_vars[self_name].__class__.__name__
-        except IndexError:
+        parent_frame = sys._getframe(1)
+        code = parent_frame.f_code
+        if code.co_argcount:
+            classname = parent_frame.f_locals.get(
+                    code.co_varnames[0]).__class__.__name__
+        else:
             classname = "noclass"
+        try:
+            prefix = _DEBUGPREFIXES[(code, classname)]
+        except KeyError:
+            prefix = dbg_prefix(code.co_name, classname)
+            _DEBUGPREFIXES[(code, classname)] = prefix
+        if prefix is None:
+            return
+        if args:
+            log = log % args
         if DEBUGFILES:
-            line = stackitem[2]
-            filename = parent_frame.f_code.co_filename
-            extra = " (%s:%s)" % (filename, line)
+            extra = " (%s:%s)" % (code.co_filename, parent_frame.f_lineno)
         else:
             extra = ""
-        if DEBUGCLASSES != [] and classname not in DEBUGCLASSES:
-            return
-        if DEBUGMETHODS != [] and method not in DEBUGMETHODS:
+        message = "%s%s%s" % (prefix, log, extra)
+        if DEBUGRING is not None:
+            DEBUGRING.append(message)
             return
         try:
-            print >> sys.stderr, "%s::%s: %s%s" % (classname, method, log, extra)
+            print >> sys.stderr, message
         except IOError:
             pass
 
+def dump_debug(out=None):
+    """Write the debugging messages kept by the ring to out, stdout by
+    default. Meant for the debug server console"""
+    if out is None:
+        out = sys.stdout
+    for message in list(DEBUGRING or ()):
+        print >> out, message
+
 def err(log = ""):
     """Print an error message"""
     try:
@@ -246,6 +291,51 @@ def get_config_dir():
         terminator_config_dir = os.path.join(configdir, 'terminator')
     return terminator_config_dir
 
+def write_atomic(path, data):
+    """Replace the file at path with data. It is written to a temporary
+    file first and renamed over path, so readers and crashes only ever see
+    the old or the new contents. If path is a symlink the file it points
+    to is replaced, and the mode of the file is kept. Raises IOError/OSError
+    on failure
+
+    >>> import tempfile, shutil
+    >>> tmpdir = tempfile.mkdtemp()
+    >>> target = os.path.join(tmpdir, 'target')
+    >>> link = os.path.join(tmpdir, 'link')
+    >>> open(target, 'w').write('old')
+    >>> os.chmod(target, 0600)
+    >>> os.symlink(target, link)
+    >>> write_atomic(link, 'new')
+    >>> os.path.islink(link), open(target).read()
+    (True, 'new')
+    >>> oct(stat.S_IMODE(os.stat(target).st_mode))
+    '0600'
+    >>> shutil.rmtree(tmpdir)
+    """
+    path = os.path.realpath(path)
+    tmppath = '%s.%d' % (path, os.getpid())
+    try:
+        mode = os.stat(path).st_mode
+    except OSError:
+        mode = None
+    try:
+        tmpfile = open(tmppath, 'wb')
+        try:
+            tmpfile.write(data)
+            tmpfile.flush()
+            os.fsync(tmpfile.fileno())
+        finally:
+            tmpfile.close()
+        if mode is not None:
+            os.chmod(tmppath, stat.S_IMODE(mode))
+        os.rename(tmppath, path)
+    except (IOError, OSError):
+        try:
+            os.unlink(tmppath)
+        except OSError:
+            pass
+        raise
+
 def dict_diff(reference, working):
     """Examine the values in the supplied working set and return a new dict
     that only contains those values which are different from those in the
@@ -357,8 +447,8 @@ def enumerate_descendants(parent):
                     terminals.append(descendant)
             containers.append(child)
 
-    dbg('%d containers and %d terminals fall beneath %s' % (len(containers),
-        len(terminals), parent))
+    dbg('%d containers and %d terminals fall beneath %s', len(containers),
+        len(terminals), parent)
     return(containers, terminals)
 
 def make_uuid(str_uuid=None):
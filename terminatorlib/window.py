@@ -3,7 +3,6 @@
 # GPL v2 only
 """window.py - class for the main Terminator window"""
 
-import copy
 import time
 import uuid
 import gi
@@ -17,6 +16,8 @@ from version import APP_NAME
 from container import Container
 from factory import Factory
 from terminator import Terminator
+from keybindings import CHORD_PENDING
+from navindex import NavIndex
 
 # no need for that
 #if display_manager() == 'X11':
@@ -31,6 +32,9 @@ from terminator import Terminator
 class Window(Container, Gtk.Window):
     """Class implementing a top-level Terminator window"""
 
+    node_kinds = frozenset(['Container', 'Window'])
+    node_type = 'Window'
+    navindex = None
     terminator = None
     title = None
     isfullscreen = None
@@ -230,6 +234,8 @@ class Window(Container, Gtk.Window):
                         Gdk.Event.new(Gdk.EventType.DELETE)):
                     self.on_destroy_event(window,
                             Gdk.Event.new(Gdk.EventType.DESTROY))
+            elif mapping == CHORD_PENDING:
+                pass
             else:
                 return(False)
             return(True)
@@ -815,76 +821,38 @@ class Window(Container, Gtk.Window):
 
     def navigate_terminal(self, terminal, direction):
         """Navigate around terminals"""
-        _containers, terminals = util.enumerate_descendants(self)
-        visibles = self.get_visible_terminals()
-        current = terminals.index(terminal)
-        length = len(terminals)
-        next = None
-
-        if length <= 1 or len(visibles) <= 1:
-            return
-
-        if direction in ['next', 'prev']:
-            tmpterms = copy.copy(terminals)
-            tmpterms = tmpterms[current+1:]
-            tmpterms.extend(terminals[0:current])
-
-            if direction == 'next':
-                tmpterms.reverse()
-
-            next = 0
-            while len(tmpterms) > 0:
-                tmpitem = tmpterms.pop()
-                if tmpitem in visibles:
-                    next = terminals.index(tmpitem)
-                    break
-        elif direction in ['left', 'right', 'up', 'down']:
-            layout = self.get_visible_terminals()
-            allocation = terminal.get_allocation()
-            possibles = []
-
-            # Get the co-ordinate of the appropriate edge for this direction
-            edge, p1, p2 = util.get_edge(allocation, direction)
-            # Find all visible terminals which are, in their entirity, in the
-            # direction we want to move, and are at least partially spanning
-            # p1 to p2
-            for term in layout:
-                rect = layout[term]
-                if util.get_nav_possible(edge, rect, direction, p1, p2):
-                    possibles.append(term)
-
-            if len(possibles) == 0:
-                return
-
-            # Find out how far away each of the possible terminals is, then
-            # find the smallest distance. The winning terminals are all of
-            # those who are that distance away.
-            offsets = {}
-            for term in possibles:
-                rect = layout[term]
-                offsets[term] = util.get_nav_offset(edge, rect, direction)
-            keys = offsets.values()
-            keys.sort()
-            winners = [k for k, v in offsets.iteritems() if v == keys[0]]
-            next = terminals.index(winners[0])
-
-            if len(winners) > 1:
-                # Break an n-way tie using the cursor position
-                term_alloc = terminal.get_allocation()
-                cursor_x = term_alloc.x + term_alloc.width / 2
-                cursor_y = term_alloc.y + term_alloc.height / 2
-
-                for term in winners:
-                    rect = layout[term]
-                    if util.get_nav_tiebreak(direction, cursor_x, cursor_y,
-                            rect):
-                        next = terminals.index(term)
-                        break;
-        else:
+        if direction not in ['next', 'prev', 'left', 'right', 'up', 'down']:
             err('Unknown navigation direction: %s' % direction)
+            return
+        navindex = self.get_navindex()
+        if terminal not in navindex.position:
+            # A terminal we have not seen yet, the index is out of date
+            self.invalidate_navindex()
+            navindex = self.get_navindex()
+        if len(navindex.order) <= 1 or len(navindex) <= 1 or \
+           terminal not in navindex.position:
+            return
+        if direction not in ['next', 'prev'] and terminal not in navindex:
+            return
 
+        next = navindex.find(terminal, direction)
         if next is not None:
-            terminals[next].grab_focus()
+            next.grab_focus()
+
+    def get_navindex(self):
+        """Return the NavIndex of our terminals, building it if the layout
+        or the allocations changed since it was last used"""
+        if self.navindex is None:
+            _containers, terminals = util.enumerate_descendants(self)
+            rects = {}
+            for term, rect in self.get_visible_terminals().iteritems():
+                rects[term] = (rect.x, rect.y, rect.width, rect.height)
+            self.navindex = NavIndex(terminals, rects)
+        return(self.navindex)
+
+    def invalidate_navindex(self):
+        """Terminals were moved, resized, shown or hidden"""
+        self.navindex = None
 
     def create_layout(self, layout):
         """Apply any config items from our layout"""
@@ -902,7 +870,6 @@ class Window(Container, Gtk.Window):
 
         child_key = children.keys()[0] # Window has only one child
         child = children[child_key]
-        child['_config_section'] = child_key
 
         terminal = self.get_children()[0]
         dbg('Making a child of type: %s' % child['type'])
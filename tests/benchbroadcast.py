@@ -0,0 +1,103 @@
+#!/usr/bin/env python2
+# Terminator by Chris Jones <cmsj@tenshu.net>
+# GPL v2 only
+"""benchbroadcast.py - measure broadcast keystroke-to-echo latency
+
+Runs a `cat` child in each of N receiving VTE widgets, broadcasts
+synthetic keystrokes through the Broadcaster and measures the time until
+every receiver has echoed the key back (its 'contents-changed' fired).
+Needs a display.
+
+    python2 tests/benchbroadcast.py [receivers ...]
+"""
+
+import os
+import sys, os.path
+import time
+sys.path.insert(0, os.path.realpath(os.path.join(os.path.dirname(__file__), "..")))
+
+import gi
+gi.require_version('Gtk', '3.0')
+gi.require_version('Vte', '2.91')
+from gi.repository import Gtk, Gdk, GLib, Vte
+
+from terminatorlib.broadcast import Broadcaster
+
+KEYSTROKES = 50
+
+class BenchTerminal(object):
+    """Just enough of a Terminal for the Broadcaster"""
+    def __init__(self, box):
+        self.group = 'bench'
+        self.vte = Vte.Terminal()
+        self.vte.set_size(80, 4)
+        box.pack_start(self.vte, False, False, 0)
+        self.vte.spawn_sync(Vte.PtyFlags.DEFAULT, os.getcwd(), ['/bin/cat'],
+                            None, GLib.SpawnFlags.DEFAULT, None, None, None)
+
+    def feed(self, text):
+        self.vte.feed_child(text, len(text))
+
+def make_event(window):
+    """A key press for the letter x"""
+    event = Gdk.Event.new(Gdk.EventType.KEY_PRESS)
+    event.key.window = window
+    event.key.keyval = Gdk.KEY_x
+    event.key.string = 'x'
+    event.key.length = 1
+    event.key.time = Gdk.CURRENT_TIME
+    keymap = Gdk.Keymap.get_default()
+    found, keys = keymap.get_entries_for_keyval(Gdk.KEY_x)
+    if found:
+        event.key.hardware_keycode = keys[0].keycode
+    return(event.key)
+
+def wait_echo(terms):
+    """Iterate the main loop until every terminal changed its contents"""
+    waiting = set(terms)
+    handlers = []
+    for term in terms:
+        def changed(vte, term=term):
+            waiting.discard(term)
+        handlers.append((term.vte, term.vte.connect('contents-changed',
+                                                    changed)))
+    deadline = time.time() + 5
+    while waiting and time.time() < deadline:
+        Gtk.main_iteration_do(False)
+    for vte, handler in handlers:
+        vte.disconnect(handler)
+    return(not waiting)
+
+def bench(receivers, coalesce):
+    """Return the mean keystroke-to-echo latency in milliseconds"""
+    window = Gtk.Window()
+    box = Gtk.VBox()
+    window.add(box)
+    source = BenchTerminal(box)
+    terms = [BenchTerminal(box) for _ in xrange(receivers)]
+    window.show_all()
+    while Gtk.events_pending():
+        Gtk.main_iteration()
+
+    broadcaster = Broadcaster(lambda: [source] + terms, coalesce)
+    event = make_event(window.get_window())
+    total = 0.0
+    for _ in xrange(KEYSTROKES):
+        start = time.time()
+        broadcaster.emit_key(source, 'bench', event)
+        if not wait_echo(terms):
+            print 'timeout waiting for echo'
+            break
+        total += time.time() - start
+    window.destroy()
+    return(total * 1000 / KEYSTROKES)
+
+def main(argv):
+    counts = [int(arg) for arg in argv[1:]] or [1, 8, 16, 32, 64]
+    print '%10s %12s %12s' % ('receivers', 'emit ms', 'coalesce ms')
+    for count in counts:
+        print '%10d %12.2f %12.2f' % (count, bench(count, False),
+                                      bench(count, True))
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,101 @@
+#!/usr/bin/env python2
+# Terminator by Chris Jones <cmsj@tenshu.net>
+# GPL v2 only
+"""benchlayout.py - measure winding a flat layout into a tree
+
+Generates layouts of N terminals, each window holding a staircase of
+panes as left by splitting the newest terminal over and over, and times
+the layout compiler against the repeated passes Terminator.create_layout
+used before it. No display needed.
+
+    python2 tests/benchlayout.py [terminals ...]
+"""
+
+import sys, os.path
+import copy
+import time
+sys.path.insert(0, os.path.realpath(os.path.join(os.path.dirname(__file__), "..")))
+
+from terminatorlib.layoutcompiler import compile_layout
+
+ROUNDS = 5
+TERMINALS_PER_WINDOW = 256
+
+def make_layout(terminals):
+    """A flat layout of terminals spread over windows of split panes"""
+    layout = {}
+    names = ['child%d' % num for num in xrange(2 * terminals)]
+    def split(parent, count):
+        name = names.pop()
+        if count == 1:
+            layout[name] = {'type': 'Terminal', 'parent': parent,
+                            'profile': 'default', 'command': ''}
+            return
+        layout[name] = {'type': 'VPaned', 'parent': parent, 'ratio': '0.5'}
+        split(name, 1)
+        split(name, count - 1)
+    windows = 0
+    while terminals > 0:
+        window = 'window%d' % windows
+        layout[window] = {'type': 'Window', 'parent': '', 'size': [800, 600]}
+        split(window, min(terminals, TERMINALS_PER_WINDOW))
+        terminals -= TERMINALS_PER_WINDOW
+        windows += 1
+    return(layout)
+
+def passes(layout):
+    """The loop Terminator.create_layout used to run"""
+    layout = copy.deepcopy(layout)
+    objects = {}
+    hierarchy = {}
+    count = 0
+    while len(layout) > 0 and count < 1000:
+        count = count + 1
+        for obj in layout.keys():
+            if layout[obj]['type'] == 'Defstub':
+                del(layout[obj])
+            elif layout[obj]['type'].lower() == 'window':
+                hierarchy[obj] = {}
+                hierarchy[obj]['type'] = 'Window'
+                hierarchy[obj]['children'] = {}
+                for objkey in layout[obj].keys():
+                    if layout[obj][objkey] != '' and not hierarchy[obj].has_key(objkey):
+                        hierarchy[obj][objkey] = layout[obj][objkey]
+                objects[obj] = hierarchy[obj]
+                del(layout[obj])
+            else:
+                if objects.has_key(layout[obj]['parent']):
+                    childobj = {}
+                    childobj['type'] = layout[obj]['type']
+                    childobj['children'] = {}
+                    for objkey in layout[obj].keys():
+                        if not childobj.has_key(objkey):
+                            childobj[objkey] = layout[obj][objkey]
+                    objects[layout[obj]['parent']]['children'][obj] = childobj
+                    objects[obj] = childobj
+                    del(layout[obj])
+    return(hierarchy)
+
+def bench(func, layout):
+    """Best of ROUNDS, in milliseconds"""
+    best = None
+    for _ in xrange(ROUNDS):
+        start = time.time()
+        func(layout)
+        elapsed = (time.time() - start) * 1000
+        if best is None or elapsed < best:
+            best = elapsed
+    return(best)
+
+def main(argv):
+    counts = [int(arg) for arg in argv[1:]] or [8, 64, 512, 2048]
+    print '%10s %10s %12s %12s' % ('terminals', 'objects', 'passes ms',
+                                   'compile ms')
+    for count in counts:
+        layout = make_layout(count)
+        print '%10d %10d %12.2f %12.2f' % (count, len(layout),
+                                           bench(passes, layout),
+                                           bench(compile_layout, layout))
+
+if __name__ == '__main__':
+    main(sys.argv)
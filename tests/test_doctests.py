@@ -11,11 +11,24 @@ from doctest import DocTestSuite, ELLIPSIS
 def test_suite():
     suite = TestSuite()
     for name in (
+        'activitymonitor',
         'config',
+        'configcache',
         'plugin',
+        'pluginmanifest',
+        'procwatch',
+        'profilesettings',
         'cwd',
         'factory',
+        'forward',
+        'layoutcompiler',
+        'navindex',
+        'outputmetrics',
+        'urlmatch',
         'util',
+        'broadcast',
+        'searchindex',
+        'startup',
         'tests.testborg',
         'tests.testsignalman',
         ):